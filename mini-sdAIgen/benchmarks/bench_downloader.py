@@ -0,0 +1,161 @@
+"""
+Offline throughput benchmark for Downloader.
+
+Starts a local StubServer in a separate process (so its CPU is not counted),
+drives Downloader against a mix of file sizes and reports wall time,
+throughput and CPU per backend and per setting.
+
+    python -m benchmarks.bench_downloader --mix small
+    python -m benchmarks.bench_downloader --mix realistic --bandwidth 20M \
+        --backend aria2-rpc --backend native --setting 5x80 --setting 3x48
+
+Settings are <max_concurrent>x<max_connections>. Use --json to keep results
+for comparing runs. Server files are virtual, but downloads are real writes:
+the 'realistic' mix needs ~34 GB free in --workdir.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_server import StubServer, parse_size
+from core.downloader import Downloader
+
+# name -> list of (count, size); 'realistic' mirrors a LoRA-heavy Empowerment list
+MIXES = {
+    'small': [(8, '2M'), (2, '32M')],
+    'medium': [(20, '20M'), (2, '500M')],
+    'realistic': [(40, '100M'), (3, '10G')],
+}
+
+
+def _run_server(options, files, queue):
+    server = StubServer(**options)
+    urls = [server.add_file(name, size) for name, size in files]
+    queue.put(urls)
+    server.httpd.serve_forever()
+
+
+@contextlib.contextmanager
+def server_process(options, files):
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_run_server, args=(options, files, queue), daemon=True)
+    proc.start()
+    try:
+        yield queue.get(timeout=30)
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+def mix_files(mix):
+    files = []
+    for count, size in MIXES[mix]:
+        for i in range(count):
+            files.append((f"{parse_size(size) // (1024 * 1024)}M_{i:03d}.safetensors", size))
+    return files
+
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_backend(backend, downloader, items):
+    if backend in ('aria2-rpc', 'native'):
+        downloader.download_batch(items)
+    elif backend == 'aria2-serial':
+        for item in items:
+            downloader.download_item(item)
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+
+def bench(backend, setting, urls, workdir, verify=True, quiet=True):
+    max_concurrent, max_connections = (int(x) for x in setting.split('x'))
+    destination = Path(workdir) / f"{backend}-{setting}"
+    items = [{'url': url, 'destination': destination, 'filename': None} for url in urls]
+    downloader = Downloader(max_concurrent=max_concurrent, max_connections=max_connections, verify=verify,
+                            backend='native' if backend == 'native' else 'aria2')
+
+    cpu_before = _cpu_seconds()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        run_backend(backend, downloader, items)
+    wall = time.perf_counter() - start
+    cpu = _cpu_seconds() - cpu_before
+
+    total = sum(f.stat().st_size for f in destination.rglob('*') if f.is_file())
+    complete = sum(1 for url in urls if (destination / url.rsplit('/', 1)[-1]).is_file())
+    shutil.rmtree(destination, ignore_errors=True)
+    return {
+        'backend': backend, 'setting': setting, 'files': len(urls), 'complete': complete,
+        'bytes': total, 'wall_s': round(wall, 3), 'mb_s': round(total / 2**20 / wall, 2) if wall else 0,
+        'cpu_s': round(cpu, 3), 'cpu_pct': round(100 * cpu / wall, 1) if wall else 0,
+    }
+
+
+def print_table(results):
+    print(f"{'Backend':<14} {'Setting':<8} {'Files':>7} {'MB':>9} {'Wall':>8} {'MB/s':>8} {'CPU':>7} {'CPU%':>6}")
+    for r in results:
+        print(f"{r['backend']:<14} {r['setting']:<8} {r['complete']:>3}/{r['files']:<3} {r['bytes'] / 2**20:9.1f} "
+              f"{r['wall_s']:7.2f}s {r['mb_s']:8.1f} {r['cpu_s']:6.2f}s {r['cpu_pct']:6.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Downloader throughput benchmark.")
+    parser.add_argument('--mix', choices=sorted(MIXES), default='small')
+    parser.add_argument('--backend', action='append', help="aria2-rpc, aria2-serial, native (repeatable)")
+    parser.add_argument('--setting', action='append', help="<max_concurrent>x<max_connections> (repeatable)")
+    parser.add_argument('--bandwidth', help="Per-connection cap, e.g. 20M (bytes/s)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--redirects', type=int, default=0, help="Redirect hops before each file")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Share of requests answered 503")
+    parser.add_argument('--reset-rate', type=float, default=0.0, help="Share of bodies cut off halfway")
+    parser.add_argument('--no-verify', action='store_true', help="Skip hashing finished files")
+    parser.add_argument('--workdir', help="Where files are written (default: a temp dir)")
+    parser.add_argument('--json', help="Append results as JSON lines to this file")
+    args = parser.parse_args(argv)
+
+    backends = args.backend or (['aria2-rpc', 'aria2-serial', 'native'] if shutil.which('aria2c') else ['native'])
+    if any(b.startswith('aria2') for b in backends) and not shutil.which('aria2c'):
+        parser.error("aria2c is not installed (try --backend native)")
+
+    options = {
+        'bandwidth': parse_size(args.bandwidth) if args.bandwidth else None,
+        'latency': args.latency, 'redirects': args.redirects,
+        'fail_rate': args.fail_rate, 'reset_rate': args.reset_rate,
+    }
+    settings = args.setting or ['5x80']
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir, \
+            server_process(options, mix_files(args.mix)) as urls:
+        for backend in backends:
+            for setting in settings:
+                result = bench(backend, setting, urls, workdir, verify=not args.no_verify)
+                result.update(mix=args.mix, **{k: v for k, v in options.items() if v})
+                results.append(result)
+                print(f"{backend} {setting}: {result['wall_s']:.2f}s, {result['mb_s']:.1f} MB/s")
+    print()
+    print_table(results)
+
+    if args.json:
+        with open(args.json, 'a') as f:
+            for result in results:
+                f.write(json.dumps(dict(result, ts=time.time(), host=os.uname().nodename)) + '\n')
+
+
+if __name__ == '__main__':
+    main()
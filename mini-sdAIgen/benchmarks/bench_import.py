@@ -0,0 +1,65 @@
+"""
+Start-up benchmark for launch.py.
+
+Times `python launch.py download --help` (interpreter start, imports and
+argument parsing) against a bare `python -c pass`, and lists the slowest
+imports from -X importtime.
+
+    python -m benchmarks.bench_import --runs 20 --budget-ms 100
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+LAUNCH = Path(__file__).resolve().parent.parent / 'launch.py'
+
+
+def time_command(cmd, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def slowest_imports(cmd, top=10):
+    """(cumulative us, module) for the slowest top-level imports."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', *cmd[1:]],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', line)
+        if match and len(match.group(2)) <= 1:
+            rows.append((int(match.group(1)), match.group(3)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure launch.py start-up time.")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=100.0,
+                        help="Fail if `launch.py download --help` takes longer than this")
+    args = parser.parse_args(argv)
+
+    cmd = [sys.executable, str(LAUNCH), 'download', '--help']
+    baseline = time_command([sys.executable, '-c', 'pass'], args.runs)
+    launch = time_command(cmd, args.runs)
+    print(f"python -c pass:               {baseline:7.1f} ms")
+    print(f"launch.py download --help:    {launch:7.1f} ms  (+{launch - baseline:.1f} ms)")
+    print("\nSlowest imports (cumulative):")
+    for us, module in slowest_imports(cmd):
+        print(f"  {us / 1000:7.1f} ms  {module}")
+
+    if launch > args.budget_ms:
+        print(f"\nOver budget: {launch:.1f} ms > {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
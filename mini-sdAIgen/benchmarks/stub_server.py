@@ -0,0 +1,317 @@
+"""
+Local stand-in for HuggingFace/CivitAI style file hosts.
+
+Serves virtual files (generated on the fly, nothing on disk) with Range
+support, a per-connection bandwidth cap, added latency, redirect chains and
+injected failures, so download backends can be measured offline. Google
+Drive files sit behind a virus-scan page and a session cookie, like the
+real thing, and JSON documents stand in for the CivitAI/HuggingFace APIs.
+
+    python -m benchmarks.stub_server --file lora.safetensors=100M --bandwidth 20M
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote
+
+CHUNK = 64 * 1024
+_PERIOD = 251
+_PATTERN = bytes(i % _PERIOD for i in range(CHUNK + _PERIOD))
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(text):
+    """'100M' -> 104857600."""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([KMG]?)B?', str(text).strip().upper())
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+class StubFile:
+    """A virtual file; .safetensors files get a valid header so verification passes."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.header = b''
+        if name.endswith('.safetensors'):
+            self.header = self._safetensors_header(size)
+
+    @staticmethod
+    def _safetensors_header(size, header_len=128):
+        # Fixed-size header padded with spaces (allowed by the format)
+        data_len = max(0, size - 8 - header_len)
+        body = json.dumps({'w': {'dtype': 'U8', 'shape': [data_len], 'data_offsets': [0, data_len]}})
+        return header_len.to_bytes(8, 'little') + body.ljust(header_len).encode()
+
+    @property
+    def etag(self):
+        return f'"{self.name}-{self.size}"'
+
+    def read(self, offset, length):
+        out = bytearray()
+        if offset < len(self.header):
+            out += self.header[offset:offset + length]
+            offset += len(out)
+            length -= len(out)
+        while length > 0:
+            n = min(length, CHUNK)
+            start = offset % _PERIOD
+            out += _PATTERN[start:start + n]
+            offset += n
+            length -= n
+        return bytes(out)
+
+
+class StubServer:
+    """
+    Threaded HTTP/1.1 server for virtual files.
+
+    Args:
+        bandwidth (int): Per-connection cap in bytes/s (None = unlimited).
+        latency (float): Seconds added before every response.
+        redirects (int): Length of the redirect chain in front of url().
+        fail_rate (float): Probability of answering 503 with Retry-After.
+        reset_rate (float): Probability of dropping a connection mid-body.
+        drive_scan_limit (int): Drive files larger than this need the
+                                confirm step (real Drive: about 100 MB).
+    """
+
+    def __init__(self, bandwidth=None, latency=0.0, redirects=0, fail_rate=0.0, reset_rate=0.0,
+                 seed=0, drive_scan_limit=1024 * 1024, host='127.0.0.1', port=0):
+        self.files = {}
+        self.drive_files = {}
+        self.documents = {}
+        self.drive_scan_limit = drive_scan_limit
+        self._confirmed = set()
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.redirects = redirects
+        self.fail_rate = fail_rate
+        self.reset_rate = reset_rate
+        self.random = random.Random(seed)
+        self.requests = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    @property
+    def base_url(self):
+        return f"http://{self.httpd.server_address[0]}:{self.port}"
+
+    def add_file(self, name, size):
+        self.files[name] = StubFile(name, parse_size(size))
+        return self.url(name)
+
+    def add_json(self, path, payload):
+        """Serves payload as JSON at path, with an ETag honoured by If-None-Match."""
+        self.documents[path] = json.dumps(payload).encode()
+        return self.base_url + path
+
+    def add_drive_file(self, file_id, name, size):
+        """A Drive file; point core.gdrive.DOWNLOAD_URL at drive_endpoint to fetch it."""
+        self.drive_files[file_id] = StubFile(name, parse_size(size))
+        return f"https://drive.google.com/file/d/{file_id}/view?usp=sharing"
+
+    @property
+    def drive_endpoint(self):
+        return f"{self.base_url}/drive/download"
+
+    def url(self, name):
+        if self.redirects:
+            return f"{self.base_url}/r/{self.redirects}/files/{name}"
+        return f"{self.base_url}/files/{name}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _roll(self, rate):
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._serve(body=False)
+
+            def do_GET(self):
+                self._serve(body=True)
+
+            def _serve(self, body):
+                with server._lock:
+                    server.requests.append((self.command, self.path, self.headers.get('Range')))
+                if server.latency:
+                    time.sleep(server.latency)
+
+                path = unquote(self.path.split('?', 1)[0])
+                redirect = re.match(r'^/r/(\d+)(/.*)$', path)
+                if redirect:
+                    hops = int(redirect.group(1)) - 1
+                    target = f"/r/{hops}{redirect.group(2)}" if hops > 0 else redirect.group(2)
+                    return self._empty(302, {'Location': target})
+
+                if path == '/drive/download':
+                    return self._drive(body)
+                if path in server.documents:
+                    return self._json(server.documents[path], body)
+                stub = server.files.get(path[len('/files/'):]) if path.startswith('/files/') else None
+                if stub is None:
+                    return self._empty(404)
+                self._file(stub, body)
+
+            def _drive(self, body):
+                query = {k: v[0] for k, v in parse_qs(self.path.split('?', 1)[-1]).items()}
+                stub = server.drive_files.get(query.get('id'))
+                if stub is None:
+                    return self._empty(404)
+                token = query.get('uuid')
+                confirmed = (query.get('confirm') == 't' and token in server._confirmed
+                             and f'NID={token}' in self.headers.get('Cookie', ''))
+                if stub.size <= server.drive_scan_limit or confirmed:
+                    return self._file(stub, body)
+                token = uuid.uuid4().hex
+                with server._lock:
+                    server._confirmed.add(token)
+                page = (
+                    '<html><body><p>Google Drive can\'t scan this file for viruses.</p>'
+                    f'<span class="uc-name-size"><a href="/open?id={query["id"]}">{stub.name}</a></span>'
+                    '<form id="download-form" action="/drive/download" method="get">'
+                    '<input type="submit" id="uc-download-link" value="Download anyway"/>'
+                    f'<input type="hidden" name="id" value="{query["id"]}">'
+                    '<input type="hidden" name="export" value="download">'
+                    '<input type="hidden" name="confirm" value="t">'
+                    f'<input type="hidden" name="uuid" value="{token}">'
+                    '</form></body></html>').encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Set-Cookie', f'NID={token}; Path=/; HttpOnly')
+                self.send_header('Content-Length', str(len(page)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(page)
+
+            def _json(self, document, body):
+                etag = f'"{hashlib.sha1(document).hexdigest()}"'
+                if self.headers.get('If-None-Match') == etag:
+                    return self._empty(304, {'ETag': etag})
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(document)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(document)
+
+            def _file(self, stub, body):
+                if server._roll(server.fail_rate):
+                    return self._empty(503, {'Retry-After': '1'})
+
+                start, end, status = 0, stub.size - 1, 200
+                ranged = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+                if ranged and stub.size:
+                    if ranged.group(1):
+                        start = int(ranged.group(1))
+                        end = min(int(ranged.group(2)), end) if ranged.group(2) else end
+                    else:
+                        start = max(0, stub.size - int(ranged.group(2)))
+                    if start > end:
+                        return self._empty(416, {'Content-Range': f"bytes */{stub.size}"})
+                    status = 206
+
+                length = end - start + 1 if stub.size else 0
+                self.send_response(status)
+                self.send_header('Content-Length', str(length))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', stub.etag)
+                self.send_header('Content-Disposition', f'attachment; filename="{stub.name}"')
+                self.send_header('Content-Type', 'application/octet-stream')
+                if status == 206:
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{stub.size}")
+                self.end_headers()
+                if body:
+                    self._send_body(stub, start, length)
+
+            def _send_body(self, stub, offset, length):
+                reset_at = length // 2 if server._roll(server.reset_rate) else None
+                sent = 0
+                began = time.monotonic()
+                while sent < length:
+                    n = min(CHUNK, length - sent)
+                    if reset_at is not None and sent >= reset_at:
+                        self.close_connection = True
+                        return
+                    try:
+                        self.wfile.write(stub.read(offset + sent, n))
+                    except (BrokenPipeError, ConnectionResetError):
+                        self.close_connection = True
+                        return
+                    sent += n
+                    if server.bandwidth:
+                        # Token bucket per connection: never run ahead of the cap
+                        ahead = sent / server.bandwidth - (time.monotonic() - began)
+                        if ahead > 0:
+                            time.sleep(ahead)
+
+            def _empty(self, status, headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--file', action='append', default=[], metavar='NAME=SIZE')
+    parser.add_argument('--bandwidth', help='Per-connection cap, e.g. 20M (bytes/s)')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--redirects', type=int, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--reset-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubServer(parse_size(args.bandwidth) if args.bandwidth else None, args.latency,
+                        args.redirects, args.fail_rate, args.reset_rate, port=args.port)
+    for spec in args.file:
+        name, size = spec.split('=', 1)
+        print(server.add_file(name, size))
+    print(f"Serving on {server.base_url}")
+    server.httpd.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tarfile
+import threading
+import urllib.request
+import zipfile
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from .paths import PARTIAL_SUFFIX
+
+try:
+    import zstandard
+except ImportError:  # Falls back to the zstd binary
+    zstandard = None
+
+# Longest suffixes first so '.tar.gz' wins over '.gz'
+ARCHIVE_SUFFIXES = {
+    '.tar.gz': 'tar.gz',
+    '.tgz': 'tar.gz',
+    '.tar.zst': 'tar.zst',
+    '.tar': 'tar',
+    '.zip': 'zip',
+}
+STREAM_CHUNK = 1024 * 1024
+
+
+def archive_kind(name):
+    """'zip', 'tar', 'tar.gz', 'tar.zst' or None for a filename or URL."""
+    if not name:
+        return None
+    name = unquote(urlparse(name).path if '://' in name else name).lower()
+    for suffix, kind in ARCHIVE_SUFFIXES.items():
+        if name.endswith(suffix):
+            return kind
+    return None
+
+
+def item_archive_kind(item):
+    return archive_kind(item['filename'] or item['url'])
+
+
+def extract_dir(item):
+    """Folder under the tag's destination that an archive item unpacks into."""
+    name = item['filename'] or unquote(Path(urlparse(item['url']).path).name)
+    lower = name.lower()
+    for suffix in ARCHIVE_SUFFIXES:
+        if lower.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return Path(item['destination']) / name
+
+
+class HashingReader:
+    """File-like wrapper that hashes bytes as they are read."""
+
+    def __init__(self, raw, progress=None):
+        self.raw = raw
+        self.digest = hashlib.sha256()
+        self.bytes_read = 0
+        self.progress = progress
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.digest.update(data)
+        self.bytes_read += len(data)
+        if self.progress and data:
+            self.progress(self.bytes_read)
+        return data
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def _extract_tar(fileobj, destination, mode):
+    with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+        if hasattr(tarfile, 'data_filter'):
+            tar.extractall(destination, filter='data')
+        else:
+            tar.extractall(destination)
+
+
+def _extract_tar_zst(fileobj, destination):
+    if zstandard is not None:
+        with zstandard.ZstdDecompressor().stream_reader(fileobj) as reader:
+            _extract_tar(reader, destination, 'r|')
+        return
+
+    # zstd binary: pump the source into its stdin while tarfile reads stdout
+    proc = subprocess.Popen(['zstd', '-dc'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def pump():
+        try:
+            while chunk := fileobj.read(STREAM_CHUNK):
+                proc.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        finally:
+            proc.stdin.close()
+
+    feeder = threading.Thread(target=pump, daemon=True)
+    feeder.start()
+    try:
+        _extract_tar(proc.stdout, destination, 'r|')
+    finally:
+        proc.stdout.close()
+        feeder.join()
+        if proc.wait() != 0:
+            raise tarfile.ReadError(f"zstd exited with code {proc.returncode}")
+
+
+def extract_stream(fileobj, destination, kind):
+    """Extracts a tar stream (never seeks, so it can read straight off a socket)."""
+    destination = Path(destination)
+    destination.mkdir(parents=True, exist_ok=True)
+    if kind == 'tar.zst':
+        _extract_tar_zst(fileobj, destination)
+    else:
+        _extract_tar(fileobj, destination, 'r|gz' if kind == 'tar.gz' else 'r|')
+
+
+def stream_extract_url(url, destination, kind, headers=None, timeout=60, progress=None):
+    """
+    Downloads a tar archive and unpacks it on the fly, hashing as it goes.
+
+    The archive itself never touches the disk, so peak usage is the payload.
+    progress, if given, is called with the running byte count.
+
+    Returns:
+        str: SHA-256 of the archive bytes.
+    """
+    req = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        reader = HashingReader(resp, progress)
+        extract_stream(reader, destination, kind)
+        # Drain trailing padding so the hash covers the whole archive
+        while reader.read(STREAM_CHUNK):
+            pass
+    return reader.hexdigest()
+
+
+def extract_file(path, destination, remove=True):
+    """Extracts a downloaded archive into destination and deletes it afterwards."""
+    path = Path(path)
+    destination = Path(destination)
+    destination.mkdir(parents=True, exist_ok=True)
+    kind = archive_kind(path.name)
+    if kind == 'zip':
+        root = destination.resolve()
+        with zipfile.ZipFile(path) as zf:
+            for member in zf.namelist():
+                if not (root / member).resolve().is_relative_to(root):
+                    raise zipfile.BadZipFile(f"Unsafe path in archive: {member}")
+            zf.extractall(destination)
+    elif kind:
+        with open(path, 'rb') as f:
+            extract_stream(f, destination, kind)
+    else:
+        raise ValueError(f"Not an archive: {path.name}")
+    if remove:
+        path.unlink()
+    return destination
+
+
+def staging_dir(target):
+    """Where an archive unpacks before publish() moves it to target."""
+    target = Path(target)
+    return target.with_name(target.name + PARTIAL_SUFFIX)
+
+
+def publish(staging, target):
+    """Replaces target with the finished staging folder in one rename."""
+    target = Path(target)
+    if target.exists():
+        shutil.rmtree(target)
+    os.replace(staging, target)
+    return target
+
+
+def remove_partial(destination):
+    shutil.rmtree(destination, ignore_errors=True)
@@ -0,0 +1,173 @@
+import secrets
+import socket
+import subprocess
+import time
+import xmlrpc.client
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Aria2Daemon:
+    """
+    A single long-lived aria2c process driven over XML-RPC.
+
+    Every item of a batch is submitted as its own job, and aria2c schedules
+    them against one global limit on concurrent files, so small files finish
+    while large ones are still downloading.
+
+    Args:
+        max_concurrent (int): Files downloaded at the same time.
+        max_connections (int): Total connections shared by all active files.
+                               Each file gets max_connections // max_concurrent,
+                               capped at aria2c's limit of 16 per server.
+    """
+    ARIA2_MAX_CONNECTIONS_PER_SERVER = 16
+
+    def __init__(self, max_concurrent=5, max_connections=80, port=None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_connections = max(self.max_concurrent, max_connections)
+        self.port = port or _free_port()
+        self.secret = secrets.token_hex(16)
+        self.process = None
+        self.rpc = xmlrpc.client.ServerProxy(f"http://127.0.0.1:{self.port}/rpc")
+
+    @property
+    def connections_per_file(self):
+        return min(self.ARIA2_MAX_CONNECTIONS_PER_SERVER,
+                   max(1, self.max_connections // self.max_concurrent))
+
+    def command(self):
+        split = self.connections_per_file
+        return [
+            'aria2c',
+            '--enable-rpc',
+            '--rpc-listen-all=false',
+            f'--rpc-listen-port={self.port}',
+            f'--rpc-secret={self.secret}',
+            '--console-log-level=error',
+            '--summary-interval=0',
+            f'--max-concurrent-downloads={self.max_concurrent}',
+            f'--max-connection-per-server={split}',
+            f'--split={split}',
+            '--min-split-size=1M',
+            # With mirrors, more connections go to the URIs that deliver faster
+            '--uri-selector=adaptive',
+            '--continue=true',
+            '--allow-overwrite=true',
+            '--auto-file-renaming=false',
+        ]
+
+    def start(self, timeout=10):
+        self.process = subprocess.Popen(self.command(), stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.rpc.aria2.getVersion(self._token)
+                return self
+            except (ConnectionError, OSError, xmlrpc.client.Fault):
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"aria2c exited with code {self.process.returncode}")
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("aria2c RPC did not come up in time")
+                time.sleep(0.1)
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.rpc.aria2.shutdown(self._token)
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def _token(self):
+        return f"token:{self.secret}"
+
+    def add(self, url, destination, filename=None, headers=None, connections=None, paused=False):
+        """
+        Queues a download and returns its aria2 GID.
+
+        url may be a list of mirrors of the same file; aria2c then fetches
+        pieces from all of them. connections lowers the connections per
+        server below connections_per_file; a paused job waits until
+        unpause(gid).
+        """
+        uris = [url] if isinstance(url, str) else list(url)
+        options = {'dir': str(destination)}
+        if filename:
+            options['out'] = filename
+        if headers:
+            options['header'] = list(headers)
+        per_server = min(connections or self.connections_per_file, self.connections_per_file)
+        if per_server < self.connections_per_file:
+            options['max-connection-per-server'] = str(per_server)
+        if per_server < self.connections_per_file or len(uris) > 1:
+            options['split'] = str(per_server * len(uris))
+        if paused:
+            options['pause'] = 'true'
+        return self.rpc.aria2.addUri(self._token, uris, options)
+
+    def unpause(self, gid):
+        return self.rpc.aria2.unpause(self._token, gid)
+
+    def remove(self, gid):
+        """Stops a download; its partial and .aria2 control files stay, so -c resumes it later."""
+        return self.rpc.aria2.forceRemove(self._token, gid)
+
+    def status(self, gid):
+        return self.rpc.aria2.tellStatus(
+            self._token, gid, ['gid', 'status', 'totalLength', 'completedLength',
+                               'downloadSpeed', 'errorCode', 'errorMessage', 'files'])
+
+    def wait(self, gids, poll_interval=1.0, on_done=None, on_progress=None, cancel=None):
+        """
+        Blocks until every GID has completed or failed. Once the
+        threading.Event cancel is set, the remaining GIDs are removed.
+
+        Args:
+            gids (iterable): GIDs returned by add().
+            on_done (callable): Called as on_done(gid, status) as soon as each
+                                job finishes, in completion order.
+            on_progress (callable): Called as on_progress(gid, status) on every
+                                    poll of a job that is still running.
+
+        Returns:
+            dict: GID -> final status dict.
+        """
+        pending = set(gids)
+        results = {}
+        cancelled = False
+        while pending:
+            if cancel is not None and cancel.is_set() and not cancelled:
+                cancelled = True
+                for gid in pending:
+                    try:
+                        self.remove(gid)
+                    except xmlrpc.client.Fault:
+                        pass  # finished in the meantime
+            for gid in list(pending):
+                status = self.status(gid)
+                if status['status'] in ('complete', 'error', 'removed'):
+                    pending.discard(gid)
+                    results[gid] = status
+                    if on_done:
+                        on_done(gid, status)
+                elif on_progress:
+                    on_progress(gid, status)
+            if pending:
+                time.sleep(poll_interval)
+        return results
@@ -0,0 +1,147 @@
+import shutil
+
+from .aria2 import Aria2Daemon
+from .hosts import DEFAULT_POLICY
+
+
+class Cancelled(Exception):
+    """The batch was cancelled before this job finished; its partial file is kept for resuming."""
+
+    def __init__(self, message='cancelled'):
+        super().__init__(message)
+
+
+class Job:
+    """
+    One file handed to a backend; item is the Empowerment item it came from
+    and policy the core.hosts.HostPolicy limiting its connections. mirrors
+    are Jobs for alternative URLs of the same file. etag is filled in by
+    backends that see the server's response headers.
+    """
+    __slots__ = ('item', 'url', 'destination', 'filename', 'headers', 'policy', 'mirrors', 'etag')
+
+    def __init__(self, item, url, destination, filename=None, headers=None, policy=None, mirrors=()):
+        self.item = item
+        self.url = url
+        self.destination = destination
+        self.filename = filename
+        self.headers = headers or []
+        self.policy = policy or DEFAULT_POLICY
+        self.mirrors = list(mirrors)
+        self.etag = None
+
+    @property
+    def key(self):
+        """The file's identity across runs: the item's URL, without tokens or one-off confirm links."""
+        return self.item['url'] if self.item else self.url
+
+    def same_header_urls(self):
+        """
+        This job's URL plus the mirrors that need the same headers. Backends
+        with one header set per file use these, so a token for one host is
+        never sent to another.
+        """
+        return [self.url] + [m.url for m in self.mirrors if m.headers == self.headers]
+
+
+class Aria2Backend:
+    """
+    Transfers through one aria2c daemon over XML-RPC. Needs the aria2c binary.
+
+    A backend's download(jobs, on_progress, on_done, cancel) consumes jobs
+    lazily, calls on_progress(job, bytes_done, total) while files run (total
+    is None while unknown) and on_done(job, path, error, sha256) once per job
+    it started. sha256 is None when the backend does not hash while
+    downloading. Once the threading.Event cancel is set no further jobs start
+    and running ones end with a Cancelled error.
+    """
+    name = 'aria2'
+
+    def __init__(self, max_concurrent=5, max_connections=80):
+        self.max_concurrent = max_concurrent
+        self.max_connections = max_connections
+
+    def available(self):
+        return shutil.which('aria2c') is not None
+
+    def download(self, jobs, on_progress=None, on_done=None, cancel=None):
+        daemon = Aria2Daemon(max_concurrent=self.max_concurrent,
+                             max_connections=self.max_connections)
+        print(f"Starting aria2c RPC daemon ({daemon.max_concurrent} files, "
+              f"{daemon.connections_per_file} connections per file)...")
+
+        with daemon:
+            by_gid = {}
+            # Jobs over their host's concurrency cap are added paused and
+            # started as that host's earlier files finish
+            running, waiting = {}, {}
+            # aria2c starts each file on addUri, so a lazy job source keeps
+            # parsing while the first files are already transferring
+            for job in jobs:
+                if cancel is not None and cancel.is_set():
+                    break
+                policy = job.policy
+                paused = policy.concurrent is not None and running.get(policy.name, 0) >= policy.concurrent
+                gid = daemon.add(job.same_header_urls(), job.destination, job.filename, headers=job.headers,
+                                 connections=policy.connections, paused=paused)
+                if paused:
+                    waiting.setdefault(policy.name, []).append(gid)
+                else:
+                    running[policy.name] = running.get(policy.name, 0) + 1
+                by_gid[gid] = job
+
+            def done(gid, status):
+                name = by_gid[gid].policy.name
+                if waiting.get(name):
+                    daemon.unpause(waiting[name].pop(0))
+                else:
+                    running[name] -= 1
+                if not on_done:
+                    return
+                if status['status'] == 'complete':
+                    files = status.get('files') or [{}]
+                    on_done(by_gid[gid], files[0].get('path'), None, None)
+                elif status['status'] == 'removed' and cancel is not None and cancel.is_set():
+                    on_done(by_gid[gid], None, Cancelled(), None)
+                else:
+                    on_done(by_gid[gid], None, status.get('errorMessage', status['status']), None)
+
+            def progress(gid, status):
+                completed = int(status.get('completedLength') or 0)
+                total = int(status.get('totalLength') or 0)
+                if completed and on_progress:
+                    on_progress(by_gid[gid], completed, total or None)
+
+            return daemon.wait(by_gid, on_done=done, on_progress=progress, cancel=cancel)
+
+
+class NativeBackend:
+    """core.engine's pure-Python segmented downloader; needs no external binary and hashes in-flight."""
+    name = 'native'
+
+    def __init__(self, max_concurrent=5, max_connections=80):
+        self.max_concurrent = max_concurrent
+        self.max_connections = max_connections
+
+    def available(self):
+        return True
+
+    def download(self, jobs, on_progress=None, on_done=None, cancel=None):
+        from .engine import NativeEngine
+        engine = NativeEngine(max_concurrent=self.max_concurrent, max_connections=self.max_connections)
+        return engine.download(jobs, on_progress=on_progress, on_done=on_done, cancel=cancel)
+
+
+BACKENDS = {backend.name: backend for backend in (Aria2Backend, NativeBackend)}
+
+
+def get_backend(name='auto', max_concurrent=5, max_connections=80):
+    """
+    A backend by name; 'auto' picks aria2 when aria2c is installed and the
+    native engine otherwise.
+    """
+    if name == 'auto':
+        name = 'aria2' if shutil.which('aria2c') else 'native'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown download backend {name!r}; choose from {', '.join(BACKENDS)} or auto")
+    return BACKENDS[name](max_concurrent=max_concurrent, max_connections=max_connections)
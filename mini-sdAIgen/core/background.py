@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class BackgroundDownload:
+    """
+    Runs a download batch on a worker thread, so ComfyUI can start right away.
+
+    Progress is folded from the batch's core.events.EventLog. If status_path
+    is given, status() is written there as JSON every interval seconds and
+    once more when the batch ends (temp file + rename, so readers never see
+    half a file).
+
+    Args:
+        run (callable): Downloads everything; called with no arguments.
+        events (EventLog): The log run() reports into.
+        cancel (callable): Makes run() wind down early, e.g. a
+                           core.downloader.Downloader's cancel().
+    """
+
+    def __init__(self, run, events, status_path=None, interval=5.0, cancel=None):
+        self.run = run
+        self.events = events
+        self.status_path = Path(status_path) if status_path else None
+        self.interval = interval
+        self.error = None
+        self.cancelled = False
+        self._cancel = cancel
+        self._mark = events.mark()
+        self._started = None
+        self._finished = False
+        self._write_lock = threading.Lock()
+        self._done = threading.Event()
+        self._threads = [threading.Thread(target=self._work, name='downloads', daemon=True)]
+        if self.status_path:
+            self._threads.append(threading.Thread(target=self._watch, name='download-status', daemon=True))
+
+    def start(self):
+        self._started = time.time()
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """True once the batch has ended."""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """Asks the batch to stop; wait() tells when it has."""
+        self.cancelled = True
+        if self._cancel is not None:
+            self._cancel()
+
+    def _work(self):
+        try:
+            self.run()
+        except BaseException as e:
+            self.error = e
+            print(f"Background downloads failed: {e}")
+        finally:
+            # The final status is on disk before wait() returns, and the
+            # watcher writes nothing after it
+            with self._write_lock:
+                self._finished = True
+                self._write()
+            self._done.set()
+            status = self.status()
+            print(f"\n>>> Background downloads {status['state']}: {status['ok']} ok, "
+                  f"{status['error']} failed ({status['elapsed']:.0f}s) <<<\n")
+
+    def _watch(self):
+        while not self._done.wait(self.interval):
+            with self._write_lock:
+                if self._finished:
+                    break
+                self._write()
+
+    @staticmethod
+    def progress(name, item):
+        """
+        One item's row for a progress display: bytes so far, total size,
+        average rate since the first byte (bytes/s) and seconds left, each
+        None while unknown.
+        """
+        began = item['first_byte'] or item['start']
+        last = item['end'] or item['updated']
+        rate = item['bytes'] / (last - began) if began and last and last > began else None
+        left = None
+        if item['status'] == 'running' and rate and item['size']:
+            left = max(item['size'] - item['bytes'], 0) / rate
+        return {'name': name, 'status': item['status'], 'bytes': item['bytes'], 'size': item['size'],
+                'rate': rate, 'eta': left, 'error': item['error']}
+
+    def status(self):
+        items = self.events.items(since=self._mark)
+        counts = {'ok': 0, 'error': 0, 'running': 0}
+        for item in items.values():
+            counts[item['status']] = counts.get(item['status'], 0) + 1
+        if not self._finished:
+            state = 'running'
+        elif self.cancelled:
+            state = 'cancelled'
+        else:
+            state = 'failed' if self.error or counts['error'] else 'done'
+        rows = [self.progress(name, item) for name, item in items.items()]
+        return {
+            'state': state,
+            **counts,
+            'bytes': sum(item['bytes'] for item in items.values()),
+            'rate': sum(row['rate'] or 0 for row in rows if row['status'] == 'running'),
+            'items': rows,
+            'elapsed': time.time() - self._started if self._started else 0.0,
+            'in_progress': sorted(name for name, item in items.items() if item['status'] == 'running'),
+            'failed': sorted(name for name, item in items.items() if item['status'] == 'error'),
+            'error_message': str(self.error) if self.error else None,
+        }
+
+    def write_status(self):
+        with self._write_lock:
+            self._write()
+
+    def _write(self):
+        if self.status_path is None:
+            return
+        tmp = self.status_path.with_name(self.status_path.name + '.tmp')
+        tmp.write_text(json.dumps(self.status(), indent=2))
+        os.replace(tmp, self.status_path)
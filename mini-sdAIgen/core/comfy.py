@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+DEFAULT_PORT = 8188
+# ComfyUI is ready once this answers; it exists in every version with the API
+HEALTH_PATH = '/system_stats'
+PROBE_INTERVAL = 0.25
+# A node slower than last session by this much (seconds) is pointed out
+REGRESSION = 2.0
+
+# "Import times for custom nodes:" followed by "  12.1 seconds (IMPORT FAILED): /path/node"
+_TIMES_HEADER = re.compile(r'^\s*(Prestartup|Import) times for custom nodes:')
+_TIMES_LINE = re.compile(r'^\s*([\d.]+) seconds( \(IMPORT FAILED\))?: (.+?)\s*$')
+# Milestones of a ComfyUI start, matched anywhere in a log line
+_MILESTONES = (
+    ('server_starting', 'Starting server'),
+    ('gui_url', 'To see the GUI go to:'),
+)
+
+
+class StartupProfile:
+    """
+    Timeline of one ComfyUI start: seconds from launch to each milestone
+    (first output, custom nodes imported, server starting, ready, tunnel up)
+    and the per-custom-node import times ComfyUI prints.
+
+    Fed line by line from ComfyUI's output; mark() is safe to call from
+    other threads (the health probe, the tunnel).
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.marks = {}
+        self.nodes = {'prestartup': [], 'import': []}
+        self.extra = {}
+        self._phase = None
+        self._lock = threading.Lock()
+
+    def mark(self, name, **extra):
+        """Records the first time name happened, in seconds since launch."""
+        with self._lock:
+            if name not in self.marks:
+                self.marks[name] = round(time.time() - self.started_at, 3)
+            self.extra.update(extra)
+
+    def line(self, text):
+        self.mark('first_output')
+        header = _TIMES_HEADER.match(text)
+        if header:
+            self._phase = header.group(1).lower()
+            return
+        if self._phase:
+            match = _TIMES_LINE.match(text)
+            if match:
+                seconds, failed, path = match.groups()
+                with self._lock:
+                    self.nodes[self._phase].append({'name': os.path.basename(path.rstrip('/\\')),
+                                                    'seconds': float(seconds), 'failed': bool(failed)})
+                return
+            self.mark(f"{self._phase}_done")
+            self._phase = None
+        for name, needle in _MILESTONES:
+            if needle in text:
+                self.mark(name)
+
+    def record(self, **fields):
+        """The profile as one JSON-serialisable timeline entry."""
+        with self._lock:
+            imports = self.nodes['import']
+            return {
+                'started_at': self.started_at,
+                **self.marks,
+                **self.extra,
+                **fields,
+                'import_seconds': round(sum(n['seconds'] for n in imports), 3),
+                'failed_imports': [n['name'] for n in imports if n['failed']],
+                'nodes': {phase: list(nodes) for phase, nodes in self.nodes.items()},
+            }
+
+    def summary(self, previous=None, top=5):
+        """Lines for the console: time to ready, the slowest nodes, and what got slower since previous."""
+        record = self.record()
+        ready = record.get('ready')
+        lines = [f"ComfyUI ready in {ready:.1f}s" if ready is not None else "ComfyUI never became ready"]
+        if previous and previous.get('ready') is not None and ready is not None:
+            lines[0] += f" (last session {previous['ready']:.1f}s)"
+        before = {n['name']: n['seconds'] for n in (previous or {}).get('nodes', {}).get('import', [])}
+        slowest = sorted(record['nodes']['import'], key=lambda n: n['seconds'], reverse=True)[:top]
+        if slowest:
+            lines.append(f"Custom node imports took {record['import_seconds']:.1f}s; slowest:")
+        for node in slowest:
+            delta = node['seconds'] - before[node['name']] if node['name'] in before else None
+            note = f" (+{delta:.1f}s)" if delta is not None and delta >= REGRESSION else ''
+            failed = ' IMPORT FAILED' if node['failed'] else ''
+            lines.append(f"  {node['seconds']:6.1f}s {node['name']}{failed}{note}")
+        if record['failed_imports']:
+            lines.append(f"Failed imports: {', '.join(record['failed_imports'])}")
+        return lines
+
+
+def load_timeline(path):
+    """Entries of a startup timeline file, oldest first; [] if there is none."""
+    path = Path(path)
+    if not path.exists():
+        return []
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # A session killed mid-write
+    return entries
+
+
+def append_timeline(path, entry):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+def probe(url, timeout=2.0):
+    """True if url answers 200."""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status == 200
+    except (OSError, ValueError):
+        return False
+
+
+def _pump(process, profile, echo):
+    for text in process.stdout:
+        echo(text)
+        profile.line(text.rstrip('\r\n'))
+
+
+def _watch_health(process, profile, url, report, timeout):
+    deadline = time.time() + timeout
+    while process.poll() is None:
+        if probe(url):
+            profile.mark('ready')
+            report(profile)
+            return
+        if time.time() >= deadline:
+            report(profile, timed_out=True)
+            return
+        time.sleep(PROBE_INTERVAL)
+
+
+def run(args, profile=None, port=DEFAULT_PORT, timeline=None, timeout=900, echo=None, **popen):
+    """
+    Runs ComfyUI until it exits, passing its output through, and profiles
+    the start.
+
+    ComfyUI's output is parsed for the custom node import times and start
+    milestones while /system_stats on port is probed for time to ready. Once
+    ready (or if it exits or the timeout passes without ever answering),
+    the profile is appended to the timeline file, if given, and summarised
+    against the previous session there.
+
+    Args:
+        args (list): The ComfyUI command line.
+        profile (StartupProfile): Shared with whatever else starts alongside
+                                  (e.g. the tunnel marks 'tunnel' in it).
+        popen: Passed to subprocess.Popen (cwd, env).
+
+    Returns:
+        tuple: (exit code, StartupProfile).
+    """
+    profile = profile or StartupProfile()
+    echo = echo or (lambda text: (sys.stdout.write(text), sys.stdout.flush()))
+    previous = load_timeline(timeline)[-1:] if timeline else []
+    written = threading.Event()
+    write_lock = threading.Lock()
+
+    def report(profile, **fields):
+        with write_lock:
+            if written.is_set():
+                return
+            written.set()
+            if timeline:
+                append_timeline(timeline, profile.record(**fields))
+            print('\n'.join(profile.summary(previous[0] if previous else None)))
+
+    # A pipe would make ComfyUI buffer its output and blur every timestamp
+    env = dict(popen.pop('env', None) or os.environ, PYTHONUNBUFFERED='1')
+    process = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                               errors='replace', bufsize=1, **popen)
+    profile.mark('launched', pid=process.pid)
+    reader = threading.Thread(target=_pump, args=(process, profile, echo), name='comfyui-output', daemon=True)
+    health = threading.Thread(target=_watch_health, name='comfyui-health', daemon=True,
+                              args=(process, profile, f"http://127.0.0.1:{port}{HEALTH_PATH}", report, timeout))
+    reader.start()
+    health.start()
+    try:
+        code = process.wait()
+    except KeyboardInterrupt:
+        process.terminate()
+        code = process.wait()
+    reader.join(5)
+    health.join(5)
+    # Never became ready: still worth a timeline entry, with the exit code
+    report(profile, exit_code=code)
+    return code, profile
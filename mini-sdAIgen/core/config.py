@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+
+from . import paths
+
+
+def detect_environment():
+    if Path('/kaggle/working').exists():
+        return 'Kaggle', Path('/kaggle/working')
+    elif Path('/content').exists():
+        return 'Colab', Path('/content')
+    else:
+        return 'Local', Path('.')
+
+
+class Config:
+    """
+    Where launch.py finds ComfyUI, the saved widget settings and its state files.
+
+    Nothing is read or changed when a Config is created; apply() points
+    core.paths (and with it every tag in PREFIX_MAP) at comfy_root.
+
+    Args:
+        env_name (str): 'Kaggle', 'Colab' or 'Local', for messages only.
+        root (Path): Directory holding the ComfyUI checkout.
+        settings_path (Path): settings.json written by the widgets; the
+                              manifest, metadata cache, model URL table,
+                              event log, status file and startup timeline
+                              sit next to it.
+        backend (str): core.backends name for the downloads ('auto', 'aria2', 'native').
+        warmup (float): Share of the available RAM that core.warmup may fill
+                        with the newest models while ComfyUI starts; 0 disables it.
+    """
+
+    def __init__(self, env_name='Local', root=Path('.'), settings_path=Path('settings.json'), backend='auto',
+                 warmup=0.5):
+        self.env_name = env_name
+        self.root = Path(root)
+        self.settings_path = Path(settings_path)
+        self.backend = backend
+        self.warmup = warmup
+
+    @classmethod
+    def detect(cls, settings_path=Path('settings.json'), backend='auto', warmup=0.5):
+        env_name, root = detect_environment()
+        return cls(env_name, root, settings_path, backend, warmup)
+
+    @property
+    def comfy_root(self):
+        return self.root / "ComfyUI"
+
+    @property
+    def manifest_path(self):
+        return self.settings_path.with_name('downloads.sqlite')
+
+    @property
+    def metadata_path(self):
+        return self.settings_path.with_name('metadata.sqlite')
+
+    @property
+    def model_urls_path(self):
+        return self.settings_path.with_name('model_urls.json')
+
+    @property
+    def events_path(self):
+        return self.settings_path.with_name('events.jsonl')
+
+    @property
+    def timeline_path(self):
+        return self.settings_path.with_name('startup_timeline.jsonl')
+
+    @property
+    def status_path(self):
+        return self.settings_path.with_name('download_status.json')
+
+    def apply(self):
+        paths.set_comfy_root(self.comfy_root)
+        return self
+
+    def load_settings(self):
+        """The saved widget settings, or None if the widgets were never saved."""
+        if not self.settings_path.exists():
+            return None
+        with open(self.settings_path, 'r') as f:
+            return json.load(f)
+
+    def tokens(self, settings):
+        return {
+            'huggingface': settings.get('huggingface_token'),
+            'civitai': settings.get('civitai_token'),
+        }
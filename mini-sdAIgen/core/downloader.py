@@ -1,79 +1,604 @@
+import itertools
+import json
 import subprocess
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from . import archive
+from . import events as ev
+from . import gdrive
+from . import gitnodes
+from . import hosts
+from . import manifest as state
+from . import metadata as meta
+from . import preflight
+from . import verify as integrity
+from .backends import Cancelled, Job, get_backend
+from .paths import PARTIAL_SUFFIX
+
+# Tar formats unpack straight off the socket; zips need random access and
+# are extracted right after they finish downloading
+STREAMED_ARCHIVES = ('tar', 'tar.gz', 'tar.zst')
+
+class ProgressReporter:
+    """
+    Takes running byte counts; emits first_byte once, then bytes every
+    interval seconds. size is the file's total once the backend knows it.
+    """
+
+    def __init__(self, events, url, interval=10.0):
+        self.events = events
+        self.url = url
+        self.interval = interval
+        self.bytes = 0
+        self._last = None
+
+    def __call__(self, nbytes, size=None):
+        self.bytes = nbytes
+        now = time.monotonic()
+        if self._last is None:
+            self.events.emit(ev.FIRST_BYTE, self.url, bytes=nbytes, size=size)
+            self._last = now
+        elif now - self._last >= self.interval:
+            self.events.emit(ev.BYTES, self.url, bytes=nbytes, size=size)
+            self._last = now
 
 class Downloader:
-    def __init__(self, api_tokens=None):
+    def __init__(self, api_tokens=None, max_concurrent=5, max_connections=80, manifest=None,
+                 store=None, git_blob_filter=False, verify=True, max_attempts=3, events=None,
+                 backend='aria2', policies=None, metadata=None, cancel=None, progress_interval=10.0,
+                 transcoder=None):
         self.api_tokens = api_tokens or {}
-        
+        # core.hosts.HostPolicies: per-host connection caps, tokens and backoff
+        self.policies = policies or hosts.HostPolicies(self.api_tokens)
+        # Global limits for batch mode, shared by every file in the batch
+        self.max_concurrent = max_concurrent
+        self.max_connections = max_connections
+        # core.backends name ('aria2', 'native', 'auto') or instance moving the bytes
+        if isinstance(backend, str):
+            backend = get_backend(backend, max_concurrent=max_concurrent, max_connections=max_connections)
+        self.backend = backend
+        # Optional core.manifest.Manifest recording per-item state across runs
+        self.manifest = manifest
+        # core.metadata.MetadataResolver: filenames, sizes and expected hashes
+        # from the CivitAI/HuggingFace APIs, cached on disk when given one
+        self.metadata = metadata or meta.MetadataResolver(tokens=self.api_tokens)
+        # Optional core.store.BlobStore deduplicating files across destinations
+        self.store = store
+        # Partial clones (--filter=blob:none) for git repositories ($ext)
+        self.git_blob_filter = git_blob_filter
+        # Check safetensors headers and SHA-256 of every finished file.
+        # Corrupt files and transient failures (network errors, 429, 5xx) go
+        # to a retry queue that gets up to max_attempts rounds per batch
+        self.verify = verify
+        self.max_attempts = max_attempts
+        self._retry = []
+        self._waits = []
+        # Google Drive links resolved this round: url -> core.gdrive.DriveFile
+        self._drive = {}
+        # core.events.EventLog receiving start/bytes/retry/finish/error events,
+        # with a bytes event per running file every progress_interval seconds
+        self.events = events or ev.EventLog()
+        self.progress_interval = progress_interval
+        # threading.Event; once set (see cancel()) no new file starts, running
+        # transfers stop and keep their partial files for the next run
+        self.cancelled = cancel or threading.Event()
+        # Optional core.transcode.Transcoder: finished files of the tags it
+        # names are converted in worker processes while the batch goes on
+        self.transcoder = transcoder
+
+    def cancel(self):
+        """Stops the batch from any thread; download_batch() returns once running files wound down."""
+        self.cancelled.set()
+
+    def _auth_headers(self, url):
+        return self.policies.headers(url)
+
+    def plan(self, items, reserve=preflight.GB):
+        """
+        Resolves items with HEAD requests before anything is downloaded and
+        returns a core.preflight.Plan (sizes per destination, unreachable
+        items, start order). Items already complete in the manifest or present
+        in the blob store are not probed and count as zero bytes.
+
+        Metadata for CivitAI and HuggingFace items is looked up in one
+        concurrent batch here, so the downloads find it in the cache.
+        """
+        def local(item):
+            if self.manifest is not None and self.manifest.is_complete(item['url'], item['destination']):
+                return True
+            return self.store is not None and self.store.lookup(item['url']) is not None
+
+        items = list(items)
+        skipped = [local(item) for item in items]
+        infos = self.metadata.resolve_many(item['url'] for item, done in zip(items, skipped) if not done)
+        skip = {id(item) for item, done in zip(items, skipped) if done}
+        plan = preflight.build_plan(items, headers_for=self._auth_headers, skip=lambda item: id(item) in skip,
+                                    reserve=reserve, url_for=self.policies.authorize)
+        for resolved in plan.entries:
+            info = infos.get(resolved.item['url'])
+            if resolved.size is None and info is not None:
+                resolved.size = info.size
+            if resolved.etag:
+                # aria2c reports no ETag; the native engine's own probe replaces this one
+                self._record(resolved.item, etag=resolved.etag)
+        for resolved in plan.unreachable:
+            self._fail(resolved.item, resolved.error)
+        return plan
+
     def download_item(self, item: dict):
         url = item['url']
         destination = item['destination']
-        filename = item['filename']
-        
+        if self.cancelled.is_set():
+            self._fail(item, Cancelled())
+            return False
+
         # Create directory
         os.makedirs(destination, exist_ok=True)
-        
-        if 'drive.google.com' in url:
-            self._download_gdown(url, destination, filename)
-        else:
-            self._download_aria2(url, destination, filename)
+        if gitnodes.is_node_repo(item):
+            _, failures = gitnodes.install_nodes([item], blob_filter=self.git_blob_filter,
+                                                 events=self.events)
+            return not failures
+        if self._link_from_store(item):
+            return True
+        if archive.item_archive_kind(item) in STREAMED_ARCHIVES:
+            return self._download_tar_stream(item)
+        if self.backend.name != 'aria2':
+            return self._download_jobs([item])
+
+        job = self._resolve(item)
+        if job is None:
+            return False
+        item = job.item
+        self._record(item, status=state.DOWNLOADING, filename=item['filename'])
+        self.events.emit(ev.START, url)
+        # Without -o, aria2c names the file itself (e.g. from Content-Disposition)
+        before = None if job.filename else self._listing(destination)
+        if self._download_aria2(job.same_header_urls(), destination, job.filename, job.headers):
+            path = self._download_path(item)
+            if before is not None and (path is None or not path.is_file()):
+                path = self._written_file(destination, before)
+            return self._finish(item, path)
+        self._fail(item, "download command failed")
+        return False
+
+    @staticmethod
+    def _listing(destination):
+        with os.scandir(destination) as entries:
+            return {e.name: (e.stat().st_size, e.stat().st_mtime_ns) for e in entries if e.is_file()}
+
+    def _written_file(self, destination, before):
+        """The one file that appeared or changed in destination since before; None if not exactly one."""
+        written = [name for name, stat in self._listing(destination).items()
+                   if before.get(name) != stat and not name.endswith(('.aria2', PARTIAL_SUFFIX))]
+        return Path(destination) / written[0] if len(written) == 1 else None
 
-    def _download_aria2(self, url, destination, filename):
-        # Basic aria2c command construction
+    def _expected_path(self, item):
+        # Without an explicit [filename], aria2c names the file after the URL path
+        name = item['filename'] or unquote(Path(urlparse(item['url']).path).name)
+        return Path(item['destination']) / name if name else None
+
+    def _named(self, item):
+        """
+        Pins the canonical filename (site metadata, else the server's
+        Content-Disposition) when neither [filename] nor the URL path provides
+        one, so the file can download under a temporary name.
+        """
+        if gdrive.is_drive_url(item['url']):
+            drive = self._drive_file(item['url'])
+            return item if item['filename'] else dict(item, filename=drive.filename)
+        if item['filename'] or Path(urlparse(item['url']).path).suffix:
+            return item
+        info = self.metadata.lookup(item['url'])
+        if info is not None and info.filename:
+            return dict(item, filename=info.filename)
+        headers = dict(h.split(': ', 1) for h in self._auth_headers(item['url']))
+        filename = preflight.resolve_one(item, headers, url=self.policies.authorize(item['url'])).filename
+        return dict(item, filename=filename) if filename and Path(filename).suffix else item
+
+    def _drive_file(self, url):
+        """Resolves a Google Drive link once per round; its confirm link and cookies may expire."""
+        drive = self._drive.get(url)
+        if drive is None:
+            drive = self._drive[url] = gdrive.resolve(url)
+        return drive
+
+    def _partial_name(self, item):
+        """Name aria2c writes to until the file is verified; None if the final name is unknown."""
+        path = self._expected_path(item)
+        return path.name + PARTIAL_SUFFIX if path and path.suffix else None
+
+    def _download_path(self, item):
+        partial = self._partial_name(item)
+        return Path(item['destination']) / partial if partial else self._expected_path(item)
+
+    def _fail(self, item, error):
+        """Records a failed item; transient failures are queued for the next round of the batch."""
+        self._record(item, status=state.FAILED)
+        self._drive.pop(item['url'], None)
+        self.events.emit(ev.ERROR, item['url'], error=self.policies.redact(error))
+        if hosts.retryable(error):
+            self._retry.append(item)
+            self._waits.append((item['url'], hosts.retry_after(error)))
+
+    def _record(self, item, **fields):
+        if self.manifest is not None:
+            # Unknown values never overwrite what an earlier run recorded
+            fields = {k: v for k, v in fields.items() if v is not None}
+            self.manifest.update(item['url'], item['destination'], **fields)
+
+    def _finish(self, item, path, sha256=None, etag=None):
+        """
+        Verifies and records a finished download. A temporary .part file is
+        renamed to its final name only once it passed verification. Returns
+        False if the file turned out corrupt, or cannot be found (path None:
+        the name the downloader saved it under is unknown).
+        """
+        if path is None or not Path(path).is_file():
+            # Never recorded complete unverified; another round would end the
+            # same way, so it is left to the next run rather than retried
+            print(f"Downloaded file not found: {path or item['url']}")
+            self._record(item, status=state.FAILED)
+            self.events.emit(ev.ERROR, item['url'], error="downloaded file not found")
+            return False
+        path = Path(path)
+        final = path.with_name(path.name[:-len(PARTIAL_SUFFIX)]) if path.name.endswith(PARTIAL_SUFFIX) else path
+        size = path.stat().st_size
+        if self.verify:
+            try:
+                info = None if item.get('sha256') else self.metadata.lookup(item['url'])
+                expected = item.get('sha256') or (info.sha256 if info else None)
+                sha256 = integrity.verify_file(path, expected, name=final.name, sha256=sha256)
+            except integrity.IntegrityError as e:
+                print(f"Corrupt download, queued for re-download: {e}")
+                path.unlink(missing_ok=True)
+                self._record(item, status=state.FAILED)
+                self.events.emit(ev.RETRY, item['url'], error=str(e))
+                self._retry.append(item)
+                return False
+        if final != path:
+            os.replace(path, final)
+            path = final
+        if archive.item_archive_kind(item):
+            target = archive.extract_dir(item)
+            staging = archive.staging_dir(target)
+            archive.remove_partial(staging)
+            try:
+                archive.publish(archive.extract_file(path, staging), target)
+            except Exception as e:
+                # Bad zip, unsafe member path, truncated tar: only this item fails
+                print(f"Error extracting {path.name}: {e}")
+                archive.remove_partial(staging)
+                path.unlink(missing_ok=True)
+                self._fail(item, e)
+                return False
+            print(f"Extracted: {target}")
+            self._record(item, status=state.COMPLETE, filename=target.name, sha256=sha256, etag=etag)
+            self.events.emit(ev.FINISH, item['url'], bytes=size)
+            return True
+        if self.transcoder is not None and self.transcoder.wants(item, path):
+            # Stored once converted (see _finish_transcodes), not as the original
+            self.transcoder.submit(item, path)
+            self.events.emit(ev.START, item['url'], kind='transcode')
+        elif self.store is not None:
+            sha256 = self.store.ingest(item['url'], path, sha256)
+        self._record(item, status=state.COMPLETE, filename=path.name, size=size, sha256=sha256, etag=etag)
+        self.events.emit(ev.FINISH, item['url'], bytes=size)
+        return True
+
+    def _finish_transcodes(self):
+        """Waits for the conversions of this batch and records each result in the manifest."""
+        for item, result, error in self.transcoder.results():
+            name = item['url']
+            if error is not None:
+                print(f"Could not convert {name}, keeping the original: {error}")
+                self.events.emit(ev.ERROR, name, kind='transcode', error=str(error))
+                continue
+            if result is None:
+                continue
+            path = Path(item['destination']) / result['filename']
+            sha256 = result['sha256']
+            if self.store is not None:
+                sha256 = self.store.ingest(item['url'], path, sha256)
+            self._record(item, filename=result['filename'], size=result['size'], sha256=sha256,
+                         transcode=json.dumps(result))
+            self.events.emit(ev.FINISH, name, kind='transcode', bytes=result['size'])
+            print(f"Converted {result['source']} -> {result['filename']}"
+                  + (f" ({result['dtype']})" if result['dtype'] else '')
+                  + f": {result['source_size'] / 2**20:.0f} MB -> {result['size'] / 2**20:.0f} MB"
+                  f" in {result['seconds']:.0f}s")
+
+    def _download_tar_stream(self, item):
+        """Streams a tar archive into its folder; the archive never lands on disk."""
+        url = item['url']
+        target = archive.extract_dir(item)
+        staging = archive.staging_dir(target)
+        kind = archive.item_archive_kind(item)
+        headers = dict(h.split(': ', 1) for h in self._auth_headers(url))
+        self._record(item, status=state.DOWNLOADING)
+        self.events.emit(ev.START, url)
+        print(f"Streaming {url} into {target}...")
+        progress = ProgressReporter(self.events, url, self.progress_interval)
+        archive.remove_partial(staging)
+        try:
+            sha256 = archive.stream_extract_url(self.policies.authorize(url), staging, kind, headers,
+                                                progress=progress)
+        except Exception as e:
+            print(f"Error downloading {url}: {e}")
+            archive.remove_partial(staging)
+            self._fail(item, e)
+            return False
+
+        expected = item.get('sha256')
+        if self.verify and expected and sha256 != expected.lower():
+            print(f"Corrupt download, queued for re-download: {url} SHA-256 {sha256} != {expected}")
+            archive.remove_partial(staging)
+            self._record(item, status=state.FAILED)
+            self.events.emit(ev.RETRY, url, error="SHA-256 mismatch")
+            self._retry.append(item)
+            return False
+        archive.publish(staging, target)
+        print(f"Extracted: {target}")
+        self._record(item, status=state.COMPLETE, filename=target.name, sha256=sha256)
+        self.events.emit(ev.FINISH, url, bytes=progress.bytes)
+        return True
+
+    def _link_from_store(self, item):
+        """Materialises an item from the blob store; False if its URL was never stored."""
+        if self.store is None:
+            return False
+        entry = self.store.lookup(item['url'])
+        if entry is None:
+            return False
+        target = Path(item['destination']) / (item['filename'] or entry['filename'])
+        self.store.materialize(entry['sha256'], target)
+        print(f"Linked from store: {target}")
+        self.events.emit(ev.START, item['url'])
+        self.events.emit(ev.FINISH, item['url'], bytes=0, source='store')
+        self._record(item, status=state.COMPLETE, filename=target.name,
+                     size=target.stat().st_size, sha256=entry['sha256'])
+        return True
+
+    def _download_aria2(self, urls, destination, filename, headers=None):
+        # Basic aria2c command construction; connections follow the host's
+        # policy. Several URIs on the command line are mirrors of one file.
+        url = urls[0]
+        if headers is None:
+            headers = self._auth_headers(url)
+        split = self.policies.for_url(url).connections
         cmd = [
             'aria2c',
             '--console-log-level=error',
             '--summary-interval=10',
-            '-c', '-x16', '-s16', '-k1M', '-j5',
+            '-c', f'-x{split}', f'-s{split * len(urls)}', '-k1M', '-j5',
             '--allow-overwrite=true',
             f'-d "{destination}"',
-            f'"{url}"'
-        ]
+        ] + [f'"{uri}"' for uri in urls]
         
-        # Add Authorization header if HF token present and URL is HF
-        if 'huggingface.co' in url and self.api_tokens.get('huggingface'):
-             cmd.insert(1, f'--header="Authorization: Bearer {self.api_tokens["huggingface"]}"')
+        # Authorization for HF, the session cookie for Google Drive
+        for header in headers:
+            cmd.insert(1, f'--header="{header}"')
 
         # Filename override
         if filename:
             cmd.append(f'-o "{filename}"')
             
         command_str = " ".join(cmd)
-        print(f"Executing: {command_str}")
+        print(f"Executing: {self.policies.redact(command_str)}")
         try:
             subprocess.run(command_str, shell=True, check=True)
+            return True
         except subprocess.CalledProcessError as e:
-            print(f"Error downloading {url}: {e}")
+            print(f"Error downloading {self.policies.redact(url)}: exit status {e.returncode}")
+            return False
 
-    def _download_gdown(self, url, destination, filename):
-        # gdown implementation
-        # Gdown is tricky with output directories sometimes, best to CD
-        # But for simplicity here, we try to use -O
-        
-        # If filename is NOT provided, gdown attempts to guess it.
-        # If we want to save to a specific directory `destination`, 
-        # `gdown` typically accepts -O <output_path> (file or dir).
-        
-        target = destination
-        if filename:
-            target = destination / filename
-            
-        cmd = [
-            'gdown',
-            '--fuzzy',
-            f'"{url}"',
-            '-O', f'"{target}"'
-        ]
-        
-        command_str = " ".join(cmd)
-        print(f"Executing: {command_str}")
+    def download_batch(self, items):
+        """
+        Downloads items as they arrive: items may be a list or a lazy iterator
+        such as core.parser.iter_empowerment, in which case the first files
+        are already transferring while the rest of the list is still parsed.
+        """
+        print("Starting batch download...")
+        mark = self.events.mark()
         try:
-            subprocess.run(command_str, shell=True, check=True)
-        except subprocess.CalledProcessError as e:
-             print(f"Error downloading {url}: {e}")
+            self._download_batch(items)
+        finally:
+            if self.transcoder is not None:
+                # Cancelled: running conversions finish, queued ones are dropped
+                if self.cancelled.is_set():
+                    self.transcoder.close(cancel=True)
+                try:
+                    self._finish_transcodes()
+                finally:
+                    self.transcoder.close()
+            self.events.print_summary(since=mark)
+            self._print_failing(since=mark)
 
-    def download_batch(self, items: list):
-        print(f"Starting batch download of {len(items)} items...")
-        for item in items:
+    def _print_failing(self, since=0):
+        """The retry queue's leftovers: items of this batch whose last attempt failed."""
+        failing = {name: item for name, item in self.events.items(since=since).items()
+                   if item['status'] == 'error'}
+        if not failing:
+            return
+        print(f"\n=== Still failing ({len(failing)}) ===")
+        for name, item in failing.items():
+            print(f"{name}: {item['error']}")
+
+    def _download_batch(self, items):
+        repos, repeats = [], []
+        items = self._unique(self._pending(self._split_repos(items, repos)), repeats)
+
+        for attempt in range(self.max_attempts):
+            self._retry, self._waits, self._drive = [], [], {}
+            self._fetch(items)
+            if self.cancelled.is_set():
+                print("Downloads cancelled; partial files are kept and resume on the next run.")
+                break
+            if attempt == 0:
+                # The input is fully consumed now, so every repository is known;
+                # custom-node repositories are cloned in parallel, not downloaded
+                gitnodes.install_nodes(repos, blob_filter=self.git_blob_filter, events=self.events)
+            if not self._retry:
+                break
+            items = self._retry
+            if attempt + 1 < self.max_attempts:
+                # Corrupt files go again right away; after failures the longest
+                # backoff (or Retry-After) among their hosts sets the pause
+                delay = max((self.policies.for_url(url).delay(attempt, after) for url, after in self._waits),
+                            default=0)
+                print(f"Retrying {len(items)} items" + (f" in {delay:.0f}s..." if delay else "..."))
+                time.sleep(delay)
+
+        # Same URL under another tag: a link to the stored copy, not a second fetch
+        for item in repeats:
             self.download_item(item)
+
+    def _split_repos(self, items, repos):
+        for item in items:
+            if gitnodes.is_node_repo(item):
+                repos.append(item)
+            else:
+                yield item
+
+    def _unique(self, items, repeats):
+        """Links stored items, keeps the first item per URL; the rest go to repeats."""
+        if self.store is None:
+            yield from items
+            return
+        seen = set()
+        for item in items:
+            if self._link_from_store(item):
+                continue
+            if item['url'] in seen:
+                repeats.append(item)
+                continue
+            seen.add(item['url'])
+            yield item
+
+    def _fetch(self, items):
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as pool:
+            tar_jobs = []
+
+            def file_items():
+                for item in items:
+                    if self.cancelled.is_set():
+                        return
+                    if archive.item_archive_kind(item) in STREAMED_ARCHIVES:
+                        tar_jobs.append(pool.submit(self._download_tar_stream, item))
+                    else:
+                        yield item
+
+            feed = file_items()
+            if self.backend.name != 'aria2':
+                self._download_jobs(feed)
+            else:
+                # One aria2c daemon for the whole batch beats one process per URL,
+                # but only pays off once there is more than a single file to schedule.
+                head = list(itertools.islice(feed, 2))
+                if len(head) > 1 and self.backend.available():
+                    self._download_jobs(itertools.chain(head, feed))
+                else:
+                    for item in itertools.chain(head, feed):
+                        self.download_item(item)
+
+            for job in tar_jobs:
+                job.result()
+
+    def _pending(self, items):
+        """Drops items the manifest already has on disk and pins resumed filenames."""
+        if self.manifest is None:
+            yield from items
+            return
+
+        skipped = 0
+        for item in items:
+            url, destination = item['url'], item['destination']
+            if self.manifest.is_complete(url, destination):
+                print(f"Already downloaded: {url}")
+                skipped += 1
+                continue
+            if not item['filename'] and not archive.item_archive_kind(item):
+                # Reuse the name of an interrupted attempt so aria2c continues it
+                known = self.manifest.known_filename(url, destination)
+                if known:
+                    item = dict(item, filename=known)
+            yield item
+
+        if skipped:
+            print(f"Skipping {skipped} items recorded as complete in {self.manifest.path.name}.")
+
+    def _job(self, item):
+        """The backend Job for item: request URLs with tokens applied, one Job per mirror."""
+        name = self._partial_name(item) or item['filename']
+
+        def job(url, mirrors=()):
+            if gdrive.is_drive_url(url):
+                # The direct link and its cookie, so Drive files get segments like any other host
+                drive = self._drive_file(url)
+                return Job(item, drive.url, item['destination'], name, headers=drive.headers(),
+                           policy=self.policies.for_url(url), mirrors=mirrors)
+            return Job(item, self.policies.authorize(url), item['destination'], name,
+                       headers=self._auth_headers(url), policy=self.policies.for_url(url), mirrors=mirrors)
+
+        return job(item['url'], [job(url) for url in item.get('mirrors') or ()])
+
+    def _resolve(self, item):
+        """
+        The Job for item with its filename pinned; None, with the item
+        recorded as failed, if a Google Drive link cannot be resolved.
+        """
+        try:
+            return self._job(self._named(item))
+        except OSError as e:
+            print(f"Error resolving {item['url']}: {e}")
+            self._fail(item, e)
+            return None
+
+    def _jobs(self, items):
+        for item in items:
+            if self.cancelled.is_set():
+                return
+            os.makedirs(item['destination'], exist_ok=True)
+            job = self._resolve(item)
+            if job is None:
+                continue
+            self._record(job.item, status=state.DOWNLOADING, filename=job.item['filename'])
+            self.events.emit(ev.START, item['url'])
+            yield job
+
+    def _download_jobs(self, items):
+        """
+        Downloads items through the backend, which schedules them across
+        files itself. Returns True if every item finished and verified.
+        """
+        reporters = {}
+        finishing = []
+        failed = []
+
+        # Verification reads whole files, so it runs beside the backend rather
+        # than stalling its scheduling while other files keep downloading
+        with ThreadPoolExecutor(max_workers=2) as post:
+            def on_done(job, path, error, sha256=None):
+                item = job.item
+                if error is None:
+                    print(f"Finished: {path or item['url']}")
+                    finishing.append(post.submit(self._finish, item,
+                                                 Path(path) if path else self._download_path(item), sha256,
+                                                 getattr(job, 'etag', None)))
+                else:
+                    print(f"Error downloading {item['url']}: {error}")
+                    self._fail(item, error)
+                    failed.append(item)
+
+            def on_progress(job, completed, total=None):
+                if job not in reporters:
+                    reporters[job] = ProgressReporter(self.events, job.item['url'], self.progress_interval)
+                reporters[job](completed, total)
+
+            self.backend.download(self._jobs(items), on_progress=on_progress, on_done=on_done,
+                                  cancel=self.cancelled)
+            return all([future.result() for future in finishing]) and not failed
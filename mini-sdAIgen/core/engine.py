@@ -0,0 +1,649 @@
+import asyncio
+import hashlib
+import http.client
+import json
+import os
+import ssl
+import threading
+import time
+from pathlib import Path
+from urllib.parse import unquote, urljoin, urlsplit
+
+from . import hosts
+from .backends import Cancelled
+from .preflight import _run, disposition_filename
+
+# Resume state next to the file being written: segment boundaries and progress
+STATE_SUFFIX = '.state'
+CHUNK = 1024 * 1024
+# Segments are never split below this, so a file gets at most size / MIN_SEGMENT connections
+MIN_SEGMENT = 4 * 1024 * 1024
+MAX_REDIRECTS = 10
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class HTTPStatusError(OSError):
+    """A 4xx/5xx answer; headers are kept for Retry-After and friends."""
+
+    def __init__(self, status, reason, url, headers=None):
+        super().__init__(f"HTTP {status} {reason}")
+        self.status = status
+        self.url = url
+        self.headers = headers or {}
+
+
+def _split_url(url):
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+    return (parts.scheme, parts.hostname, port), target
+
+
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host, port), shared by every segment of every file."""
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self.created = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._ssl = ssl.create_default_context()
+
+    def get(self, key, fresh=False):
+        """Returns (connection, reused)."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle and not fresh:
+                return idle.pop(), True
+            self.created += 1
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self._ssl), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def release(self, key, conn, resp):
+        """Keeps conn for the next request if resp was read to the end, else closes it."""
+        if resp.isclosed() and not resp.will_close:
+            with self._lock:
+                self._idle.setdefault(key, []).append(conn)
+        else:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+def request(pool, url, headers=None, byte_range=None):
+    """
+    GET url on a pooled connection, following redirects.
+
+    Authorization is dropped when a redirect leaves the original host, since
+    signed CDN URLs reject a second credential.
+
+    Returns:
+        tuple: (response, connection, pool key, final url). The caller reads
+               the body and hands the connection back with pool.release().
+    """
+    headers = dict(headers or {})
+    origin = urlsplit(url).hostname
+    for _ in range(MAX_REDIRECTS):
+        key, target = _split_url(url)
+        send = dict(headers)
+        if byte_range is not None:
+            send['Range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+        if urlsplit(url).hostname != origin:
+            send.pop('Authorization', None)
+        conn, reused = pool.get(key)
+        try:
+            conn.request('GET', target, headers=send)
+            resp = conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+            # The server closed an idle connection; one retry on a new one
+            conn, _ = pool.get(key, fresh=True)
+            try:
+                conn.request('GET', target, headers=send)
+                resp = conn.getresponse()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                raise
+
+        if resp.status in _REDIRECT_CODES and resp.getheader('Location'):
+            resp.read()
+            pool.release(key, conn, resp)
+            url = urljoin(url, resp.getheader('Location'))
+            continue
+        if resp.status >= 400:
+            error = HTTPStatusError(resp.status, resp.reason, url, dict(resp.getheaders()))
+            conn.close()
+            raise error
+        return resp, conn, key, url
+    raise HTTPStatusError(310, "Too many redirects", url)
+
+
+def _retrying(call, retries, policy=hosts.DEFAULT_POLICY):
+    """call() retried on network errors, throttling and 5xx, backing off as the host's policy says."""
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except (OSError, http.client.HTTPException) as e:
+            if attempt == retries or not hosts.retryable(e):
+                raise
+            time.sleep(policy.delay(attempt, hosts.retry_after(e)))
+
+
+class Probe:
+    __slots__ = ('url', 'size', 'ranges', 'etag', 'filename')
+
+    def __init__(self, url, size, ranges, etag=None, filename=None):
+        self.url = url
+        self.size = size
+        self.ranges = ranges
+        self.etag = etag
+        self.filename = filename
+
+
+def probe(pool, url, headers=None):
+    """Final URL, size, Range support, ETag and filename from a one-byte ranged GET."""
+    try:
+        resp, conn, key, final = request(pool, url, headers, (0, 0))
+    except HTTPStatusError as e:
+        if e.status != 416:  # Empty file: nothing to range over
+            raise
+        resp, conn, key, final = request(pool, url, headers)
+    etag = resp.getheader('ETag')
+    filename = (disposition_filename(resp.getheader('Content-Disposition'))
+                or unquote(Path(urlsplit(final).path).name) or None)
+    content_range = resp.getheader('Content-Range') or ''
+    if resp.status == 206 and '/' in content_range and not content_range.endswith('*'):
+        resp.read()
+        pool.release(key, conn, resp)
+        return Probe(final, int(content_range.rsplit('/', 1)[1]), True, etag, filename)
+    # No Range support: don't pull the whole body just to learn the size
+    length = resp.getheader('Content-Length')
+    conn.close()
+    return Probe(final, int(length) if length and length.isdigit() else None, False, etag, filename)
+
+
+class Mirror:
+    """
+    One source of a file. rate is a moving average of bytes/s per connection,
+    so the scheduler can hand slow mirrors smaller pieces; bytes counts what
+    this mirror delivered.
+    """
+    __slots__ = ('url', 'headers', 'policy', 'info', 'rate', 'bytes', 'dropped')
+
+    def __init__(self, url, headers=None, policy=None):
+        self.url = url
+        self.headers = headers or {}
+        self.policy = policy or hosts.DEFAULT_POLICY
+        self.info = None
+        self.rate = None
+        self.bytes = 0
+        self.dropped = False
+
+    def record(self, nbytes, seconds):
+        self.bytes += nbytes
+        if seconds > 0:
+            sample = nbytes / seconds
+            self.rate = sample if self.rate is None else 0.7 * self.rate + 0.3 * sample
+
+    @property
+    def host(self):
+        return urlsplit(self.url).hostname
+
+
+class Segment:
+    """Bytes [start, end) of a file; everything before pos is on disk. end is None for unknown sizes."""
+    __slots__ = ('start', 'end', 'pos', 'active', 'owner')
+
+    def __init__(self, start, end, pos=None):
+        self.start = start
+        self.end = end
+        self.pos = start if pos is None else pos
+        self.active = False
+        self.owner = None
+
+    @property
+    def remaining(self):
+        return None if self.end is None else self.end - self.pos
+
+    @property
+    def done(self):
+        return self.end is not None and self.pos >= self.end
+
+
+class SegmentedFile:
+    """
+    One file fetched as parallel Range segments into a preallocated file.
+
+    Idle workers split the segment that will take longest to finish, so the
+    last seconds of a file are not spent on a single connection. With several
+    mirrors every mirror gets its own connections (within its host's policy)
+    and splits are sized by measured speed, so a slow mirror takes small
+    pieces; a mirror that refuses the file or throttles is dropped while
+    another one can carry on. Progress is saved to a sidecar state file and a
+    restarted download picks up from it. The contiguous prefix is hashed while
+    later segments are still arriving.
+
+    Args:
+        mirrors (list): Mirror objects for the same file, preferred first.
+        key (str): Identity of the file in the state file; defaults to the
+                   first mirror's URL. Request URLs may change between runs.
+    """
+
+    def __init__(self, engine, mirrors, path, key=None):
+        self.engine = engine
+        self.mirrors = list(mirrors)
+        self.url = self.mirrors[0].url
+        self.key = key or self.url
+        self.path = Path(path)
+        self.state_path = self.path.with_name(self.path.name + STATE_SUFFIX)
+        self.info = None
+        self.segments = []
+        self._lock = threading.Lock()
+        self._fd = None
+        self._finished = threading.Event()
+        self._hashed = 0
+        self._digest = hashlib.sha256()
+
+    @property
+    def bytes_done(self):
+        with self._lock:
+            return sum(s.pos - s.start for s in self.segments)
+
+    @property
+    def size(self):
+        return self.info.size if self.info else None
+
+    @property
+    def live(self):
+        return [m for m in self.mirrors if m.info is not None and not m.dropped]
+
+    def connections(self, mirror):
+        return max(1, min(self.engine.connections_per_file, mirror.policy.connections))
+
+    def frontier(self):
+        """End of the prefix that is completely on disk."""
+        with self._lock:
+            pending = [s.pos for s in self.segments if not s.done]
+        if pending:
+            return min(pending)
+        return self.info.size if self.info.size is not None else max((s.pos for s in self.segments), default=0)
+
+    def _plan_segments(self):
+        size = self.info.size
+        if not self.info.ranges or not size:
+            return [Segment(0, size)]
+        workers = sum(self.connections(m) for m in self.live)
+        count = max(1, min(workers, size // MIN_SEGMENT))
+        step = -(-size // count)
+        return [Segment(start, min(start + step, size)) for start in range(0, size, step)]
+
+    def _load_state(self):
+        try:
+            state = json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if (state.get('url') != self.key or state.get('size') != self.info.size
+                or state.get('etag') != self.info.etag or not self.info.ranges
+                or not self.path.exists() or self.path.stat().st_size != self.info.size):
+            return None
+        return [Segment(*s) for s in state['segments']]
+
+    def save_state(self):
+        if not self.info or not self.info.ranges:
+            return
+        with self._lock:
+            segments = [[s.start, s.end, s.pos] for s in self.segments]
+        tmp = self.state_path.with_name(self.state_path.name + '.tmp')
+        tmp.write_text(json.dumps({'url': self.key, 'size': self.info.size, 'etag': self.info.etag,
+                                   'segments': segments}))
+        os.replace(tmp, self.state_path)
+
+    def _open(self):
+        resumed = self._load_state()
+        self.segments = resumed or self._plan_segments()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        flags = os.O_RDWR | os.O_CREAT | (0 if resumed else os.O_TRUNC)
+        self._fd = os.open(self.path, flags, 0o644)
+        if not resumed and self.info.size:
+            try:
+                # One contiguous extent instead of one per arriving segment
+                os.posix_fallocate(self._fd, 0, self.info.size)
+            except (AttributeError, OSError):
+                os.ftruncate(self._fd, self.info.size)
+        return bool(resumed)
+
+    def _rate(self, mirror):
+        """Measured speed, or the average of the measured ones until this mirror has a sample."""
+        if mirror is not None and mirror.rate:
+            return mirror.rate
+        known = [m.rate for m in self.mirrors if m.rate]
+        return sum(known) / len(known) if known else 1.0
+
+    def _cut(self, seg, mirror, share):
+        """Gives mirror the tail share of seg (at least MIN_SEGMENT); None if seg is too small to cut."""
+        # The owner keeps at least a segment, and the chunk it may be writing right now
+        take = min(int(seg.remaining * share), seg.remaining - max(MIN_SEGMENT, CHUNK))
+        if take < MIN_SEGMENT:
+            return None
+        tail = Segment(seg.end - take, seg.end)
+        seg.end = tail.start
+        self.segments.insert(self.segments.index(seg) + 1, tail)
+        return tail
+
+    def _claim(self, mirror):
+        """Next segment for an idle worker of mirror, or None when there is nothing left for it."""
+        with self._lock:
+            if mirror.dropped:
+                return None
+            mine = self._rate(mirror)
+            fastest = max(self._rate(m) for m in self.live)
+            for seg in self.segments:
+                if not seg.active and not seg.done and (seg.end is not None or seg.pos == 0):
+                    # A slower mirror takes only its share of a free segment
+                    if self.info.ranges and mine < fastest:
+                        seg = self._cut(seg, mirror, mine / (mine + fastest)) or seg
+                    seg.active, seg.owner = True, mirror
+                    return seg
+            if not self.info.ranges:
+                return None
+            # Split the segment that will finish last, in proportion to both
+            # mirrors' speeds so the two halves end at about the same time
+            active = [s for s in self.segments if s.active and not s.done]
+            if not active:
+                return None
+            victim = max(active, key=lambda s: s.remaining / self._rate(s.owner))
+            other = self._rate(victim.owner)
+            seg = self._cut(victim, mirror, mine / (mine + other))
+            if seg is not None:
+                seg.active, seg.owner = True, mirror
+            return seg
+
+    def _drop(self, mirror, error):
+        with self._lock:
+            if mirror.dropped:
+                return
+            mirror.dropped = True
+        print(f"Mirror dropped for {self.path.name}: {mirror.host} ({error})")
+
+    def _fetch_segment(self, seg, mirror):
+        """Blocking: downloads seg from mirror on a pooled connection, with retries."""
+        pool = self.engine.pool
+        for attempt in range(self.engine.retries + 1):
+            try:
+                if self.info.ranges:
+                    with self._lock:
+                        byte_range = (seg.pos, seg.end - 1)
+                    resp, conn, key, _ = request(pool, mirror.info.url, mirror.headers, byte_range)
+                    if resp.status != 206:
+                        conn.close()
+                        raise ConnectionError(f"server ignored Range (HTTP {resp.status})")
+                else:
+                    # Without Range support a retry starts over; skip what is already written
+                    resp, conn, key, _ = request(pool, mirror.info.url, mirror.headers)
+                    skip = seg.pos
+                    while skip:
+                        data = resp.read(min(CHUNK, skip))
+                        if not data:
+                            raise ConnectionError("connection closed before the resume point")
+                        skip -= len(data)
+                try:
+                    self._read_into(seg, resp, mirror)
+                except Cancelled:
+                    conn.close()
+                    raise
+                pool.release(key, conn, resp)
+                return
+            except (OSError, http.client.HTTPException) as e:
+                expired = (isinstance(e, HTTPStatusError) and e.status in (401, 403, 410)
+                           and mirror.info.url != mirror.url)
+                if expired and attempt < self.engine.retries:
+                    # Signed redirect targets expire; resolve the original URL again
+                    mirror.info.url = probe(pool, mirror.url, mirror.headers).url
+                    continue
+                others = len(self.live) > 1
+                throttled = hosts.status_of(e) == 429
+                if others and (throttled or not hosts.retryable(e) or attempt == self.engine.retries):
+                    # The segment goes back to the pool for the remaining mirrors
+                    self._drop(mirror, e)
+                    return
+                if attempt == self.engine.retries or not hosts.retryable(e):
+                    raise
+                time.sleep(mirror.policy.delay(attempt, hosts.retry_after(e)))
+
+    def _read_into(self, seg, resp, mirror):
+        last = time.monotonic()
+        while True:
+            with self._lock:
+                want = CHUNK if seg.end is None else min(CHUNK, seg.end - seg.pos)
+            if want <= 0:
+                return  # Range may have shrunk after a split; pool.release() closes the rest
+            if self.engine.cancel.is_set():
+                raise Cancelled()
+            # Whatever has arrived, so a slow mirror never sits on a stale chunk size
+            data = resp.read1(want)
+            if not data:
+                if seg.end is None:
+                    seg.end = seg.pos
+                    return
+                raise ConnectionError(f"connection closed at byte {seg.pos} of segment ending at {seg.end}")
+            now = time.monotonic()
+            mirror.record(len(data), now - last)
+            last = now
+            with self._lock:
+                if seg.end is not None:
+                    data = data[:seg.end - seg.pos]
+            os.pwrite(self._fd, data, seg.pos)
+            with self._lock:
+                seg.pos += len(data)
+
+    def _hash_loop(self):
+        while True:
+            finished = self._finished.is_set()
+            frontier = self.frontier()
+            while self._hashed < frontier:
+                data = os.pread(self._fd, min(CHUNK * 16, frontier - self._hashed), self._hashed)
+                if not data:
+                    break
+                self._digest.update(data)
+                self._hashed += len(data)
+            if finished:
+                return
+            self._finished.wait(0.2)
+
+    async def _worker(self, mirror):
+        while not self.engine.cancel.is_set() and (seg := self._claim(mirror)) is not None:
+            async with self.engine.connections:
+                try:
+                    await asyncio.to_thread(self._fetch_segment, seg, mirror)
+                finally:
+                    seg.active = False
+
+    async def _probe(self):
+        """Probes every mirror at once; keeps those serving the same bytes as the first reachable one."""
+        pool = self.engine.pool
+        # Only the preferred source is worth waiting out retries for
+        results = await asyncio.gather(*(
+            asyncio.to_thread(_retrying, lambda m=m: probe(pool, m.url, m.headers),
+                              self.engine.retries if i == 0 else 0, m.policy)
+            for i, m in enumerate(self.mirrors)), return_exceptions=True)
+        for mirror, result in zip(self.mirrors, results):
+            if isinstance(result, Exception):
+                if len(self.mirrors) > 1:
+                    self._drop(mirror, result)
+            else:
+                mirror.info = result
+        live = self.live
+        if not live:
+            raise next(r for r in results if isinstance(r, Exception))
+        self.info = live[0].info
+        for mirror in live[1:]:
+            if not (self.info.ranges and mirror.info.ranges and mirror.info.size == self.info.size):
+                self._drop(mirror, f"size {mirror.info.size} or Range support differs")
+
+    async def run(self):
+        """Downloads the file; returns its SHA-256."""
+        await self._probe()
+        if self._open():
+            print(f"Resuming {self.path.name} at {self.bytes_done / 2**20:.0f} MB")
+        hasher = threading.Thread(target=self._hash_loop, daemon=True)
+        hasher.start()
+        try:
+            while True:
+                before = self.bytes_done
+                live = self.live if self.info.ranges else self.live[:1]
+                workers = [self._worker(m) for m in live
+                           for _ in range(self.connections(m) if self.info.ranges else 1)]
+                results = await asyncio.gather(*workers, return_exceptions=True)
+                errors = [r for r in results if isinstance(r, BaseException)]
+                if errors:
+                    raise errors[0]
+                if all(s.done for s in self.segments):
+                    break
+                if self.engine.cancel.is_set():
+                    raise Cancelled()
+                # A dropped mirror handed segments back after the others went idle
+                if self.bytes_done == before:
+                    raise ConnectionError(f"no mirror could continue {self.path.name}")
+            if self.info.size is None:
+                os.ftruncate(self._fd, self.frontier())
+        except BaseException:
+            self.save_state()
+            raise
+        finally:
+            self._finished.set()
+            await asyncio.to_thread(hasher.join)
+            os.close(self._fd)
+        self.state_path.unlink(missing_ok=True)
+        return self._digest.hexdigest()
+
+
+class NativeEngine:
+    """
+    Pure-Python segmented downloader: asyncio schedules files and segments,
+    http.client moves the bytes on worker threads over pooled keep-alive
+    connections.
+
+    Args:
+        max_concurrent (int): Files downloaded at the same time.
+        max_connections (int): Connections shared by all active files.
+        connections_per_file (int): Cap per file; defaults to an even share.
+                                    A job's HostPolicy may lower it further and
+                                    cap how many files of its host run at once.
+        retries (int): Attempts per segment after the first.
+    """
+
+    def __init__(self, max_concurrent=5, max_connections=80, connections_per_file=None, retries=4,
+                 progress_interval=1.0, timeout=30):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_connections = max(self.max_concurrent, max_connections)
+        self.connections_per_file = connections_per_file or max(1, self.max_connections // self.max_concurrent)
+        self.retries = retries
+        self.progress_interval = progress_interval
+        self.pool = ConnectionPool(timeout)
+        self.connections = None
+        self.cancel = threading.Event()
+
+    def download(self, jobs, on_progress=None, on_done=None, cancel=None):
+        """
+        Downloads jobs (any iterable of objects with url, destination,
+        filename and headers; consumed lazily).
+
+        on_progress(job, bytes_done, total) is called every progress_interval
+        while a job runs; on_done(job, path, error, sha256) once it ends. Once
+        the threading.Event cancel is set, running files stop after their
+        current chunk with a Cancelled error and keep their resume state.
+        """
+        if cancel is not None:
+            self.cancel = cancel
+        try:
+            return _run(self._download(jobs, on_progress, on_done))
+        finally:
+            self.pool.close()
+
+    async def _download(self, jobs, on_progress, on_done):
+        self.connections = asyncio.Semaphore(self.max_connections)
+        slots = asyncio.Semaphore(self.max_concurrent)
+        host_slots = {}
+        active = {}
+        tasks = []
+
+        async def one(job):
+            policy = getattr(job, 'policy', None) or hosts.DEFAULT_POLICY
+            limit = None
+            if policy.concurrent is not None:
+                limit = host_slots.setdefault(policy.name, asyncio.Semaphore(policy.concurrent))
+                if limit.locked():
+                    # Let files from other hosts have the slot while this one waits its turn
+                    slots.release()
+                    await limit.acquire()
+                    await slots.acquire()
+                else:
+                    await limit.acquire()
+            if self.cancel.is_set():
+                slots.release()
+                if limit is not None:
+                    limit.release()
+                if on_done:
+                    on_done(job, None, Cancelled(), None)
+                return
+            sources = [job, *getattr(job, 'mirrors', ())]
+            mirrors = [Mirror(source.url, dict(h.split(': ', 1) for h in source.headers or []),
+                              getattr(source, 'policy', None)) for source in sources]
+            path = Path(job.destination) / (job.filename or _fallback_name(job.url))
+            segmented = SegmentedFile(self, mirrors, path, getattr(job, 'key', None))
+            active[job] = segmented
+            try:
+                sha256 = await segmented.run()
+            except Exception as e:
+                if on_done:
+                    on_done(job, None, e, None)
+            else:
+                if hasattr(job, 'etag'):
+                    job.etag = segmented.info.etag
+                if on_progress:
+                    on_progress(job, segmented.bytes_done, segmented.info.size)
+                if on_done:
+                    on_done(job, path, None, sha256)
+            finally:
+                del active[job]
+                slots.release()
+                if limit is not None:
+                    limit.release()
+
+        async def report():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                for job, segmented in list(active.items()):
+                    if segmented.info is None:
+                        continue
+                    if on_progress:
+                        on_progress(job, segmented.bytes_done, segmented.info.size)
+                    segmented.save_state()
+
+        reporter = asyncio.create_task(report())
+        iterator = iter(jobs)
+        try:
+            while not self.cancel.is_set():
+                await slots.acquire()
+                # The job source may parse or probe; keep it off the event loop
+                job = await asyncio.to_thread(next, iterator, None)
+                if job is None:
+                    slots.release()
+                    break
+                tasks.append(asyncio.create_task(one(job)))
+            await asyncio.gather(*tasks)
+        finally:
+            reporter.cancel()
+
+
+def _fallback_name(url):
+    return unquote(Path(urlsplit(url).path).name) or 'download'
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+START = 'start'
+FIRST_BYTE = 'first_byte'
+BYTES = 'bytes'
+RETRY = 'retry'
+FINISH = 'finish'
+ERROR = 'error'
+
+MB = 1024 * 1024
+
+
+def host_of(url):
+    if '://' not in str(url):
+        return ''
+    return urlparse(url).hostname or ''
+
+
+class EventLog:
+    """
+    Structured timing events for downloads and setup tasks.
+
+    Each event is a JSON object with a wall-clock timestamp, the event type
+    (start, first_byte, bytes, retry, finish, error), the item name (URL or
+    task name), its host, the bytes so far and, once known, the file size.
+    Events are kept in memory for the end-of-run summary and, when a path
+    is given, appended to a JSONL file.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.events = []
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a') if self.path else None
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def emit(self, event, name, kind='download', **fields):
+        record = {'ts': time.time(), 'event': event, 'kind': kind, 'name': str(name)}
+        if kind == 'download':
+            record['host'] = host_of(name)
+        record.update({k: v for k, v in fields.items() if v is not None})
+        with self._lock:
+            self.events.append(record)
+            if self._file:
+                self._file.write(json.dumps(record) + '\n')
+                self._file.flush()
+        return record
+
+    def mark(self):
+        """Position in the event list, so a summary can cover one batch only."""
+        with self._lock:
+            return len(self.events)
+
+    def items(self, kind='download', since=0):
+        """Per-item timings folded from the events: name -> dict."""
+        items = {}
+        with self._lock:
+            events = self.events[since:]
+        for e in events:
+            if e['kind'] != kind:
+                continue
+            item = items.setdefault(e['name'], {
+                'host': e.get('host', ''), 'start': None, 'first_byte': None,
+                'end': None, 'bytes': 0, 'size': None, 'updated': None, 'status': 'running',
+                'retries': 0, 'source': None, 'error': None})
+            if e['event'] == START and item['start'] is None:
+                item['start'] = e['ts']
+            elif e['event'] == FIRST_BYTE and item['first_byte'] is None:
+                item['first_byte'] = e['ts']
+            elif e['event'] == RETRY:
+                item['retries'] += 1
+            elif e['event'] in (FINISH, ERROR):
+                item['end'] = e['ts']
+                item['status'] = 'ok' if e['event'] == FINISH else 'error'
+                item['source'] = e.get('source', item['source'])
+                item['error'] = e.get('error')
+            if e.get('bytes') is not None:
+                item['bytes'] = max(item['bytes'], e['bytes'])
+                item['updated'] = e['ts']
+            if e.get('size') is not None:
+                item['size'] = e['size']
+        for item in items.values():
+            if item['start'] is None:
+                item['start'] = item['end']
+        return items
+
+    def print_summary(self, since=0):
+        items = {k: v for k, v in self.items(since=since).items() if v['end'] is not None}
+        if not items:
+            return
+
+        def rate(nbytes, seconds):
+            return f"{nbytes / MB / seconds:8.1f}" if seconds > 0 else f"{'-':>8}"
+
+        print("\n=== Download Summary ===")
+        print(f"{'Item':<40} {'MB':>9} {'Time':>7} {'MB/s':>8} {'TTFB':>6}  Status")
+        for name, item in sorted(items.items(), key=lambda kv: kv[1]['start']):
+            duration = item['end'] - item['start']
+            ttfb = f"{item['first_byte'] - item['start']:5.2f}s" if item['first_byte'] else f"{'-':>6}"
+            label = name.rsplit('/', 1)[-1][:40] or name[:40]
+            status = item['status'] + (f" ({item['source']})" if item['source'] else '')
+            print(f"{label:<40} {item['bytes'] / MB:9.1f} {duration:6.1f}s {rate(item['bytes'], duration)} {ttfb}  {status}")
+
+        hosts = {}
+        for item in items.values():
+            host = hosts.setdefault(item['host'] or '-', {'bytes': 0, 'start': item['start'], 'end': item['end']})
+            host['bytes'] += item['bytes']
+            host['start'] = min(host['start'], item['start'])
+            host['end'] = max(host['end'], item['end'])
+        print(f"\n{'Host':<40} {'MB':>9} {'Time':>7} {'MB/s':>8}")
+        for name, host in sorted(hosts.items(), key=lambda kv: -kv[1]['bytes']):
+            duration = host['end'] - host['start']
+            print(f"{name[:40]:<40} {host['bytes'] / MB:9.1f} {duration:6.1f}s {rate(host['bytes'], duration)}")
+
+        wall = max(i['end'] for i in items.values()) - min(i['start'] for i in items.values())
+        serial = sum(i['end'] - i['start'] for i in items.values())
+        total = sum(i['bytes'] for i in items.values())
+        print(f"\nBatch wall time: {wall:.1f}s | Sum of item times: {serial:.1f}s | "
+              f"Total: {total / MB:.1f} MB at {rate(total, wall).strip()} MB/s")
@@ -0,0 +1,163 @@
+import html
+import http.cookiejar
+import re
+import urllib.error
+import urllib.request
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlencode, urljoin, urlsplit
+
+from . import preflight
+
+DRIVE_HOSTS = ('drive.google.com', 'drive.usercontent.google.com', 'docs.google.com')
+# Direct download endpoint; files over ~100 MB answer with a virus-scan page first
+DOWNLOAD_URL = 'https://drive.usercontent.google.com/download'
+# Drive serves the interstitial pages differently to non-browser agents
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+# A warning page is a few KB; never read a misidentified file body
+MAX_PAGE = 256 * 1024
+# Confirm pages to step through before giving up
+MAX_STEPS = 3
+
+_ID_PATH = re.compile(r'/d/([\w-]+)')
+_CONFIRM_HREF = re.compile(r'href="([^"]*[?&](?:amp;)?confirm=[^"]*)"')
+_QUOTA = 'Too many users have viewed or downloaded this file recently'
+
+
+class DriveError(OSError):
+    """A Drive link that does not lead to a file; status is the HTTP status it amounts to."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class DriveFile:
+    """
+    A resolved Drive file: url is the direct download link, cookie the
+    Cookie header value that link needs (None if it needs none).
+    """
+    __slots__ = ('id', 'url', 'filename', 'size', 'cookie')
+
+    def __init__(self, id, url, filename=None, size=None, cookie=None):
+        self.id = id
+        self.url = url
+        self.filename = filename
+        self.size = size
+        self.cookie = cookie
+
+    def headers(self):
+        """Header lines for the download, in the "Name: value" form backends take."""
+        return [f'Cookie: {self.cookie}'] if self.cookie else []
+
+    def __repr__(self):
+        return f"DriveFile({self.id!r}, {self.filename!r}, size={self.size})"
+
+
+def is_drive_url(url):
+    host = (urlsplit(str(url)).hostname or '').lower()
+    return host in DRIVE_HOSTS
+
+
+def file_id(url):
+    """File ID from the usual link forms (/file/d/<id>/view, open?id=<id>, uc?id=<id>); None otherwise."""
+    parts = urlsplit(url)
+    match = _ID_PATH.search(parts.path)
+    if match:
+        return match.group(1)
+    ids = parse_qs(parts.query).get('id')
+    return ids[0] if ids else None
+
+
+class _DownloadForm(HTMLParser):
+    """Action and hidden inputs of the virus-scan page's <form id="download-form">."""
+
+    def __init__(self):
+        super().__init__()
+        self.action = None
+        self.fields = {}
+        self._inside = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form' and attrs.get('id') == 'download-form':
+            self.action = attrs.get('action')
+            self._inside = True
+        elif tag == 'input' and self._inside and attrs.get('name'):
+            self.fields[attrs['name']] = attrs.get('value') or ''
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self._inside = False
+
+
+def confirm_url(page, url, jar=None):
+    """
+    The link behind a virus-scan or "can't scan" page, or None.
+
+    Current pages carry a form with confirm and uuid fields; older ones a
+    confirm=... link, or only a download_warning cookie holding the token.
+    """
+    form = _DownloadForm()
+    form.feed(page)
+    if form.action:
+        return f"{urljoin(url, form.action)}?{urlencode(form.fields)}"
+    match = _CONFIRM_HREF.search(page)
+    if match:
+        return urljoin(url, html.unescape(match.group(1)))
+    for cookie in jar or ():
+        if cookie.name.startswith('download_warning'):
+            return f"{url}{'&' if '?' in url else '?'}confirm={cookie.value}"
+    return None
+
+
+def _page_error(page, url):
+    if _QUOTA in page:
+        # The quota resets within a day; retrying inside the batch will not help
+        return DriveError(f"Google Drive download quota exceeded for {url}", 403)
+    if urlsplit(url).hostname == 'accounts.google.com':
+        return DriveError(f"Google Drive file is not shared publicly: {url}", 403)
+    return DriveError(f"Google Drive returned a page instead of the file: {url}", 404)
+
+
+def resolve(url, timeout=15):
+    """
+    Resolves a Drive link to a DriveFile, stepping through the confirm page
+    large files get and keeping the cookies Drive sets along the way.
+
+    Only the first byte of the file is requested, so a segmented backend can
+    fetch the rest over parallel connections with the returned URL and cookie.
+
+    Raises:
+        DriveError: The link is not a file, not public, over quota or gone.
+    """
+    drive_id = file_id(url)
+    if drive_id is None:
+        raise DriveError(f"No Google Drive file ID in {url}", 400)
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    request_url = f"{DOWNLOAD_URL}?{urlencode({'id': drive_id, 'export': 'download'})}"
+
+    for _ in range(MAX_STEPS):
+        req = urllib.request.Request(request_url, headers={'User-Agent': USER_AGENT, 'Range': 'bytes=0-0'})
+        try:
+            with opener.open(req, timeout=timeout) as resp:
+                final = resp.geturl()
+                disposition = resp.headers.get('Content-Disposition')
+                if disposition or not resp.headers.get_content_type().startswith('text/html'):
+                    size = resp.headers.get('Content-Length')
+                    content_range = resp.headers.get('Content-Range', '')
+                    if resp.status == 206 and '/' in content_range:
+                        size = content_range.rsplit('/', 1)[1]
+                    cookie = urllib.request.Request(final)
+                    jar.add_cookie_header(cookie)
+                    return DriveFile(drive_id, final, preflight.disposition_filename(disposition),
+                                     int(size) if size and size.isdigit() else None,
+                                     cookie.get_header('Cookie'))
+                page = resp.read(MAX_PAGE).decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            raise DriveError(f"HTTP {e.code} {e.reason} for Google Drive file {drive_id}", e.code) from e
+        next_url = confirm_url(page, final, jar)
+        if next_url is None or next_url == request_url:
+            raise _page_error(page, final)
+        request_url = next_url
+    raise DriveError(f"Google Drive kept asking for confirmation: {url}", 404)
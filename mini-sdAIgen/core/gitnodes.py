@@ -0,0 +1,112 @@
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import events as ev
+from . import pipdeps
+from .paths import PREFIX_MAP
+
+# https://github.com/<owner>/<repo>[.git][/] -- a repository, not a file inside it
+_REPO_PATTERN = re.compile(
+    r'^https?://(?:www\.)?(?:github\.com|gitlab\.com|codeberg\.org)/[\w.-]+/[\w.-]+?(?:\.git)?/?$')
+
+
+def is_git_repo_url(url: str) -> bool:
+    return bool(_REPO_PATTERN.match(url)) or url.endswith('.git')
+
+
+def is_node_repo(item) -> bool:
+    """
+    True for a custom-node repository: a git URL on an $ext line (or, for
+    items without a tag, one bound for custom_nodes). A repository URL under
+    any other tag is downloaded like any other file.
+    """
+    tag = item.get('tag')
+    if tag is None:
+        in_nodes = Path(item['destination']) == PREFIX_MAP['$ext']
+    else:
+        in_nodes = tag == '$ext'
+    return in_nodes and is_git_repo_url(item['url'])
+
+
+def repo_name(url: str) -> str:
+    name = url.rstrip('/').rsplit('/', 1)[-1]
+    return name[:-4] if name.endswith('.git') else name
+
+
+def clone_or_update(url, destination, name=None, blob_filter=False):
+    """
+    Shallow-clones a repository, or moves an existing checkout to the
+    remote's latest commit. A shallow checkout cannot be fast-forwarded once
+    upstream is more than one commit ahead, so the update fetches the tip
+    and resets to it; local edits in the checkout are discarded.
+
+    Args:
+        url (str): Repository URL.
+        destination (Path): Parent directory, e.g. custom_nodes.
+        name (str): Checkout directory name; defaults to the repository name.
+        blob_filter (bool): Add --filter=blob:none (partial clone).
+
+    Returns:
+        Path: The checkout.
+    """
+    path = Path(destination) / (name or repo_name(url))
+    if (path / '.git').exists():
+        print(f"Updating {path.name}...")
+        fetch = ['git', '-C', str(path), 'fetch', '-q', '--depth', '1']
+        if blob_filter:
+            fetch.append('--filter=blob:none')
+        subprocess.run(fetch + ['origin', 'HEAD'], check=True)
+        subprocess.run(['git', '-C', str(path), 'reset', '-q', '--hard', 'FETCH_HEAD'], check=True)
+    else:
+        print(f"Cloning {path.name}...")
+        cmd = ['git', 'clone', '-q', '--depth', '1']
+        if blob_filter:
+            cmd.append('--filter=blob:none')
+        subprocess.run(cmd + [url, str(path)], check=True)
+    return path
+
+
+def install_nodes(items, max_workers=8, blob_filter=False, install_requirements=True, events=None):
+    """
+    Clones or updates custom-node repositories concurrently, then installs
+    the union of their requirements.txt files with one pip call.
+
+    Args:
+        items (list): Parsed items whose URLs are git repositories.
+
+    Returns:
+        tuple: (checkouts, failures) as lists of paths and (url, error) pairs.
+    """
+    checkouts, failures = [], []
+    if not items:
+        return checkouts, failures
+
+    def work(item):
+        if events:
+            events.emit(ev.START, item['url'])
+        path = clone_or_update(item['url'], item['destination'], item['filename'], blob_filter)
+        if events:
+            events.emit(ev.FINISH, item['url'], source='git')
+        return path
+
+    print(f"Installing {len(items)} custom node repositories...")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [(item, pool.submit(work, item)) for item in items]
+        for item, future in futures:
+            try:
+                checkouts.append(future.result())
+            except subprocess.CalledProcessError as e:
+                print(f"Error installing {item['url']}: {e}")
+                failures.append((item['url'], e))
+                if events:
+                    events.emit(ev.ERROR, item['url'], error=str(e))
+
+    if install_requirements and checkouts:
+        requirements = pipdeps.RequirementSet()
+        for path in checkouts:
+            requirements.add_file(path / 'requirements.txt')
+        if requirements.lines:
+            pipdeps.install(requirements)
+    return checkouts, failures
@@ -0,0 +1,152 @@
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Answers worth another try: throttling and server-side trouble. Everything
+# else in the 4xx range will not change by asking again.
+RETRYABLE = (408, 425, 429, 500, 502, 503, 504)
+# Longest Retry-After we are willing to sit out
+MAX_RETRY_AFTER = 600
+_STATUS = re.compile(r'(?:HTTP(?: Error)? |status=)(\d{3})')
+
+
+class HostPolicy:
+    """
+    How hard a host may be pushed and how to authenticate against it.
+
+    Args:
+        name (str): Label, also the key hosts share limits under.
+        connections (int): Connections per file.
+        concurrent (int): Files from this host at the same time; None leaves
+                          it to the global limit.
+        token (str): Key into api_tokens ('huggingface', 'civitai').
+        token_param (str): Query parameter carrying the token. None sends it
+                           as an Authorization: Bearer header instead.
+        backoff (float): First retry delay in seconds; doubles per attempt up
+                         to max_backoff, with jitter.
+    """
+    __slots__ = ('name', 'connections', 'concurrent', 'token', 'token_param', 'backoff', 'max_backoff')
+
+    def __init__(self, name, connections=16, concurrent=None, token=None, token_param=None,
+                 backoff=1.0, max_backoff=60.0):
+        self.name = name
+        self.connections = connections
+        self.concurrent = concurrent
+        self.token = token
+        self.token_param = token_param
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number attempt + 1; a server's Retry-After wins."""
+        if retry_after is not None:
+            return min(max(retry_after, 0.0), MAX_RETRY_AFTER)
+        ceiling = min(self.max_backoff, self.backoff * 2 ** attempt)
+        # "Equal jitter": at least half the backoff, so retries never bunch up at zero
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def __repr__(self):
+        return f"HostPolicy({self.name!r}, connections={self.connections}, concurrent={self.concurrent})"
+
+
+# (domains, policy); a domain matches itself and its subdomains
+POLICIES = [
+    (('huggingface.co', 'hf.co'), HostPolicy('huggingface', connections=16, token='huggingface')),
+    # CivitAI answers 429 well below 16 connections per file. Its token goes
+    # in the query string: the download redirects to a signed CDN URL that
+    # rejects a second credential in the headers.
+    (('civitai.com',), HostPolicy('civitai', connections=4, concurrent=2, token='civitai',
+                                  token_param='token', backoff=5.0)),
+    (('drive.google.com', 'drive.usercontent.google.com', 'docs.google.com'),
+     HostPolicy('gdrive', connections=4, concurrent=2, backoff=5.0)),
+    # Cloudflare worker proxies (docs/url-instruction.md) are rate limited per account
+    (('workers.dev',), HostPolicy('worker', connections=8, concurrent=3, backoff=2.0)),
+]
+DEFAULT_POLICY = HostPolicy('default')
+
+
+def status_of(error):
+    """HTTP status behind an exception or an error message (aria2's "status=503"), else None."""
+    status = getattr(error, 'status', None) or getattr(error, 'code', None)
+    if isinstance(status, int):
+        return status
+    match = _STATUS.search(str(error))
+    return int(match.group(1)) if match else None
+
+
+def retryable(error):
+    """Network trouble, throttling and 5xx are worth another try; other HTTP errors are not."""
+    status = status_of(error)
+    return status is None or status in RETRYABLE
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date); None if absent or invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(error):
+    headers = getattr(error, 'headers', None) or {}
+    return parse_retry_after(headers.get('Retry-After'))
+
+
+class HostPolicies:
+    """
+    Looks up the HostPolicy for a URL and applies its credentials.
+
+    Args:
+        tokens (dict): api_tokens as collected by the widgets, e.g.
+                       {'huggingface': ..., 'civitai': ...}. Empty values are ignored.
+        policies (list): (domains, HostPolicy) pairs; defaults to POLICIES.
+    """
+
+    def __init__(self, tokens=None, policies=None, default=DEFAULT_POLICY):
+        self.tokens = {name: value for name, value in (tokens or {}).items() if value}
+        self.policies = POLICIES if policies is None else policies
+        self.default = default
+
+    def for_url(self, url):
+        host = (urlsplit(url).hostname or '').lower()
+        for domains, policy in self.policies:
+            if any(host == domain or host.endswith('.' + domain) for domain in domains):
+                return policy
+        return self.default
+
+    def _token(self, policy):
+        return self.tokens.get(policy.token) if policy.token else None
+
+    def headers(self, url):
+        """Authorization headers for url as "Name: value" strings."""
+        policy = self.for_url(url)
+        token = self._token(policy)
+        if token and not policy.token_param:
+            return [f"Authorization: Bearer {token}"]
+        return []
+
+    def authorize(self, url):
+        """url with the host's token added to the query string, for hosts that take it there."""
+        policy = self.for_url(url)
+        token = self._token(policy)
+        if not token or not policy.token_param:
+            return url
+        parts = urlsplit(url)
+        query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != policy.token_param]
+        query.append((policy.token_param, token))
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    def redact(self, text):
+        """text with every token masked, for logs and printed commands."""
+        text = str(text)
+        for token in self.tokens.values():
+            text = text.replace(token, '***')
+        return text
@@ -0,0 +1,99 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+PENDING = 'pending'
+DOWNLOADING = 'downloading'
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+_COLUMNS = ('url', 'destination', 'filename', 'size', 'etag', 'sha256', 'status', 'updated_at', 'transcode')
+
+
+class Manifest:
+    """
+    Persistent per-item download state, stored in a small SQLite file.
+
+    Rows are keyed by (url, destination), so the same URL routed to two tags
+    is tracked twice. A 'complete' row is trusted as long as the file on disk
+    still has the recorded size, which lets a re-run skip it without any
+    network access. transcode holds core.transcode's JSON record for a file
+    that was converted after download.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    url TEXT NOT NULL,
+                    destination TEXT NOT NULL,
+                    filename TEXT,
+                    size INTEGER,
+                    etag TEXT,
+                    sha256 TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    updated_at REAL,
+                    transcode TEXT,
+                    PRIMARY KEY (url, destination)
+                )
+            """)
+            # Manifests written before the column existed
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(items)")}
+            if 'transcode' not in columns:
+                self._conn.execute("ALTER TABLE items ADD COLUMN transcode TEXT")
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, url, destination):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM items WHERE url = ? AND destination = ?",
+                (url, str(destination))).fetchone()
+        return dict(row) if row else None
+
+    def update(self, url, destination, **fields):
+        """Inserts or updates the row for (url, destination) with the given columns."""
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown manifest columns: {', '.join(sorted(unknown))}")
+        fields['updated_at'] = time.time()
+        names = ', '.join(fields)
+        marks = ', '.join('?' for _ in fields)
+        updates = ', '.join(f"{name} = excluded.{name}" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO items (url, destination, {names}) VALUES (?, ?, {marks}) "
+                f"ON CONFLICT (url, destination) DO UPDATE SET {updates}",
+                (url, str(destination), *fields.values()))
+
+    def rows(self, status=None):
+        query = "SELECT * FROM items"
+        args = ()
+        if status:
+            query += " WHERE status = ?"
+            args = (status,)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, args)]
+
+    def is_complete(self, url, destination):
+        """True if the item finished earlier and its file is still intact on disk."""
+        row = self.get(url, destination)
+        if not row or row['status'] != COMPLETE or not row['filename']:
+            return False
+        path = Path(destination) / row['filename']
+        if path.is_dir():
+            return True  # Extracted archive or cloned repository
+        if not path.is_file() or Path(f"{path}.aria2").exists():
+            return False
+        return row['size'] is None or path.stat().st_size == row['size']
+
+    def known_filename(self, url, destination):
+        """Filename recorded by an earlier run, so an interrupted download resumes in place."""
+        row = self.get(url, destination)
+        return row['filename'] if row else None
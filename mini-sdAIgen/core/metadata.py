@@ -0,0 +1,293 @@
+import json
+import posixpath
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+CIVITAI_API = 'https://civitai.com/api/v1'
+HF_ENDPOINT = 'https://huggingface.co'
+# Model versions hardly ever change; after a day a cached answer is
+# revalidated with its ETag, which costs a request but no body
+DEFAULT_TTL = 24 * 3600
+
+_CIVITAI_VERSION = re.compile(r'civitai\.com/api/download/models/(\d+)')
+_CIVITAI_MODEL = re.compile(r'civitai\.com/models/(\d+)')
+_HF_RESOLVE = re.compile(r'^https?://(?:www\.)?(?:huggingface\.co|hf\.co)/(?:(datasets|spaces)/)?'
+                         r'([^/]+/[^/]+)/resolve/([^/]+)/([^?#]+)')
+# Download URL query parameters that pick one of a version's files
+_CIVITAI_FILE_KEYS = ('type', 'format', 'size', 'fp')
+
+
+class ModelInfo:
+    """
+    What the hosting site says about one file: canonical filename, size in
+    bytes, SHA-256 and a preview image URL. Fields the site does not report
+    are None.
+    """
+    __slots__ = ('url', 'filename', 'size', 'sha256', 'preview', 'source')
+
+    def __init__(self, url, filename=None, size=None, sha256=None, preview=None, source=None):
+        self.url = url
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256.lower() if sha256 else None
+        self.preview = preview
+        self.source = source
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"ModelInfo({self.filename!r}, size={self.size}, source={self.source!r})"
+
+
+class MetadataCache:
+    """
+    API responses kept in a small SQLite file, keyed by request URL.
+
+    A response younger than ttl seconds is used as is; an older one is
+    revalidated with If-None-Match and, if the server answers 304, kept for
+    another ttl. path None keeps the cache in memory for one run.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path) if self.path else ':memory:', check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    body TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM responses WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def fresh(self, entry):
+        return entry is not None and time.time() - entry['fetched_at'] < self.ttl
+
+    def put(self, url, body, etag=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO responses (url, etag, body, fetched_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET etag = excluded.etag, body = excluded.body, "
+                "fetched_at = excluded.fetched_at",
+                (url, etag, body, time.time()))
+
+    def entries(self):
+        """(request URL, response body) of everything cached, newest first."""
+        with self._lock:
+            return [tuple(row) for row in
+                    self._conn.execute("SELECT url, body FROM responses ORDER BY fetched_at DESC")]
+
+    def touch(self, url):
+        """Restarts the TTL of a response the server confirmed unchanged."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+
+def civitai_version(url):
+    """Model-version ID of a CivitAI download URL, model page (?modelVersionId=) or bare ID; else None."""
+    url = str(url).strip()
+    if url.isdigit():
+        return url
+    match = _CIVITAI_VERSION.search(url)
+    if match:
+        return match.group(1)
+    if _CIVITAI_MODEL.search(url):
+        return (parse_qs(urlsplit(url).query).get('modelVersionId') or [None])[0]
+    return None
+
+
+def _civitai_file(version, url):
+    """The file a download URL asks for: matching its type/format/size/fp query, else the primary one."""
+    files = version.get('files') or []
+    query = {k: v[0].lower() for k, v in parse_qs(urlsplit(str(url)).query).items() if k in _CIVITAI_FILE_KEYS}
+    if query:
+        def matches(f):
+            meta = {'type': f.get('type'), **(f.get('metadata') or {})}
+            return all(str(meta.get(k) or '').lower() == v for k, v in query.items())
+        files = [f for f in files if matches(f)] or files
+    return next((f for f in files if f.get('primary')), files[0] if files else None)
+
+
+def _civitai_info(url, version):
+    images = version.get('images') or []
+    preview = next((i['url'] for i in images if i.get('type', 'image') == 'image' and i.get('url')), None)
+    f = _civitai_file(version, url)
+    if f is None:
+        return ModelInfo(url, preview=preview, source='civitai')
+    size = f.get('sizeKB')
+    return ModelInfo(url, f.get('name'), round(size * 1024) if size else None,
+                     (f.get('hashes') or {}).get('SHA256'), preview, 'civitai')
+
+
+def _hf_info(url, path, tree):
+    entry = next((e for e in tree if e.get('path') == path), None) or {}
+    lfs = entry.get('lfs') or {}
+    # Only LFS files report a SHA-256; the plain oid is a git blob hash
+    return ModelInfo(url, posixpath.basename(path), entry.get('size'), lfs.get('oid'), source='huggingface')
+
+
+class MetadataResolver:
+    """
+    Looks up filename, size, SHA-256 and preview image for CivitAI model
+    versions and HuggingFace resolve/ URLs.
+
+    Every API document is fetched once per run and kept in a MetadataCache,
+    so a re-run or re-parse within the TTL costs no requests at all. Files
+    in the same HuggingFace folder share one tree listing; resolve_many()
+    fetches the distinct documents of a list concurrently.
+
+    Args:
+        cache (MetadataCache): Where responses persist; in memory if None.
+        tokens (dict): api_tokens as collected by the widgets.
+        limit (int): Requests in flight for resolve_many().
+        civitai_api, hf_endpoint (str): API bases, for a local stub server.
+    """
+
+    def __init__(self, cache=None, tokens=None, limit=8, timeout=15,
+                 civitai_api=CIVITAI_API, hf_endpoint=HF_ENDPOINT):
+        self.cache = cache or MetadataCache()
+        self.tokens = tokens or {}
+        self.limit = limit
+        self.timeout = timeout
+        self.civitai_api = civitai_api.rstrip('/')
+        self.hf_endpoint = hf_endpoint.rstrip('/')
+        self._documents = {}
+        self._files = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.cache.close()
+
+    def _target(self, url):
+        """(API URL, token name, parse(data) -> ModelInfo) for url, or None if no site knows it."""
+        version = civitai_version(url)
+        if version:
+            return (f"{self.civitai_api}/model-versions/{version}", 'civitai',
+                    lambda data: _civitai_info(url, data))
+        match = _HF_RESOLVE.match(str(url))
+        if match:
+            kind, repo, revision, path = match.groups()
+            path = unquote(path)
+            folder = posixpath.dirname(path)
+            api = (f"{self.hf_endpoint}/api/{kind or 'models'}/{repo}/tree/{quote(unquote(revision), safe='')}"
+                   + (f"/{quote(folder)}" if folder else ''))
+            return api, 'huggingface', lambda tree: _hf_info(url, path, tree)
+        return None
+
+    def _get(self, api_url, token):
+        entry = self.cache.get(api_url)
+        if self.cache.fresh(entry):
+            return json.loads(entry['body'])
+        headers = {'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        req = urllib.request.Request(api_url, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                body = resp.read().decode('utf-8')
+                etag = resp.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or not entry:
+                raise
+            self.cache.touch(api_url)
+            return json.loads(entry['body'])
+        data = json.loads(body)
+        self.cache.put(api_url, body, etag)
+        return data
+
+    def _document(self, api_url, token_name):
+        # Errors are remembered too, so a failing API is asked once per run
+        with self._lock:
+            result = self._documents.get(api_url)
+        if result is None:
+            try:
+                result = self._get(api_url, self.tokens.get(token_name))
+            except (OSError, ValueError) as e:
+                result = e
+            with self._lock:
+                self._documents[api_url] = result
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def lookup(self, url):
+        """ModelInfo for url; None if no site knows it or the lookup failed."""
+        target = self._target(url)
+        if target is None:
+            return None
+        api_url, token_name, parse = target
+        try:
+            return parse(self._document(api_url, token_name))
+        except (OSError, ValueError) as e:
+            print(f"Could not look up metadata for {url}: {e}")
+            return None
+
+    def find(self, filename):
+        """
+        Download URL of a file called filename in any cached CivitAI version
+        or HuggingFace folder listing, without a request; None if none has it.
+        """
+        with self._lock:
+            if self._files is None:
+                self._files = self._index()
+            return self._files.get(filename)
+
+    def _index(self):
+        tree = re.compile(re.escape(self.hf_endpoint) + r'/api/(models|datasets|spaces)/([^/]+/[^/]+)/tree/([^/]+)')
+        files = {}
+        for api_url, body in self.cache.entries():
+            try:
+                data = json.loads(body)
+            except ValueError:
+                continue
+            match = tree.match(api_url)
+            if match and isinstance(data, list):
+                kind, repo, revision = match.groups()
+                prefix = '' if kind == 'models' else f"{kind}/"
+                for entry in data:
+                    if entry.get('type') == 'file' and entry.get('path'):
+                        files.setdefault(posixpath.basename(entry['path']),
+                                         f"{self.hf_endpoint}/{prefix}{repo}/resolve/{revision}/{quote(entry['path'])}")
+            elif api_url.startswith(self.civitai_api + '/model-versions/') and isinstance(data, dict):
+                fallback = f"https://civitai.com/api/download/models/{data['id']}" if data.get('id') else None
+                for f in data.get('files') or []:
+                    url = f.get('downloadUrl') or fallback
+                    if f.get('name') and url:
+                        files.setdefault(f['name'], url)
+        return files
+
+    def resolve_many(self, urls):
+        """url -> ModelInfo (or None) for a whole list; each distinct API document is fetched once."""
+        urls = list(dict.fromkeys(str(u) for u in urls))
+        targets = {t[0]: t[1] for t in map(self._target, urls) if t}
+        with ThreadPoolExecutor(max_workers=self.limit) as pool:
+            list(pool.map(lambda api: self._fetch_quietly(api, targets[api]), targets))
+        return {url: self.lookup(url) for url in urls}
+
+    def _fetch_quietly(self, api_url, token_name):
+        try:
+            self._document(api_url, token_name)
+        except (OSError, ValueError):
+            pass  # reported by lookup()
@@ -1,72 +1,190 @@
 import re
+from collections import namedtuple
 from pathlib import Path
 from .paths import PREFIX_MAP
 
-def parse_empowerment_text(text: str) -> list:
+# Pre-compile regex for trailing annotations: [filename] and/or [sha256:<hex>]
+ANNOTATION_PATTERN = re.compile(r'\[([^\[\]]*)\]$') # Match [content] at end of string
+
+ParseWarning = namedtuple('ParseWarning', ['line', 'text', 'reason'])
+
+# Alternative URLs of one file share a line, separated by whitespace or "|"
+MIRROR_SEPARATOR = re.compile(r'\s*\|\s*|\s+')
+
+
+class Item:
     """
-    Parses the text from the Empowerment widget.
-    
+    One parsed download. Slotted to stay small on lists with thousands of
+    lines, and readable like the dicts parse_empowerment_text returns
+    (item['url'], item.get('sha256'), dict(item)).
+
+    url is the first URL on the line and identifies the item (manifest,
+    store, duplicates); mirrors holds the alternatives listed after it.
+    """
+    __slots__ = ('url', 'destination', 'filename', 'sha256', 'tag', 'line', 'priority', 'mirrors')
+
+    def __init__(self, url, destination, filename=None, sha256=None, tag=None, line=None, priority=False,
+                 mirrors=()):
+        self.url = url
+        self.destination = destination
+        self.filename = filename
+        self.sha256 = sha256
+        self.tag = tag
+        self.line = line
+        self.priority = priority
+        self.mirrors = tuple(mirrors)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def as_dict(self):
+        return {'url': self.url, 'destination': self.destination,
+                'filename': self.filename, 'sha256': self.sha256}
+
+    def __repr__(self):
+        return f"Item({self.tag} {self.url!r}, line={self.line})"
+
+
+def _lines(source):
+    if isinstance(source, str):
+        return source.split('\n')
+    return source  # file object or any iterable of lines
+
+
+def iter_empowerment(source, warnings=None):
+    """
+    Streams items out of Empowerment text as each line is read.
+
     Args:
-        text (str): Multiline string containing tags and URLs.
-                   Example:
-                   $unet
-                   https://site.com/model.safetensors
-                   $lora
-                   https://site.com/lora.safetensors[my_lora.safetensors]
-                   
-    Returns:
-        list: A list of dictionaries, each containing:
-              {
-                  'url': str,
-                  'destination': Path,
-                  'filename': str or None
-              }
+        source: The text, an open file, or any iterable of lines.
+        warnings (list): Receives a ParseWarning for every line that was
+                         skipped (unknown tag, URL before any tag, not a URL,
+                         duplicate of an earlier (url, destination) pair).
+
+    Yields:
+        Item: One per unique (url, destination), in input order.
     """
-    lines = text.split('\n')
+    current_tag = None
     current_destination = None
-    results = []
-    
-    # Pre-compile regex for filename extraction [filename]
-    filename_pattern = re.compile(r'\[(.*?)\]$') # Match [content] at end of string
-
-    for line in lines:
-        line = line.strip()
-        
+    seen = {}
+
+    def warn(lineno, text, reason):
+        if warnings is not None:
+            warnings.append(ParseWarning(lineno, text, reason))
+
+    for lineno, raw in enumerate(_lines(source), start=1):
+        line = raw.strip()
+
         # Skip empty lines and full comments
         if not line or line.startswith('#'):
             continue
-            
+
         # Remove inline comments (e.g. "url # comment")
         # Be careful not to remove # in URLs if that's possible (rare but good to be safe)
         # For now, simple split on space+# might be safer than just #
         if ' #' in line:
             line = line.split(' #')[0].strip()
-        elif line.startswith('#'): # Handle case where # was at start (already handled but safe)
-            continue
-            
+
         # Check for tags
         if line.startswith('$'):
             # Allow for tag params potentially in future, but for now exact match
-            tag = line.split()[0] 
+            tag = line.split()[0]
             if tag in PREFIX_MAP:
+                current_tag = tag
                 current_destination = PREFIX_MAP[tag]
-                continue
-        
-        # If we have a destination, treat as URL
-        if current_destination:
-            # Handle [filename] syntax
-            filename = None
-            match = filename_pattern.search(line)
-            if match:
-                filename = match.group(1)
-                line = line[:match.start()].strip() # Remove the [filename] part from URL
-            
-            # Simple validation: looks like a URL?
-            if line.startswith('http'):
-                results.append({
-                    'url': line,
-                    'destination': current_destination,
-                    'filename': filename
-                })
-                
-    return results
+            else:
+                # Don't let the following URLs land in the previous tag's folder
+                warn(lineno, line, f"unknown tag {tag}")
+                current_tag = current_destination = None
+            continue
+
+        if not current_destination:
+            warn(lineno, line, "no valid tag before this line")
+            continue
+
+        # Handle [filename] and [sha256:...] syntax, in either order
+        filename = None
+        sha256 = None
+        while match := ANNOTATION_PATTERN.search(line):
+            value = match.group(1).strip()
+            if value.lower().startswith('sha256:'):
+                sha256 = value[len('sha256:'):].strip().lower()
+            else:
+                filename = value
+            line = line[:match.start()].strip() # Remove the annotation from URL
+
+        # "!https://..." marks a file to fetch before everything else
+        priority = line.startswith('!')
+        if priority:
+            line = line[1:].strip()
+
+        # Simple validation: looks like a URL? (every mirror has to)
+        url, *mirrors = MIRROR_SEPARATOR.split(line)
+        if not all(u.startswith('http') for u in (url, *mirrors)):
+            warn(lineno, line, "not a URL")
+            continue
+
+        key = (url, current_destination)
+        if key in seen:
+            warn(lineno, line, f"duplicate of line {seen[key]}")
+            continue
+        seen[key] = lineno
+        yield Item(url, current_destination, filename, sha256, current_tag, lineno, priority,
+                   dict.fromkeys(m for m in mirrors if m != url))
+
+
+def parse_empowerment_text(text: str) -> list:
+    """
+    Parses the text from the Empowerment widget.
+
+    Args:
+        text (str): Multiline string containing tags and URLs.
+                   Example:
+                   $unet
+                   https://site.com/model.safetensors
+                   $lora
+                   https://site.com/lora.safetensors[my_lora.safetensors]
+                   https://site.com/vae.safetensors[vae.safetensors][sha256:9f86d0...]
+                   !https://site.com/needed-first.safetensors
+                   https://site.com/x.safetensors | https://mirror.org/x.safetensors
+
+    Returns:
+        list: A list of dictionaries, each containing:
+              {
+                  'url': str,
+                  'destination': Path,
+                  'filename': str or None,
+                  'sha256': str or None
+              }
+    """
+    return [item.as_dict() for item in iter_empowerment(text)]
+
+
+ParsePreview = namedtuple('ParsePreview', ['counts', 'mirrors', 'duplicates', 'invalid'])
+ParsePreview.__doc__ = """
+Empowerment text summed up before anything downloads: counts maps each tag
+to its number of items, mirrors counts alternative URLs, duplicates and
+invalid are the ParseWarnings of skipped lines.
+"""
+
+
+def preview_empowerment(text):
+    """Parses text without touching the network and returns a ParsePreview."""
+    warnings = []
+    counts = {}
+    mirrors = 0
+    for item in iter_empowerment(text, warnings):
+        counts[item.tag] = counts.get(item.tag, 0) + 1
+        mirrors += len(item.mirrors)
+    duplicates = [w for w in warnings if w.reason.startswith('duplicate')]
+    invalid = [w for w in warnings if not w.reason.startswith('duplicate')]
+    return ParsePreview(counts, mirrors, duplicates, invalid)
@@ -4,19 +4,42 @@ from pathlib import Path
 DEFAULT_COMFY_ROOT = Path("/root/ComfyUI")  # Standard Kaggle/Colab path
 DEFAULT_MODELS_ROOT = DEFAULT_COMFY_ROOT / "models"
 DEFAULT_NODES_ROOT = DEFAULT_COMFY_ROOT / "custom_nodes"
+# Content-addressed blob store; must share a filesystem with models/ for hardlinks
+DEFAULT_STORE_ROOT = DEFAULT_COMFY_ROOT / ".model-store"
+# Downloads and extractions run under this suffix and are renamed into place
+# once complete, so ComfyUI never lists a half-written model
+PARTIAL_SUFFIX = ".part"
 
 # Tag Mapping to Directories
-PREFIX_MAP = {
-    '$unet': DEFAULT_MODELS_ROOT / "unet",
-    '$clip': DEFAULT_MODELS_ROOT / "clip",
-    '$vae': DEFAULT_MODELS_ROOT / "vae",
-    '$lora': DEFAULT_MODELS_ROOT / "loras",
-    '$cnet': DEFAULT_MODELS_ROOT / "controlnet",
-    '$ups': DEFAULT_MODELS_ROOT / "upscale_models",
-    '$ad': DEFAULT_MODELS_ROOT / "adetailer",
-    '$vis': DEFAULT_MODELS_ROOT / "clip_vision",
-    '$ext': DEFAULT_NODES_ROOT, 
-    # Extra ones found in sdAIgen but maybe not explicitly requested, nice to have
-    '$emb': DEFAULT_MODELS_ROOT / "embeddings",
-    '$diff': DEFAULT_MODELS_ROOT / "diffusers",
-}
+def _prefix_map(models_root, nodes_root):
+    return {
+        '$ckpt': models_root / "checkpoints",
+        '$unet': models_root / "unet",
+        '$clip': models_root / "clip",
+        '$vae': models_root / "vae",
+        '$lora': models_root / "loras",
+        '$cnet': models_root / "controlnet",
+        '$ups': models_root / "upscale_models",
+        '$ad': models_root / "adetailer",
+        '$vis': models_root / "clip_vision",
+        '$ext': nodes_root,
+        # Extra ones found in sdAIgen but maybe not explicitly requested, nice to have
+        '$emb': models_root / "embeddings",
+        '$diff': models_root / "diffusers",
+    }
+
+PREFIX_MAP = _prefix_map(DEFAULT_MODELS_ROOT, DEFAULT_NODES_ROOT)
+
+
+def set_comfy_root(root):
+    """
+    Re-roots every default path at a ComfyUI checkout. PREFIX_MAP is updated
+    in place, so modules that did `from .paths import PREFIX_MAP` see it too.
+    """
+    global DEFAULT_COMFY_ROOT, DEFAULT_MODELS_ROOT, DEFAULT_NODES_ROOT, DEFAULT_STORE_ROOT
+    DEFAULT_COMFY_ROOT = Path(root)
+    DEFAULT_MODELS_ROOT = DEFAULT_COMFY_ROOT / "models"
+    DEFAULT_NODES_ROOT = DEFAULT_COMFY_ROOT / "custom_nodes"
+    DEFAULT_STORE_ROOT = DEFAULT_COMFY_ROOT / ".model-store"
+    PREFIX_MAP.clear()
+    PREFIX_MAP.update(_prefix_map(DEFAULT_MODELS_ROOT, DEFAULT_NODES_ROOT))
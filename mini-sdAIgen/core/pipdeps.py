@@ -0,0 +1,117 @@
+import hashlib
+import subprocess
+import sys
+from importlib import metadata
+from pathlib import Path
+
+try:
+    from packaging.requirements import Requirement, InvalidRequirement
+    from packaging.utils import canonicalize_name
+except ImportError:  # Fresh VMs always have pip's vendored copy
+    from pip._vendor.packaging.requirements import Requirement, InvalidRequirement
+    from pip._vendor.packaging.utils import canonicalize_name
+
+# Heavy/pre-installed packages we never let a requirements file touch
+EXCLUDED_PACKAGES = {'torch', 'torchvision', 'torchaudio', 'cupy-cuda12x', 'cupy-cuda11x'}
+
+
+class RequirementSet:
+    """
+    Requirements merged from every source that setup installs.
+
+    Sources are requirement strings or paths to requirements.txt files
+    (missing files are ignored, '-r' includes are followed). Option lines
+    such as '--extra-index-url' are kept and passed through to pip.
+    """
+
+    def __init__(self, excluded=EXCLUDED_PACKAGES):
+        self.excluded = {canonicalize_name(name) for name in excluded}
+        self.lines = []
+        self.options = []
+
+    def add(self, line):
+        line = line.split(' #')[0].strip()
+        if not line or line.startswith('#'):
+            return
+        if line.startswith('-'):
+            if line not in self.options:
+                self.options.append(line)
+            return
+        try:
+            name = canonicalize_name(Requirement(line).name)
+        except InvalidRequirement:
+            name = None  # URLs, git+ specs: pip has to look at these
+        if name in self.excluded or line in self.lines:
+            return
+        self.lines.append(line)
+
+    def add_file(self, path):
+        path = Path(path)
+        if not path.exists():
+            return
+        for line in path.read_text().splitlines():
+            stripped = line.strip()
+            if stripped.startswith(('-r ', '--requirement ')):
+                self.add_file(path.parent / stripped.split(None, 1)[1])
+            else:
+                self.add(stripped)
+
+    def fingerprint(self):
+        digest = hashlib.sha256(sys.executable.encode())
+        for line in sorted(self.lines) + self.options:
+            digest.update(b'\0' + line.encode())
+        return digest.hexdigest()
+
+    def missing(self):
+        """Requirements not already satisfied in this interpreter, checked without pip."""
+        return [line for line in self.lines if not is_satisfied(line)]
+
+
+def is_satisfied(line):
+    try:
+        req = Requirement(line)
+    except InvalidRequirement:
+        return False
+    if req.marker is not None and not req.marker.evaluate():
+        return True
+    if req.url:
+        return False
+    try:
+        installed = metadata.version(req.name)
+    except metadata.PackageNotFoundError:
+        return False
+    return req.specifier.contains(installed, prereleases=True)
+
+
+def install(requirements, stamp_path=None, wheelhouse=None):
+    """
+    Installs a RequirementSet with at most one pip invocation.
+
+    If stamp_path holds the fingerprint of an identical requirement set from
+    an earlier successful run, pip is skipped entirely. Otherwise only the
+    requirements that importlib.metadata cannot already satisfy go to pip,
+    through the given core.wheelhouse.Wheelhouse if there is one.
+
+    Returns:
+        list: The requirement lines handed to pip (empty if none).
+    """
+    stamp = Path(stamp_path) if stamp_path else None
+    fingerprint = requirements.fingerprint()
+    if stamp and stamp.exists() and stamp.read_text().strip() == fingerprint:
+        print("Python requirements unchanged since last setup. Skipping pip.")
+        return []
+
+    missing = requirements.missing()
+    if missing:
+        print(f"Installing {len(missing)} of {len(requirements.lines)} Python requirements...")
+        if wheelhouse is not None:
+            wheelhouse.install(missing, requirements.options)
+        else:
+            subprocess.run([sys.executable, "-m", "pip", "install", "-q", *requirements.options, *missing], check=True)
+    else:
+        print(f"All {len(requirements.lines)} Python requirements already satisfied.")
+
+    if stamp:
+        stamp.parent.mkdir(parents=True, exist_ok=True)
+        stamp.write_text(fingerprint)
+    return missing
@@ -0,0 +1,245 @@
+import asyncio
+import email.message
+import os
+import shutil
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from . import gdrive
+from . import gitnodes
+
+# Answers that will not change by retrying: the item is dropped from the plan
+UNREACHABLE = (401, 403, 404, 410)
+GB = 1024 ** 3
+
+
+class InsufficientSpace(Exception):
+    pass
+
+
+class Resolved:
+    """Preflight result for one item: final URL, size, filename and ETag as the server reports them."""
+    __slots__ = ('item', 'url', 'size', 'filename', 'status', 'error', 'etag')
+
+    def __init__(self, item, url=None, size=None, filename=None, status=None, error=None, etag=None):
+        self.item = item
+        self.url = url or item['url']
+        self.size = size
+        self.filename = filename
+        self.status = status
+        self.error = error
+        self.etag = etag
+
+    @property
+    def unreachable(self):
+        return self.status in UNREACHABLE
+
+
+class _KeepMethodRedirect(urllib.request.HTTPRedirectHandler):
+    # urllib turns a redirected HEAD into a GET; keep it a HEAD
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        new = super().redirect_request(req, fp, code, msg, headers, newurl)
+        if new is not None:
+            new.method = req.get_method()
+        return new
+
+
+_opener = urllib.request.build_opener(_KeepMethodRedirect)
+
+
+def disposition_filename(value):
+    """Filename from a Content-Disposition header (plain or RFC 5987 filename*=)."""
+    if not value:
+        return None
+    message = email.message.Message()
+    message['Content-Disposition'] = value
+    name = message.get_filename()
+    return os.path.basename(name) if name else None
+
+
+def _request(url, headers, timeout, method='HEAD'):
+    req = urllib.request.Request(url, headers=headers, method=method)
+    if method == 'GET':
+        req.add_header('Range', 'bytes=0-0')
+    with _opener.open(req, timeout=timeout) as resp:
+        size = resp.headers.get('Content-Length')
+        content_range = resp.headers.get('Content-Range', '')
+        if resp.status == 206 and '/' in content_range:
+            size = content_range.rsplit('/', 1)[1]
+        return (resp.geturl(), int(size) if size and size.isdigit() else None,
+                disposition_filename(resp.headers.get('Content-Disposition')), resp.status,
+                resp.headers.get('ETag'))
+
+
+def resolve_one(item, headers=None, timeout=15, url=None):
+    """
+    Follows redirects with HEAD; servers that refuse HEAD get a one-byte ranged GET.
+    Google Drive links go through core.gdrive, past the virus-scan page.
+
+    url, if given, is requested instead of item['url'] (e.g. with a token in
+    the query string); it is not reported back unless a redirect changed it.
+    """
+    request_url = url or item['url']
+    if gdrive.is_drive_url(request_url):
+        try:
+            drive = gdrive.resolve(request_url, timeout)
+        except gdrive.DriveError as e:
+            return Resolved(item, status=e.status, error=str(e))
+        except (OSError, ValueError) as e:
+            return Resolved(item, error=str(e))
+        return Resolved(item, size=drive.size, filename=drive.filename, status=200)
+    try:
+        try:
+            url, size, filename, status, etag = _request(request_url, headers or {}, timeout)
+        except urllib.error.HTTPError as e:
+            if e.code not in (400, 403, 405, 501):
+                raise
+            url, size, filename, status, etag = _request(request_url, headers or {}, timeout, method='GET')
+    except urllib.error.HTTPError as e:
+        return Resolved(item, status=e.code, error=f"HTTP {e.code} {e.reason}")
+    except (OSError, ValueError) as e:
+        return Resolved(item, error=str(e))
+    if not filename:
+        filename = unquote(Path(urlparse(url).path).name) or None
+    return Resolved(item, url if url != request_url else None, size, filename, status, etag=etag)
+
+
+async def resolve_all(items, headers_for=None, limit=16, timeout=15, url_for=None):
+    """
+    Resolves items concurrently, at most limit requests in flight.
+
+    Args:
+        headers_for (callable): url -> list of "Name: value" header strings.
+        url_for (callable): url -> the URL to request, e.g. with a token added.
+
+    Returns:
+        list: One Resolved per item, in input order.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def resolve(item):
+        # An item with mirrors is only unreachable if every mirror is down
+        first = None
+        for url in (item['url'], *(item.get('mirrors') or ())):
+            headers = dict(h.split(': ', 1) for h in (headers_for(url) if headers_for else []))
+            async with semaphore:
+                resolved = await asyncio.to_thread(resolve_one, item, headers, timeout,
+                                                   url_for(url) if url_for else url)
+            if resolved.error is None:
+                return resolved
+            first = first or resolved
+        return first
+
+    return await asyncio.gather(*(resolve(item) for item in items))
+
+
+def _run(coro):
+    # Notebooks already run an event loop in the main thread
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+def _existing_parent(path):
+    path = Path(path).absolute()
+    while not path.exists():
+        path = path.parent
+    return path
+
+
+class Plan:
+    """
+    What a batch will download, in the order it should start.
+
+    Priority items ("!" in the Empowerment text) go first. Within each group
+    the largest files start first: with a fixed number of parallel slots the
+    batch then ends on small files instead of one big straggler. Unknown sizes
+    are treated as large. Items the server refused (401/403/404/410) are kept
+    out of the plan and listed in unreachable.
+    """
+
+    def __init__(self, resolved, reserve=GB):
+        self.reserve = reserve
+        self.unreachable = [r for r in resolved if r.unreachable]
+        ok = [r for r in resolved if not r.unreachable]
+        self.entries = sorted(ok, key=lambda r: (not r.item.get('priority'), r.size is not None, -(r.size or 0)))
+
+    @property
+    def items(self):
+        """Items to download; server-reported filenames are pinned where none was given."""
+        out = []
+        for r in self.entries:
+            item = r.item
+            if not item['filename'] and r.filename and r.filename != Path(urlparse(item['url']).path).name:
+                item = dict(item, filename=r.filename)
+            out.append(item)
+        return out
+
+    @property
+    def total_bytes(self):
+        return sum(r.size or 0 for r in self.entries)
+
+    @property
+    def unknown(self):
+        return [r for r in self.entries if r.size is None]
+
+    def bytes_by_destination(self):
+        totals = {}
+        for r in self.entries:
+            key = Path(r.item['destination'])
+            totals[key] = totals.get(key, 0) + (r.size or 0)
+        return totals
+
+    def space_by_device(self):
+        """filesystem -> (needed bytes including the reserve, free bytes, directory probed)."""
+        needed, probes = {}, {}
+        for destination, size in self.bytes_by_destination().items():
+            parent = _existing_parent(destination)
+            dev = parent.stat().st_dev
+            needed[dev] = needed.get(dev, self.reserve) + size
+            probes.setdefault(dev, parent)
+        return {dev: (needed[dev], shutil.disk_usage(probes[dev]).free, probes[dev]) for dev in needed}
+
+    def check_space(self):
+        """Raises InsufficientSpace if any filesystem cannot hold its share of the plan."""
+        for needed, free, probe in self.space_by_device().values():
+            if needed > free:
+                raise InsufficientSpace(
+                    f"Plan needs {needed / GB:.1f} GB on {probe} (including {self.reserve / GB:.1f} GB "
+                    f"reserve) but only {free / GB:.1f} GB is free")
+
+    def print_summary(self):
+        print("\n=== Download Plan ===")
+        for destination, size in sorted(self.bytes_by_destination().items()):
+            print(f"{str(destination):<60} {size / GB:8.2f} GB")
+        print(f"Total: {self.total_bytes / GB:.2f} GB in {len(self.entries)} items"
+              + (f" ({len(self.unknown)} of unknown size)" if self.unknown else ""))
+        for r in self.unreachable:
+            print(f"Unreachable, skipped: {r.item['url']} ({r.error})")
+
+
+def build_plan(items, headers_for=None, skip=None, limit=16, timeout=15, reserve=GB, url_for=None):
+    """
+    Resolves items and returns a Plan.
+
+    Custom-node repositories are not probed (they are not file URLs) and count as
+    unknown size; items for which skip(item) is true, e.g. already on disk
+    or in the blob store, count as zero bytes.
+    """
+    items = list(items)
+    local = {id(x) for x in items if skip and skip(x)}
+    probe = [x for x in items if id(x) not in local and not gitnodes.is_node_repo(x)]
+    resolved = {id(r.item): r for r in _run(resolve_all(probe, headers_for, limit, timeout, url_for))}
+    entries = []
+    for item in items:
+        if id(item) in local:
+            entries.append(Resolved(item, size=0))
+        else:
+            entries.append(resolved.get(id(item)) or Resolved(item))
+    return Plan(entries, reserve)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from .verify import sha256_file
+
+
+class BlobStore:
+    """
+    Content-addressed model store shared by every PREFIX_MAP destination.
+
+    Layout:
+        <root>/blobs/<sha256>        one copy of each distinct file
+        <root>/urls/<sha256(url)>    {"sha256": ..., "filename": ...}
+
+    Files under models/<dir> are hardlinks into blobs/ (symlinks when the
+    store lives on another filesystem), so a URL that is already in the
+    store costs no network and no extra disk when another tag needs it.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.urls = self.root / "urls"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.urls.mkdir(parents=True, exist_ok=True)
+
+    def _url_entry(self, url):
+        return self.urls / hashlib.sha256(url.encode()).hexdigest()
+
+    def lookup(self, url):
+        """Returns {"sha256", "filename"} for a URL already in the store, else None."""
+        entry = self._url_entry(url)
+        try:
+            data = json.loads(entry.read_text())
+        except (OSError, ValueError):
+            return None
+        if not (self.blobs / data['sha256']).is_file():
+            return None
+        return data
+
+    def blob_path(self, sha256):
+        return self.blobs / sha256
+
+    def ingest(self, url, path, sha256=None):
+        """
+        Moves a freshly downloaded file into the store and links it back in place.
+
+        Args:
+            url (str): Source URL, remembered so later requests skip the network.
+            path (Path): The downloaded file.
+            sha256 (str): Hash if already known, otherwise computed here.
+
+        Returns:
+            str: The file's SHA-256.
+        """
+        path = Path(path)
+        sha256 = sha256 or sha256_file(path)
+        blob = self.blob_path(sha256)
+        if blob.is_file():
+            # Same bytes already stored under another URL: drop the duplicate
+            path.unlink()
+        else:
+            try:
+                os.replace(path, blob)
+            except OSError:
+                # Store on another filesystem; keep the file where it is
+                blob.symlink_to(path.resolve())
+                self._write_entry(url, sha256, path.name)
+                return sha256
+        self.materialize(sha256, path)
+        self._write_entry(url, sha256, path.name)
+        return sha256
+
+    def materialize(self, sha256, target):
+        """Links a stored blob to target, replacing whatever is there."""
+        target = Path(target)
+        blob = self.blob_path(sha256)
+        if target.exists() and target.samefile(blob):
+            return target
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.link")
+        if tmp.is_symlink() or tmp.exists():
+            tmp.unlink()
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            tmp.symlink_to(blob.resolve())
+        os.replace(tmp, target)
+        return target
+
+    def _write_entry(self, url, sha256, filename):
+        entry = self._url_entry(url)
+        tmp = entry.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'url': url, 'sha256': sha256, 'filename': filename}))
+        os.replace(tmp, entry)
@@ -0,0 +1,145 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from . import events as ev
+
+OK = 'ok'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class Task:
+    """
+    One step of a setup DAG.
+
+    Args:
+        name (str): Unique task name, referenced by other tasks' deps.
+        func (callable): Called with no arguments on a worker thread.
+        deps (iterable): Names of tasks that must succeed first.
+        lock (str): Tasks sharing a lock name never run at the same time
+                    (e.g. 'apt' for the dpkg lock, 'pip' for site-packages).
+    """
+
+    def __init__(self, name, func, deps=(), lock=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.lock = lock
+
+
+class TaskResult:
+    __slots__ = ('name', 'status', 'start', 'end', 'error')
+
+    def __init__(self, name, status, start=0.0, end=0.0, error=None):
+        self.name = name
+        self.status = status
+        self.start = start
+        self.end = end
+        self.error = error
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+def run_tasks(tasks, max_workers=8, events=None):
+    """
+    Runs tasks concurrently, each as soon as its dependencies have succeeded.
+
+    A failed task does not stop unrelated branches; its dependents are skipped.
+    If a core.events.EventLog is given, each task reports start/finish/error
+    into it with kind='task'.
+
+    Returns:
+        dict: Task name -> TaskResult, with start/end relative to the run start.
+    """
+    by_name = {t.name: t for t in tasks}
+    for task in tasks:
+        missing = [d for d in task.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"Task {task.name} depends on unknown task(s): {', '.join(missing)}")
+
+    locks = {t.lock: threading.Lock() for t in tasks if t.lock}
+    results = {}
+    t0 = time.monotonic()
+
+    def execute(task):
+        lock = locks.get(task.lock)
+        if lock:
+            lock.acquire()
+        start = time.monotonic() - t0
+        if events:
+            events.emit(ev.START, task.name, kind='task')
+        try:
+            task.func()
+            if events:
+                events.emit(ev.FINISH, task.name, kind='task')
+            return TaskResult(task.name, OK, start, time.monotonic() - t0)
+        except BaseException as e:
+            if events:
+                events.emit(ev.ERROR, task.name, kind='task', error=str(e))
+            return TaskResult(task.name, FAILED, start, time.monotonic() - t0, e)
+        finally:
+            if lock:
+                lock.release()
+
+    waiting = list(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while waiting or running:
+            for task in list(waiting):
+                dep_status = [results[d].status for d in task.deps if d in results]
+                if any(s != OK for s in dep_status):
+                    now = time.monotonic() - t0
+                    results[task.name] = TaskResult(task.name, SKIPPED, now, now)
+                    waiting.remove(task)
+                elif len(dep_status) == len(task.deps):
+                    running[pool.submit(execute, task)] = task
+                    waiting.remove(task)
+
+            if not running:
+                if waiting:
+                    # Everything left depends on a cycle
+                    names = ', '.join(t.name for t in waiting)
+                    raise ValueError(f"Dependency cycle between tasks: {names}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results[result.name] = result
+                del running[future]
+                if result.status == FAILED:
+                    print(f">> Task {result.name} failed: {result.error}")
+    return results
+
+
+def critical_path(tasks, results):
+    """The chain of dependencies ending at the last task to finish."""
+    by_name = {t.name: t for t in tasks}
+    ran = [r for r in results.values() if r.status != SKIPPED]
+    if not ran:
+        return []
+    current = max(ran, key=lambda r: r.end)
+    path = [current.name]
+    while True:
+        deps = [results[d] for d in by_name[current.name].deps if results[d].status != SKIPPED]
+        if not deps:
+            break
+        current = max(deps, key=lambda r: r.end)
+        path.append(current.name)
+    return path[::-1]
+
+
+def print_timing_report(tasks, results):
+    total = max((r.end for r in results.values()), default=0.0)
+    serial = sum(r.duration for r in results.values())
+    width = max((len(name) for name in results), default=4)
+
+    print("\n=== Setup Timing ===")
+    print(f"{'Task':<{width}}  {'Start':>7}  {'Time':>7}  Status")
+    for r in sorted(results.values(), key=lambda r: r.start):
+        print(f"{r.name:<{width}}  {r.start:6.1f}s  {r.duration:6.1f}s  {r.status}")
+    print(f"Wall time: {total:.1f}s (serial would be {serial:.1f}s)")
+    print(f"Critical path: {' -> '.join(critical_path(tasks, results))}")
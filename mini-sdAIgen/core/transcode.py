@@ -0,0 +1,225 @@
+import ctypes
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .paths import PARTIAL_SUFFIX
+from .verify import check_safetensors_header
+
+# Pickled PyTorch checkpoints; loading one can run code, which is why they
+# are loaded with weights_only=True and converted at all
+PICKLE_SUFFIXES = ('.ckpt', '.pt', '.pth', '.bin')
+# Down-cast targets as settings.json spells them
+DTYPES = {'fp16': 'F16', 'float16': 'F16', 'bf16': 'BF16', 'bfloat16': 'BF16'}
+# Only full-precision floats are down-cast; integers and 16-bit floats stay
+_DOWNCAST = ('F32', 'F64')
+# Conversions run on CPU beside the downloads; each holds about one tensor
+# in RAM, so two workers rarely compete with the transfers for memory
+DEFAULT_WORKERS = 2
+
+
+def available():
+    """True if torch can be imported; conversions are skipped without it."""
+    return importlib.util.find_spec('torch') is not None
+
+
+def _torch_dtypes(torch):
+    dtypes = {'F64': torch.float64, 'F32': torch.float32, 'F16': torch.float16, 'BF16': torch.bfloat16,
+              'I64': torch.int64, 'I32': torch.int32, 'I16': torch.int16, 'I8': torch.int8,
+              'U8': torch.uint8, 'BOOL': torch.bool}
+    for code, name in (('F8_E4M3', 'float8_e4m3fn'), ('F8_E5M2', 'float8_e5m2')):
+        if hasattr(torch, name):
+            dtypes[code] = getattr(torch, name)
+    return dtypes
+
+
+def _safetensors_source(path, torch, dtypes):
+    """(name, code, shape, load()) per tensor of a safetensors file; load() reads just that tensor."""
+    header = check_safetensors_header(path)
+    metadata = header.pop('__metadata__', None) or {}
+    with open(path, 'rb') as f:
+        start = 8 + struct.unpack('<Q', f.read(8))[0]
+
+    def loader(code, shape, begin, end):
+        def load():
+            with open(path, 'rb') as f:
+                f.seek(start + begin)
+                data = bytearray(f.read(end - begin))
+            if not data:
+                return torch.empty(shape, dtype=dtypes[code])
+            return torch.frombuffer(data, dtype=dtypes[code]).reshape(shape)
+        return load
+
+    entries = [(name, info['dtype'], info['shape'], loader(info['dtype'], info['shape'], *info['data_offsets']))
+               for name, info in sorted(header.items(), key=lambda kv: kv[1]['data_offsets'][0])]
+    return entries, metadata
+
+
+def _pickle_source(path, torch, dtypes):
+    """Tensors of a pickled checkpoint, memory-mapped where the file format allows it."""
+    try:
+        data = torch.load(path, map_location='cpu', weights_only=True, mmap=True)
+    except RuntimeError:
+        # Legacy (pre-zip) files cannot be mapped and are read whole
+        data = torch.load(path, map_location='cpu', weights_only=True)
+    if isinstance(data, dict) and isinstance(data.get('state_dict'), dict):
+        data = data['state_dict']
+    if not isinstance(data, dict):
+        raise ValueError(f"{Path(path).name} holds a {type(data).__name__}, not a state dict")
+    codes = {dtype: code for code, dtype in dtypes.items()}
+    entries, dropped = [], 0
+    for name, tensor in data.items():
+        if not isinstance(tensor, torch.Tensor) or tensor.dtype not in codes:
+            dropped += 1  # Training state: step counters, optimizer settings
+            continue
+        entries.append((str(name), codes[tensor.dtype], list(tensor.shape), lambda t=tensor: t))
+    return entries, {}, dropped
+
+
+def _write_safetensors(out, entries, metadata, target, torch, dtypes):
+    """
+    Writes entries as safetensors one tensor at a time: the header is
+    computed from shapes alone, then each tensor is loaded, cast and written
+    before the next one is touched. Returns (SHA-256, tensors down-cast).
+    """
+    header, offset, casts = {}, 0, []
+    for name, code, shape, load in entries:
+        out_code = target if target and code in _DOWNCAST else code
+        numel = 1
+        for dim in shape:
+            numel *= dim
+        size = numel * torch.empty((), dtype=dtypes[out_code]).element_size()
+        header[name] = {'dtype': out_code, 'shape': list(shape), 'data_offsets': [offset, offset + size]}
+        casts.append((load, dtypes[out_code], size))
+        offset += size
+    if metadata:
+        header['__metadata__'] = {str(k): str(v) for k, v in metadata.items()}
+    text = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    text += b' ' * (-len(text) % 8)  # Tensor data starts 8-byte aligned
+
+    digest = hashlib.sha256()
+    with open(out, 'wb') as f:
+        for chunk in (struct.pack('<Q', len(text)), text):
+            f.write(chunk)
+            digest.update(chunk)
+        for load, dtype, size in casts:
+            tensor = load().to(dtype).contiguous()
+            if size:
+                # Written straight from the tensor's memory, without a copy
+                view = memoryview((ctypes.c_char * size).from_address(tensor.data_ptr())).cast('B')
+                f.write(view)
+                digest.update(view)
+            del tensor
+    downcast = sum(1 for name, code, _, _ in entries if header[name]['dtype'] != code)
+    return digest.hexdigest(), downcast
+
+
+def transcode_file(path, dtype=None):
+    """
+    Converts one file in place; runs in a worker process.
+
+    A pickle checkpoint becomes <stem>.safetensors; with dtype ('fp16' or
+    'bf16') its fp32/fp64 tensors are down-cast, and a safetensors file is
+    rewritten only for that. The original is removed once the new file is
+    complete. The safetensors metadata records the source file and dtype.
+
+    Returns:
+        dict: What was done (the manifest's transcode record), or None if
+              the file needed nothing.
+    """
+    import torch
+
+    start = time.time()
+    path = Path(path)
+    target = DTYPES[dtype] if dtype else None
+    dtypes = _torch_dtypes(torch)
+    dropped = 0
+    if path.suffix == '.safetensors':
+        entries, metadata = _safetensors_source(path, torch, dtypes)
+        if not target or not any(code in _DOWNCAST for _, code, _, _ in entries):
+            return None
+    else:
+        entries, metadata, dropped = _pickle_source(path, torch, dtypes)
+
+    final = path.with_suffix('.safetensors')
+    partial = final.with_name(final.name + PARTIAL_SUFFIX)
+    metadata = {**metadata, 'converted_from': path.name, 'converted_dtype': dtype or 'unchanged'}
+    try:
+        sha256, downcast = _write_safetensors(partial, entries, metadata, target, torch, dtypes)
+        check_safetensors_header(partial)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    source_size = path.stat().st_size
+    os.replace(partial, final)
+    if final != path:
+        path.unlink()
+    return {'source': path.name, 'filename': final.name, 'dtype': dtype, 'source_size': source_size,
+            'size': final.stat().st_size, 'sha256': sha256, 'downcast': downcast, 'dropped': dropped,
+            'seconds': round(time.time() - start, 1)}
+
+
+class Transcoder:
+    """
+    Post-download stage converting files of selected tags in a process pool,
+    so conversions overlap with the downloads still running.
+
+    Args:
+        rules (dict): Tag -> down-cast dtype ('fp16', 'bf16') or None to
+                      only turn pickles into safetensors, e.g. the
+                      'transcode' entry of settings.json.
+        workers (int): Conversions at once, each on its own CPU core.
+    """
+
+    def __init__(self, rules, workers=DEFAULT_WORKERS):
+        unknown = {dtype for dtype in rules.values() if dtype and dtype not in DTYPES}
+        if unknown:
+            raise ValueError(f"Unknown transcode dtype: {', '.join(sorted(unknown))} "
+                             f"(use {', '.join(DTYPES)} or null)")
+        self.rules = dict(rules)
+        self.workers = workers
+        self._pool = None
+        self._pending = []
+        self._warned = False
+
+    def wants(self, item, path):
+        """The dtype rule for item if its finished file at path is one to convert, else False."""
+        tag = item.get('tag')
+        if tag not in self.rules:
+            return False
+        suffix = Path(path).suffix.lower()
+        if suffix in PICKLE_SUFFIXES or (suffix == '.safetensors' and self.rules[tag]):
+            if available():
+                return True
+            if not self._warned:
+                print("torch is not installed; downloaded files are left as they are")
+                self._warned = True
+        return False
+
+    def submit(self, item, path):
+        if self._pool is None:
+            # Forking a process full of download threads is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self._pending.append((item, self._pool.submit(transcode_file, str(path), self.rules[item['tag']])))
+
+    def results(self):
+        """Waits for every submitted conversion; yields (item, record or None, error or None)."""
+        pending, self._pending = self._pending, []
+        for item, future in pending:
+            if future.cancelled():
+                continue  # The original stays; a later run does not convert it either
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+    def close(self, cancel=False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=cancel)
+            self._pool = None
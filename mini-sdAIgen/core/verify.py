@@ -0,0 +1,81 @@
+import hashlib
+import json
+import mmap
+import struct
+from pathlib import Path
+
+HASH_CHUNK = 16 * 1024 * 1024
+# safetensors headers are a few MB at most; anything larger is garbage
+MAX_SAFETENSORS_HEADER = 100 * 1024 * 1024
+
+
+class IntegrityError(Exception):
+    """A downloaded file is truncated or does not match its expected hash."""
+
+
+def sha256_file(path):
+    """SHA-256 of a file in one pass, through mmap where possible."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        try:
+            view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return digest.hexdigest()
+        with view:
+            if hasattr(view, 'madvise'):
+                view.madvise(mmap.MADV_SEQUENTIAL)
+            for offset in range(0, len(view), HASH_CHUNK):
+                digest.update(view[offset:offset + HASH_CHUNK])
+    return digest.hexdigest()
+
+
+def check_safetensors_header(path):
+    """
+    Validates a .safetensors header without reading the tensor data.
+
+    The header is an 8-byte little-endian length followed by JSON that lists
+    each tensor's byte range. A truncated file fails because its data section
+    is shorter than the largest range end.
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    with open(path, 'rb') as f:
+        prefix = f.read(8)
+        if len(prefix) < 8:
+            raise IntegrityError(f"{path.name}: too short for a safetensors file")
+        (header_len,) = struct.unpack('<Q', prefix)
+        if header_len > MAX_SAFETENSORS_HEADER or 8 + header_len > size:
+            raise IntegrityError(f"{path.name}: invalid safetensors header length {header_len}")
+        try:
+            header = json.loads(f.read(header_len))
+        except ValueError as e:
+            raise IntegrityError(f"{path.name}: safetensors header is not valid JSON ({e})")
+
+    if not isinstance(header, dict):
+        raise IntegrityError(f"{path.name}: safetensors header is not a JSON object")
+    data_size = size - 8 - header_len
+    ends = [info['data_offsets'][1] for name, info in header.items()
+            if name != '__metadata__' and isinstance(info, dict) and 'data_offsets' in info]
+    if ends and max(ends) > data_size:
+        raise IntegrityError(f"{path.name}: truncated ({data_size} data bytes, header needs {max(ends)})")
+    return header
+
+
+def verify_file(path, expected_sha256=None, name=None, sha256=None):
+    """
+    Checks a finished download and returns its SHA-256.
+
+    name is the final filename when path is still a temporary name; sha256 is
+    a hash the backend already computed while writing, so the file is not read
+    a second time.
+
+    Raises:
+        IntegrityError: Bad safetensors header or hash mismatch.
+    """
+    path = Path(path)
+    if Path(name or path.name).suffix == '.safetensors':
+        check_safetensors_header(path)
+    sha256 = sha256 or sha256_file(path)
+    if expected_sha256 and sha256 != expected_sha256.lower():
+        raise IntegrityError(f"{path.name}: SHA-256 {sha256} does not match expected {expected_sha256.lower()}")
+    return sha256
@@ -0,0 +1,194 @@
+import ctypes
+import ctypes.util
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .manifest import COMPLETE
+
+# Share of the available RAM the warmup may fill; the rest is left to
+# ComfyUI, which copies the weights into its own memory when it loads them
+DEFAULT_SHARE = 0.5
+# One task reads this much of a file, in BLOCK-sized requests; several tasks
+# in flight keep a network-backed disk streaming
+SPAN = 64 * 1024 * 1024
+BLOCK = 8 * 1024 * 1024
+WORKERS = 8
+
+# mincore() defines only the low bit of each page's byte
+_LOW_BIT = bytes(b & 1 for b in range(256))
+_libc = None
+_libc_lock = threading.Lock()
+
+
+def available_memory():
+    """Bytes the kernel can hand out without swapping (MemAvailable), or None if unknown."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _mincore_libc():
+    """libc with mmap/mincore/munmap typed for resident_bytes(), or False where there is none."""
+    global _libc
+    with _libc_lock:
+        if _libc is None:
+            _libc = False
+            name = ctypes.util.find_library('c')
+            if name and hasattr(mmap, 'PROT_READ'):
+                try:
+                    libc = ctypes.CDLL(name, use_errno=True)
+                    libc.mmap.restype = ctypes.c_void_p
+                    libc.mmap.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int,
+                                          ctypes.c_int, ctypes.c_int, ctypes.c_long)
+                    libc.munmap.argtypes = (ctypes.c_void_p, ctypes.c_size_t)
+                    libc.mincore.argtypes = (ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p)
+                    _libc = libc
+                except (OSError, AttributeError):
+                    pass
+        return _libc
+
+
+def resident_bytes(path):
+    """
+    How much of path is in the page cache right now, asked with mincore(2);
+    None where the platform cannot tell.
+    """
+    libc = _mincore_libc()
+    if not libc:
+        return None
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        # Mapping only reserves addresses; mincore reads no data
+        addr = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if addr is None or addr == ctypes.c_void_p(-1).value:
+            return None
+        try:
+            pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+            vec = ctypes.create_string_buffer(pages)
+            if libc.mincore(addr, size, vec) != 0:
+                return None
+            resident = vec.raw[:pages].translate(_LOW_BIT).count(1)
+        finally:
+            libc.munmap(addr, size)
+    finally:
+        os.close(fd)
+    return min(resident * mmap.PAGESIZE, size)
+
+
+def recent_models(manifest):
+    """Files of the manifest's complete items that are still on disk, newest download first."""
+    rows = sorted(manifest.rows(COMPLETE), key=lambda r: r['updated_at'] or 0, reverse=True)
+    paths = []
+    for row in rows:
+        path = Path(row['destination']) / row['filename'] if row['filename'] else None
+        if path is not None and path.is_file() and path not in paths:
+            paths.append(path)
+    return paths
+
+
+class WarmupResult:
+    __slots__ = ('files', 'read', 'resident', 'budget', 'seconds')
+
+    def __init__(self, files, read, resident, budget, seconds):
+        self.files = files
+        self.read = read
+        self.resident = resident
+        self.budget = budget
+        self.seconds = seconds
+
+    def summary(self):
+        gb = 2**30
+        resident = f", {self.resident / gb:.2f} GB resident" if self.resident is not None else ''
+        return (f"Warmed {len(self.files)} file{'s' if len(self.files) != 1 else ''}: "
+                f"{self.read / gb:.2f} GB read in {self.seconds:.1f}s{resident} "
+                f"(budget {self.budget / gb:.2f} GB)")
+
+
+def _read_span(path, offset, length, local):
+    buf = getattr(local, 'buf', None)
+    if buf is None:
+        buf = local.buf = memoryview(bytearray(BLOCK))
+    done = 0
+    try:
+        with open(path, 'rb', buffering=0) as f:
+            f.seek(offset)
+            while done < length:
+                n = f.readinto(buf[:min(BLOCK, length - done)])
+                if not n:
+                    break
+                done += n
+    except OSError as e:
+        print(f"Warmup stopped reading {path}: {e}")
+    return done
+
+
+def warm(paths, share=DEFAULT_SHARE, budget=None, workers=WORKERS):
+    """
+    Reads files into the page cache so their first load runs at memory speed.
+
+    Files are taken in the given order until budget bytes (default: share of
+    the available RAM) are spoken for; the last one may be warmed only in
+    part. Each file is first hinted with posix_fadvise(WILLNEED), which starts
+    the kernel's own readahead, then read in large blocks by a thread pool so
+    the pages are certainly in memory when the call returns.
+
+    Returns:
+        WarmupResult: Files touched, bytes read, bytes resident afterwards
+                      (None if the platform cannot tell) and the budget.
+    """
+    start = time.time()
+    if budget is None:
+        budget = int((available_memory() or 0) * share)
+    left = budget
+    chosen, spans = [], []
+    for path in dict.fromkeys(Path(p) for p in paths):
+        if left <= 0:
+            break
+        try:
+            take = min(path.stat().st_size, left)
+        except OSError:
+            continue
+        if take <= 0:
+            continue
+        left -= take
+        chosen.append(path)
+        if hasattr(os, 'posix_fadvise'):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, take, os.POSIX_FADV_WILLNEED)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+        spans.extend((path, offset, min(SPAN, take - offset)) for offset in range(0, take, SPAN))
+
+    local = threading.local()
+    read = 0
+    if spans:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warmup') as pool:
+            for n in pool.map(lambda span: _read_span(*span, local), spans):
+                read += n
+
+    resident = None
+    for path in chosen:
+        n = resident_bytes(path)
+        if n is None:
+            resident = None
+            break
+        resident = (resident or 0) + n
+    return WarmupResult(chosen, read, resident, budget, time.time() - start)
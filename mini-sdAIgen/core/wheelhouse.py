@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+
+class Wheelhouse:
+    """
+    A persistent directory of wheels (Kaggle dataset, mounted Drive folder)
+    that pip installs from before touching the network.
+
+    Installs first run offline with --no-index --find-links. Only when a wheel
+    is missing does pip go online, and then it builds the missing wheels into
+    the wheelhouse (if writable) so the next fresh VM has them locally.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @property
+    def writable(self):
+        return os.access(self.path, os.W_OK)
+
+    def _pip(self, *args, check=False):
+        cmd = [sys.executable, "-m", "pip", *args]
+        return subprocess.run(cmd, check=check).returncode == 0
+
+    def install(self, requirements, options=(), check=True):
+        """
+        Installs requirement strings, preferring local wheels.
+
+        Args:
+            requirements (list): Requirement strings for pip.
+            options (iterable): Extra pip options such as '--index-url ...',
+                                used only for the network fallback.
+        Returns:
+            bool: True if installed entirely from the wheelhouse.
+        """
+        requirements = list(requirements)
+        if not requirements:
+            return True
+        options = [part for option in options for part in option.split()]
+        local = ["--find-links", str(self.path)]
+
+        if self.path.is_dir() and self._pip("install", "-q", "--no-index", *local, *requirements):
+            print(f"Installed {len(requirements)} requirement(s) from wheelhouse {self.path}.")
+            return True
+
+        if self.writable or not self.path.exists():
+            print(f"Wheelhouse incomplete; fetching missing wheels into {self.path}...")
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._pip("wheel", "-q", "--wheel-dir", str(self.path), *local, *options, *requirements, check=check)
+            self._pip("install", "-q", "--no-index", *local, *requirements, check=check)
+        else:
+            # Read-only wheelhouse (e.g. a Kaggle input dataset): use it where possible
+            self._pip("install", "-q", *local, *options, *requirements, check=check)
+        return False
+
+    def refresh(self, requirements, options=()):
+        """Builds or updates wheels for every requirement, installed or not."""
+        options = [part for option in options for part in option.split()]
+        self.path.mkdir(parents=True, exist_ok=True)
+        print(f"Refreshing wheelhouse {self.path}...")
+        self._pip("wheel", "-q", "--wheel-dir", str(self.path), "--find-links", str(self.path),
+                  *options, *requirements, check=True)
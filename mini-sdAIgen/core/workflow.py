@@ -0,0 +1,219 @@
+import json
+import posixpath
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from . import paths
+from .parser import Item
+
+# File types ComfyUI's model folders list
+MODEL_EXTENSIONS = ('.safetensors', '.sft', '.ckpt', '.pt', '.pth', '.bin', '.gguf', '.onnx')
+
+# Input name -> tag for the stock loaders
+INPUT_TAGS = {
+    'ckpt_name': '$ckpt',
+    'unet_name': '$unet',
+    'clip_name': '$clip',
+    'clip_name1': '$clip',
+    'clip_name2': '$clip',
+    'clip_name3': '$clip',
+    'vae_name': '$vae',
+    'lora_name': '$lora',
+    'control_net_name': '$cnet',
+    'embedding_name': '$emb',
+}
+# Loaders whose input names are generic or mean another folder
+NODE_TAGS = {
+    'CLIPVisionLoader': '$vis',
+    'UpscaleModelLoader': '$ups',
+    'UltralyticsDetectorProvider': '$ad',
+}
+# UI-format workflows store widget values by position; these are the
+# widget orders of the common loaders
+WIDGETS = {
+    'CheckpointLoaderSimple': ('ckpt_name',),
+    'UNETLoader': ('unet_name', 'weight_dtype'),
+    'UnetLoaderGGUF': ('unet_name',),
+    'CLIPLoader': ('clip_name', 'type', 'device'),
+    'CLIPLoaderGGUF': ('clip_name', 'type'),
+    'DualCLIPLoader': ('clip_name1', 'clip_name2', 'type', 'device'),
+    'DualCLIPLoaderGGUF': ('clip_name1', 'clip_name2', 'type'),
+    'TripleCLIPLoader': ('clip_name1', 'clip_name2', 'clip_name3'),
+    'VAELoader': ('vae_name',),
+    'LoraLoader': ('lora_name', 'strength_model', 'strength_clip'),
+    'LoraLoaderModelOnly': ('lora_name', 'strength_model'),
+    'ControlNetLoader': ('control_net_name',),
+    'DiffControlNetLoader': ('control_net_name',),
+    'UpscaleModelLoader': ('model_name',),
+    'CLIPVisionLoader': ('clip_name',),
+    'UltralyticsDetectorProvider': ('model_name',),
+}
+# For custom nodes: substrings of the node type or input name, checked in order
+_GUESSES = (
+    ('lora', '$lora'), ('controlnet', '$cnet'), ('control_net', '$cnet'), ('vae', '$vae'),
+    ('clipvision', '$vis'), ('clip_vision', '$vis'), ('clip', '$clip'), ('upscale', '$ups'),
+    ('ultralytics', '$ad'), ('detector', '$ad'), ('unet', '$unet'), ('diffusion', '$unet'),
+    ('ckpt', '$ckpt'), ('checkpoint', '$ckpt'), ('embedding', '$emb'),
+)
+# Other models/ folders ComfyUI searches for a tag's loaders
+ALSO_SEARCHED = {
+    '$unet': ('diffusion_models',),
+    '$clip': ('text_encoders',),
+    '$cnet': ('t2i_adapter',),
+}
+
+
+class ModelRef:
+    """
+    One model file a workflow loads: its name as the loader shows it (may
+    include a subfolder, e.g. 'flux/ae.safetensors'), the tag of the folder
+    it belongs in (None if the loader is unknown), and the node that asks.
+    """
+    __slots__ = ('filename', 'tag', 'node', 'input')
+
+    def __init__(self, filename, tag, node=None, input=None):
+        self.filename = filename.replace('\\', '/')
+        self.tag = tag
+        self.node = node
+        self.input = input
+
+    @property
+    def name(self):
+        return posixpath.basename(self.filename)
+
+    @property
+    def path(self):
+        """Where the file goes; None for an unknown tag."""
+        root = paths.PREFIX_MAP.get(self.tag)
+        return root / self.filename if root else None
+
+    def candidates(self):
+        """Every path ComfyUI would load this file from."""
+        path = self.path
+        if path is None:
+            return []
+        root = paths.PREFIX_MAP[self.tag]
+        return [path] + [root.parent / folder / self.filename for folder in ALSO_SEARCHED.get(self.tag, ())]
+
+    def __repr__(self):
+        return f"ModelRef({self.tag} {self.filename!r}, node={self.node!r})"
+
+
+def _guess(node_type, input_name):
+    text = f"{node_type or ''} {input_name or ''}".lower()
+    return next((tag for key, tag in _GUESSES if key in text), None)
+
+
+def _node_refs(node_type, named):
+    for input_name, value in named:
+        if not isinstance(value, str) or not value.lower().endswith(MODEL_EXTENSIONS):
+            continue
+        tag = NODE_TAGS.get(node_type) or INPUT_TAGS.get(input_name) or _guess(node_type, input_name)
+        yield ModelRef(value, tag, node_type, input_name)
+
+
+def _ui_nodes(data):
+    yield from data.get('nodes') or []
+    # Subgraphs (ComfyUI 0.3.4x+) keep their own node lists
+    for subgraph in (data.get('definitions') or {}).get('subgraphs') or []:
+        yield from subgraph.get('nodes') or []
+
+
+def workflow_refs(data):
+    """
+    Model files loaded by one workflow, as saved from the UI ({"nodes": [...]})
+    or exported in API format ({"<id>": {"class_type", "inputs"}}).
+
+    Stock loaders are mapped by input name; custom nodes by any widget value
+    that looks like a model file, tagged from the node and input names.
+    """
+    refs = []
+    if isinstance(data.get('nodes'), list):
+        for node in _ui_nodes(data):
+            node_type = node.get('type')
+            values = node.get('widgets_values')
+            if isinstance(values, dict):
+                named = values.items()
+            elif isinstance(values, list):
+                names = WIDGETS.get(node_type, ())
+                named = ((names[i] if i < len(names) else None, v) for i, v in enumerate(values))
+            else:
+                continue
+            refs.extend(_node_refs(node_type, named))
+    else:
+        for node in data.values():
+            if isinstance(node, dict) and isinstance(node.get('inputs'), dict):
+                refs.extend(_node_refs(node.get('class_type'), node['inputs'].items()))
+    return refs
+
+
+def load_workflows(files):
+    """ModelRefs of every workflow JSON file, each (tag, filename) once, in order."""
+    refs = {}
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError(f"{path} is not a ComfyUI workflow")
+        for ref in workflow_refs(data):
+            refs.setdefault((ref.tag, ref.filename), ref)
+    return list(refs.values())
+
+
+def diff(refs):
+    """(present, missing): refs split by whether a file exists where ComfyUI looks for it."""
+    present, missing = [], []
+    for ref in refs:
+        (present if any(p.is_file() for p in ref.candidates()) else missing).append(ref)
+    return present, missing
+
+
+def load_table(path):
+    """
+    A local filename -> URL table (JSON). Values are a URL or a list of
+    mirrors; keys are bare filenames or the loader's subfolder/filename.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _url_name(url):
+    return unquote(posixpath.basename(urlsplit(str(url)).path))
+
+
+def resolve(refs, table=None, known=(), manifest=None, metadata=None):
+    """
+    Download items for refs, without any search on the web: a ref's URL comes
+    from the local table, else an Empowerment item with that filename, else
+    an earlier download recorded in the manifest, else a cached CivitAI or
+    HuggingFace listing (core.metadata.MetadataResolver.find()).
+
+    Returns:
+        tuple: (items, unresolved) - core.parser.Items routed to each ref's
+               folder, and the refs no source knew (or with an unknown tag).
+    """
+    table = table or {}
+    by_name = {}
+    for item in known:
+        name = item.get('filename') or _url_name(item['url'])
+        by_name.setdefault(name, [item['url'], *(item.get('mirrors') or ())])
+    if manifest is not None:
+        for row in sorted(manifest.rows(), key=lambda r: r['updated_at'] or 0, reverse=True):
+            if row['filename']:
+                by_name.setdefault(row['filename'], [row['url']])
+
+    items, unresolved = [], []
+    for ref in refs:
+        urls = table.get(ref.filename) or table.get(ref.name) or by_name.get(ref.name)
+        if not urls and metadata is not None:
+            urls = metadata.find(ref.name)
+        if isinstance(urls, str):
+            urls = [urls]
+        if not urls or ref.path is None:
+            unresolved.append(ref)
+            continue
+        items.append(Item(urls[0], ref.path.parent, ref.name, tag=ref.tag, mirrors=urls[1:]))
+    return items, unresolved
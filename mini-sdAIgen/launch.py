@@ -1,121 +1,379 @@
+"""
+Mini-sdAIgen launcher.
+
+    python launch.py download          # fetch everything in settings.json
+    python launch.py plan              # resolve sizes and check free space only
+    python launch.py launch            # start ComfyUI (and the ngrok tunnel), profiling its start
+    python launch.py launch --download # ... while downloads run in the background
+    python launch.py warmup            # read the newest models into the page cache
+    python launch.py workflow a.json   # fetch only what a workflow needs and is missing
+    python launch.py status            # what has landed so far
+
+Importing this module has no side effects and loads nothing heavy: the
+downloader, ipywidgets and pyngrok are imported by the commands that use them.
+"""
+import argparse
 import sys
-import os
-import json
+import threading
 from pathlib import Path
 
 # Ensure we can import local modules
 current_dir = Path(__file__).parent
 sys.path.append(str(current_dir))
 
-from core.parser import parse_empowerment_text
-from core.downloader import Downloader
-from ui.widgets import show_widgets
+from core.config import Config
 
 SETTINGS_PATH = Path('settings.json')
 
-# Environment Detection
-def detect_environment():
-    if Path('/kaggle/working').exists():
-        return 'Kaggle', Path('/kaggle/working')
-    elif Path('/content').exists():
-        return 'Colab', Path('/content')
-    else:
-        return 'Local', Path('.')
-
-ENV_NAME, ROOT_DIR = detect_environment()
-print(f"Detected Environment: {ENV_NAME}")
-
-# Update core paths dynamically
-import core.paths
-core.paths.DEFAULT_COMFY_ROOT = ROOT_DIR / "ComfyUI"
-core.paths.DEFAULT_MODELS_ROOT = core.paths.DEFAULT_COMFY_ROOT / "models"
-core.paths.DEFAULT_NODES_ROOT = core.paths.DEFAULT_COMFY_ROOT / "custom_nodes"
-
-# Re-map the PREFIX_MAP with new roots
-core.paths.PREFIX_MAP = {
-    '$unet': core.paths.DEFAULT_MODELS_ROOT / "unet",
-    '$clip': core.paths.DEFAULT_MODELS_ROOT / "clip",
-    '$vae': core.paths.DEFAULT_MODELS_ROOT / "vae",
-    '$lora': core.paths.DEFAULT_MODELS_ROOT / "loras",
-    '$cnet': core.paths.DEFAULT_MODELS_ROOT / "controlnet",
-    '$ups': core.paths.DEFAULT_MODELS_ROOT / "upscale_models",
-    '$ad': core.paths.DEFAULT_MODELS_ROOT / "adetailer",
-    '$vis': core.paths.DEFAULT_MODELS_ROOT / "clip_vision",
-    '$ext': core.paths.DEFAULT_NODES_ROOT, 
-    '$emb': core.paths.DEFAULT_MODELS_ROOT / "embeddings",
-    '$diff': core.paths.DEFAULT_MODELS_ROOT / "diffusers",
-}
-
-def run_download():
-    if not SETTINGS_PATH.exists():
+
+def get_config(config=None):
+    """The given Config, or one detected from the environment, applied to core.paths."""
+    config = config or Config.detect(SETTINGS_PATH)
+    return config.apply()
+
+
+def show_widgets():
+    from ui.widgets import show_widgets as show
+    show()
+
+
+def seedvr_items(config=None):
+    """SeedVR models that setup.py --defer-models left for the background batch."""
+    import core.paths
+    from setup import SEEDVR_MODELS
+    get_config(config)
+    destination = core.paths.DEFAULT_MODELS_ROOT / "SEEDVR2"
+    return [{'url': url, 'destination': destination, 'filename': filename, 'sha256': None}
+            for filename, url in SEEDVR_MODELS if not (destination / filename).exists()]
+
+
+def _open_downloader(config, settings, events=None, **options):
+    import core.paths
+    from core.downloader import Downloader
+    from core.events import EventLog
+    from core.manifest import Manifest
+    from core.metadata import MetadataCache, MetadataResolver
+    from core.store import BlobStore
+    from core.transcode import Transcoder
+
+    tokens = config.tokens(settings)
+    manifest = Manifest(config.manifest_path)
+    metadata = MetadataResolver(MetadataCache(config.metadata_path), tokens)
+    store = BlobStore(core.paths.DEFAULT_STORE_ROOT)
+    events = events or EventLog(config.events_path)
+    # settings.json "transcode": {"$lora": "fp16", "$ckpt": null, ...}
+    transcoder = Transcoder(settings['transcode']) if settings.get('transcode') else None
+    return Downloader(api_tokens=tokens, manifest=manifest, store=store, events=events,
+                      backend=config.backend, metadata=metadata, transcoder=transcoder, **options)
+
+
+def _parse(settings, extra_items=()):
+    import itertools
+    from core.parser import iter_empowerment
+
+    warnings = []
+    text = settings.get('empowerment_text', '')
+    return itertools.chain(iter_empowerment(text, warnings), extra_items), warnings
+
+
+def run_download(config=None, events=None, extra_items=(), plan_only=False, **options):
+    """
+    Downloads everything in the saved Empowerment text (plus extra_items).
+
+    An EventLog passed in is left open for the caller, e.g. the combined mode
+    that reports status from it while this runs in the background. options
+    go to core.downloader.Downloader (cancel, progress_interval).
+    """
+    config = get_config(config)
+    print(f"Detected Environment: {config.env_name}")
+    settings = config.load_settings()
+    if settings is None:
         print("No settings.json found! Please configure widgets and save first.")
         return
 
-    with open(SETTINGS_PATH, 'r') as f:
-        settings = json.load(f)
-
     # 1. Parse Text
-    text = settings.get('empowerment_text', '')
-    if not text:
+    if not settings.get('empowerment_text') and not extra_items:
         print("No Empowerment text found. Skipping downloads.")
-    else:
-        print("Parsing Empowerment text...")
-        items = parse_empowerment_text(text)
-        print(f"Found {len(items)} items to download.")
-        
-        # 2. Initialize Downloader
-        tokens = {
-            'huggingface': settings.get('huggingface_token'),
-            'civitai': settings.get('civitai_token')
-        }
-        downloader = Downloader(api_tokens=tokens)
-        
-        # 3. Execute
-        downloader.download_batch(items)
-        
+        return
+    items, warnings = _parse(settings, extra_items)
+
+    # 2. Initialize Downloader
+    downloader = _open_downloader(config, settings, events, **options)
+    try:
+        plan = _execute(downloader, items, warnings, plan_only)
+    finally:
+        _close(downloader, events)
+    if plan_only or plan is None:
+        return plan
     print("Download process finished.")
 
-def start_comfyui():
-    """Starts ComfyUI with optional Ngrok tunnel"""
-    
-    # 1. Setup Ngrok if token exists
-    if SETTINGS_PATH.exists():
-        with open(SETTINGS_PATH, 'r') as f:
-            settings = json.load(f)
-            ngrok_token = settings.get('ngrok_token')
-            
-        if ngrok_token:
-            print("Starting Ngrok Tunnel...")
-            try:
-                from pyngrok import ngrok, conf
-                conf.get_default().auth_token = ngrok_token
-                public_url = ngrok.connect(8188).public_url
-                print(f"\n>>> ComfyUI Public URL: {public_url} <<<\n")
-            except ImportError:
-                 print("PyNgrok not installed. Tunnel skipped.")
-            except Exception as e:
-                print(f"Ngrok Error: {e}")
-        else:
+
+def _execute(downloader, items, warnings=(), plan_only=False):
+    """The checked Plan, downloaded unless plan_only; None if it does not fit on disk."""
+    from core.preflight import InsufficientSpace
+
+    # Resolve sizes and check free space before a single byte is fetched.
+    # This reads the whole list first, so the first files no longer start
+    # while the rest is parsed (download_batch alone still streams): a run
+    # that cannot fit should stop before it fills the disk. Items recorded
+    # as complete are skipped without network access.
+    plan = downloader.plan(items)
+    plan.print_summary()
+    for warning in warnings:
+        print(f"Skipped line {warning.line}: {warning.text} ({warning.reason})")
+    try:
+        plan.check_space()
+    except InsufficientSpace as e:
+        print(f"Plan does not fit: {e}")
+        return None
+    if not plan_only:
+        downloader.download_batch(plan.items)
+    return plan
+
+
+def _close(downloader, events=None):
+    downloader.manifest.close()
+    downloader.metadata.close()
+    if events is None:
+        downloader.events.close()
+
+
+def run_workflow(workflows, config=None, events=None, plan_only=False, **options):
+    """
+    Downloads only the models the given ComfyUI workflow JSON files load
+    that are not on disk yet, so switching workflows fetches the difference.
+
+    Filenames are read from the loader nodes and mapped to their
+    core.paths.PREFIX_MAP folder; URLs come from model_urls.json next to
+    settings.json, the saved Empowerment text, earlier downloads and the
+    metadata cache (core.workflow.resolve), never from a web search.
+    """
+    from core import workflow
+
+    config = get_config(config)
+    refs = workflow.load_workflows(workflows)
+    present, missing = workflow.diff(refs)
+    print(f"{len(refs)} models in {len(workflows)} workflow{'s' if len(workflows) != 1 else ''}: "
+          f"{len(present)} on disk, {len(missing)} missing")
+    if not missing:
+        return None
+
+    settings = config.load_settings() or {}
+    known, _ = _parse(settings)
+    downloader = _open_downloader(config, settings, events, **options)
+    try:
+        items, unresolved = workflow.resolve(missing, workflow.load_table(config.model_urls_path), known,
+                                             downloader.manifest, downloader.metadata)
+        for ref in unresolved:
+            print(f"UNRESOLVED - {ref.filename} ({ref.tag or 'unknown folder'}, {ref.node})")
+        plan = _execute(downloader, items, plan_only=plan_only) if items else None
+    finally:
+        _close(downloader, events)
+    return plan
+
+
+def run_plan(config=None):
+    """Resolves every item and checks free space without downloading anything."""
+    return run_download(config, plan_only=True)
+
+
+def run_warmup(config=None, paths=None):
+    """
+    Reads models into the page cache, newest download first, so the first
+    workflow does not wait on a cold (often network-backed) disk. At most
+    config.warmup of the available RAM is used; paths defaults to every
+    complete item in the manifest.
+    """
+    from core import warmup
+    from core.manifest import Manifest
+
+    config = get_config(config)
+    if not config.warmup:
+        return None
+    if paths is None:
+        if not config.manifest_path.exists():
+            return None
+        manifest = Manifest(config.manifest_path)
+        try:
+            paths = warmup.recent_models(manifest)
+        finally:
+            manifest.close()
+    result = warmup.warm(paths, share=config.warmup)
+    print(result.summary())
+    return result
+
+
+def _warm_in_background(config, after=None):
+    """run_warmup() on a daemon thread, once the BackgroundDownload after (if any) has ended."""
+    def work():
+        if after is not None:
+            after.wait()
+        try:
+            run_warmup(config)
+        except Exception as e:
+            print(f"Warmup failed: {e}")
+    thread = threading.Thread(target=work, name='warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def _start_tunnel(settings, port, profile=None):
+    """Opens the ngrok tunnel if settings hold a token; marks 'tunnel' in profile once it is up."""
+    ngrok_token = settings.get('ngrok_token') if settings else None
+    if not ngrok_token:
+        if settings is not None:
             print("No Ngrok token found. Local access only.")
+        return
+    print("Starting Ngrok Tunnel...")
+    try:
+        from pyngrok import ngrok, conf
+        conf.get_default().auth_token = ngrok_token
+        public_url = ngrok.connect(port).public_url
+        if profile is not None:
+            profile.mark('tunnel')
+        print(f"\n>>> ComfyUI Public URL: {public_url} <<<\n")
+    except ImportError:
+        print("PyNgrok not installed. Tunnel skipped.")
+    except Exception as e:
+        print(f"Ngrok Error: {e}")
+
+
+def start_comfyui(config=None, warmup=True):
+    """
+    Starts ComfyUI and blocks until it exits. The ngrok tunnel comes up in
+    parallel with ComfyUI's own start, and unless warmup is False the
+    downloaded models are read into the page cache meanwhile.
 
-    # 2. Launch ComfyUI
-    comfy_main = core.paths.DEFAULT_COMFY_ROOT / "main.py"
-    if comfy_main.exists():
-        print(f"Launching ComfyUI from {comfy_main}...")
-        # Use subprocess to run it, effectively blocking this script
-        # In a notebook, we might want to run this in a cell directly, but 
-        # for a script-based approach, this is how we do it.
-        # We use sys.executable to ensure we use the same python
-        import subprocess
-        import sys
-        
-        args = [sys.executable, str(comfy_main), "--listen", "--port", "8188"]
-        subprocess.run(args)
-    else:
+    The start is profiled (core.comfy): per-custom-node import times and
+    time until the server answers are appended to startup_timeline.jsonl
+    and compared with the previous session.
+
+    Returns:
+        core.comfy.StartupProfile, or None if ComfyUI is not installed.
+    """
+    from core import comfy
+
+    config = get_config(config)
+    settings = config.load_settings()
+    comfy_main = config.comfy_root / "main.py"
+    if not comfy_main.exists():
         print(f"ComfyUI main.py not found at {comfy_main}")
+        return None
+
+    profile = comfy.StartupProfile()
+    threading.Thread(target=_start_tunnel, args=(settings, comfy.DEFAULT_PORT, profile),
+                     name='ngrok', daemon=True).start()
+    if warmup:
+        _warm_in_background(config)
+
+    print(f"Launching ComfyUI from {comfy_main}...")
+    # sys.executable, so ComfyUI runs on the same Python as this script
+    args = [sys.executable, str(comfy_main), "--listen", "--port", str(comfy.DEFAULT_PORT)]
+    _, profile = comfy.run(args, profile, port=comfy.DEFAULT_PORT, timeline=config.timeline_path)
+    return profile
+
+
+def run_combined(config=None):
+    """
+    Starts ComfyUI and the tunnel immediately while downloads continue on a
+    background thread. Files appear in their folders only once complete
+    (see core.paths.PARTIAL_SUFFIX); mark the ones you need first with "!"
+    in the Empowerment text. Progress is kept in download_status.json; the
+    models are warmed up once the batch has ended.
+    """
+    from core.background import BackgroundDownload
+    from core.events import EventLog
+
+    config = get_config(config)
+    events = EventLog(config.events_path)
+    worker = BackgroundDownload(lambda: run_download(config, events, extra_items=seedvr_items(config)),
+                                events, status_path=config.status_path).start()
+    print(f"Downloads continue in the background; progress in {config.status_path.resolve()}")
+    _warm_in_background(config, after=worker)
+    start_comfyui(config, warmup=False)
+    if worker.done:
+        events.close()
+    return worker
+
+
+def show_status(config=None):
+    """Prints the background batch status (if any) and the manifest's per-item state."""
+    import json
+    from core.manifest import Manifest
+
+    config = config or Config.detect(SETTINGS_PATH)
+    if config.status_path.exists():
+        status = json.loads(config.status_path.read_text())
+        print(f"Background downloads: {status['state']} ({status['ok']} ok, {status['error']} failed, "
+              f"{status['running']} running, {status['bytes'] / 2**20:.0f} MB)")
+        for name in status['in_progress']:
+            print(f"  downloading: {name}")
+    if not config.manifest_path.exists():
+        print("No downloads recorded yet.")
+        return
+    manifest = Manifest(config.manifest_path)
+    try:
+        rows = manifest.rows()
+    finally:
+        manifest.close()
+    counts = {}
+    for row in rows:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+    print(f"{config.manifest_path.name}: " + ", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+    for row in rows:
+        if row['status'] != 'complete':
+            print(f"  {row['status']:<11} {row['url']}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="launch.py", description="Download models and start ComfyUI.")
+    parser.add_argument("--settings", type=Path, default=SETTINGS_PATH,
+                        help="settings.json saved by the widgets (state files are kept next to it)")
+    parser.add_argument("--backend", choices=["auto", "aria2", "native"], default="auto",
+                        help="Download engine: aria2c, the built-in Python engine, or aria2c if installed")
+    parser.add_argument("--warmup", type=float, default=0.5, metavar="SHARE",
+                        help="Share of the available RAM to fill with the newest models (0 disables warmup)")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.add_parser("download", help="Download everything in the Empowerment text")
+    commands.add_parser("plan", help="Resolve sizes and check free space without downloading")
+    launch = commands.add_parser("launch", help="Start ComfyUI and the ngrok tunnel")
+    launch.add_argument("--download", action="store_true",
+                        help="Start right away and download in the background")
+    commands.add_parser("warmup", help="Read the newest models into the page cache")
+    workflow = commands.add_parser("workflow", help="Download the models ComfyUI workflows need and lack")
+    workflow.add_argument("workflows", nargs="+", type=Path, metavar="JSON",
+                          help="Workflow saved from the UI or exported in API format")
+    workflow.add_argument("--plan", action="store_true", help="Resolve and check free space only")
+    commands.add_parser("status", help="Show what has been downloaded")
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Older invocations: no arguments, --launch, --combined
+    legacy = {"--launch": ["launch"], "--combined": ["launch", "--download"]}
+    if not argv:
+        argv = ["download"]
+    elif argv[0] in legacy:
+        argv = legacy[argv[0]] + argv[1:]
+
+    args = build_parser().parse_args(argv)
+    config = Config.detect(args.settings, args.backend, args.warmup)
+    if args.command == "download":
+        run_download(config)
+    elif args.command == "plan":
+        run_plan(config)
+    elif args.command == "launch" and args.download:
+        run_combined(config)
+    elif args.command == "launch":
+        start_comfyui(config)
+    elif args.command == "warmup":
+        run_warmup(config)
+    elif args.command == "workflow":
+        run_workflow(args.workflows, config, plan_only=args.plan)
+    elif args.command == "status":
+        show_status(config)
+
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "--launch":
-        start_comfyui()
-    else:
-        run_download()
+    main()
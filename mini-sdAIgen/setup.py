@@ -1,186 +1,287 @@
+import argparse
+import importlib.metadata
+import importlib.util
 import os
+import re
 import subprocess
 import sys
 from pathlib import Path
 
+# Ensure we can import local modules
+sys.path.append(str(Path(__file__).parent))
+
+from core import gitnodes, pipdeps
+from core.events import EventLog
+from core.wheelhouse import Wheelhouse
+from core.tasks import OK, Task, run_tasks, print_timing_report
+
+COMFY_PATH = Path("/root/ComfyUI")
+CUSTOM_NODES = COMFY_PATH / "custom_nodes"
+MANAGER_PATH = CUSTOM_NODES / "ComfyUI-Manager"
+SEEDVR_PATH = CUSTOM_NODES / "ComfyUI-SeedVR2_VideoUpscaler"
+
+# Every pip requirement setup needs, merged with the ComfyUI and custom node
+# requirements.txt files into one install (torch is handled by check_torch)
+BASE_REQUIREMENTS = [
+    "ipywidgets",
+    "sqlalchemy>=2.0",
+]
+# Nice to have: installed by a second pip call whose failure setup survives
+OPTIONAL_REQUIREMENTS = [
+    "pyngrok",
+    "triton>=3.0.0; sys_platform == 'linux'",
+]
+REQUIREMENTS_STAMP = Path.home() / ".cache" / "mini-sdAIgen" / "requirements.sha256"
+OPTIONAL_STAMP = REQUIREMENTS_STAMP.with_name("optional.sha256")
+
+# Stable PyTorch we downgrade 2.8/2.9 to
+TORCH_STABLE = ["torch==2.7.1", "torchvision==0.22.1", "torchaudio==2.7.1"]
+TORCH_INDEX = "--index-url https://download.pytorch.org/whl/cu126"
+
+# Structured timing events, shared with launch.run_download
+EVENTS_PATH = Path("events.jsonl")
+
+# Persistent wheel directory (Kaggle dataset, mounted Drive); overridden by --wheelhouse
+WHEELHOUSE_ENV = "MINI_SDAIGEN_WHEELHOUSE"
+
+SEEDVR_MODELS = [
+    ("seedvr2_ema_7b_fp16.safetensors", "https://huggingface.co/numz/SeedVR2_comfyUI/resolve/main/seedvr2_ema_7b_fp16.safetensors"),
+    ("ema_vae_fp16.safetensors", "https://huggingface.co/numz/SeedVR2_comfyUI/resolve/main/ema_vae_fp16.safetensors")
+]
+
+def install_aria2():
+    # 1. Aria2c
+    try:
+        subprocess.run(["aria2c", "--version"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        print("Installing aria2c...")
+        subprocess.run(["apt-get", "update", "-qq"], check=True)
+        subprocess.run(["apt-get", "install", "-y", "-qq", "aria2"], check=True)
+
+def install_libstdcxx():
+    # 2. Upgrade libstdc++6 for SageAttention (GLIBCXX fix)
+    # We run this blindly or check if we can. Just running install is safe and fast if already newest.
+    try:
+         # Check if we have the PPA (hacky check, or just add it always - it's idempotent-ish)
+         # To be safe and fast, we only do this if we suspect we need it.
+         # Let's just do it. It adds ~5-10s but ensures SageAttention works.
+         print("Ensuring latest libstdc++6...")
+         subprocess.run(["add-apt-repository", "-y", "ppa:ubuntu-toolchain-r/test"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+         subprocess.run(["apt-get", "install", "-y", "-qq", "libstdc++6"], check=True)
+    except Exception:
+         pass # Might fail if not root or apt locked, but we try.
+
 def install_system_deps():
     if sys.platform == "linux":
-        # 1. Aria2c
-        try:
-            subprocess.run(["aria2c", "--version"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            print("Installing aria2c...")
-            subprocess.run(["apt-get", "update", "-qq"], check=True)
-            subprocess.run(["apt-get", "install", "-y", "-qq", "aria2"], check=True)
-            
-        # 2. Upgrade libstdc++6 for SageAttention (GLIBCXX fix)
-        # We run this blindly or check if we can. Just running install is safe and fast if already newest.
-        try:
-             # Check if we have the PPA (hacky check, or just add it always - it's idempotent-ish)
-             # To be safe and fast, we only do this if we suspect we need it. 
-             # Let's just do it. It adds ~5-10s but ensures SageAttention works.
-             print("Ensuring latest libstdc++6...")
-             subprocess.run(["add-apt-repository", "-y", "ppa:ubuntu-toolchain-r/test"], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-             subprocess.run(["apt-get", "install", "-y", "-qq", "libstdc++6"], check=True)
-        except Exception:
-             pass # Might fail if not root or apt locked, but we try.
-
-def install_python_deps():
-    print("Installing Python dependencies...")
-    reqs = ["ipywidgets", "gdown"]
-    # Quiet install
-    subprocess.run([sys.executable, "-m", "pip", "install", "-q"] + reqs, check=True)
+        install_aria2()
+        install_libstdcxx()
+
+def enable_widgets_extension():
     # Enable widgets extension quietly
     subprocess.run(["jupyter", "nbextension", "enable", "--py", "widgetsnbextension"], check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-def setup_environment():
-    # 1. Detect Environment
-    if os.path.exists("/kaggle/working"):
-        print("Detected Kaggle environment.")
-    elif os.path.exists("/content"):
-        print("Detected Colab environment.")
-    else:
-        print("Detected Local/Other environment.")
+def collect_python_requirements():
+    requirements = pipdeps.RequirementSet()
+    for line in BASE_REQUIREMENTS:
+        requirements.add(line)
+    for node_path in (COMFY_PATH, MANAGER_PATH, SEEDVR_PATH):
+        requirements.add_file(node_path / "requirements.txt")
+    return requirements
 
-    # 2. Install Deps
-    install_system_deps()
-    install_python_deps()
-    
-    # 3. Install ComfyUI if missing
-    comfy_path = Path("/root/ComfyUI")
-    if not comfy_path.exists():
-        if sys.platform == "linux":
-            print("Installing ComfyUI...")
-            subprocess.run(["git", "clone", "-q", "https://github.com/comfyanonymous/ComfyUI", str(comfy_path)], check=True)
-            
-            # Smart Dependency Install
-            req_path = comfy_path / "requirements.txt"
-            if req_path.exists():
-                print("Installing ComfyUI Dependencies...")
-                with open(req_path, 'r') as f:
-                    reqs = f.readlines()
-                
-                filtered_reqs = []
-                for r in reqs:
-                    pkg = r.strip().split('=')[0].split('<')[0].split('>')[0]
-                    # Filter out heavy/pre-installed packages
-                    if pkg.lower() not in ['torch', 'torchvision', 'torchaudio', 'cupy-cuda12x', 'cupy-cuda11x']:
-                         filtered_reqs.append(r)
-                
-                temp_reqs = Path("temp_reqs.txt")
-                with open(temp_reqs, 'w') as f:
-                    f.writelines(filtered_reqs)
-                
-                subprocess.run([sys.executable, "-m", "pip", "install", "-q", "-r", str(temp_reqs)], check=True)
-                temp_reqs.unlink()
-
-            # Fix SQLAlchemy (Always run on fresh install)
-            print("Fixing SQLAlchemy...")
-            subprocess.run([sys.executable, "-m", "pip", "install", "-q", "sqlalchemy", "--upgrade", "--force-reinstall"], check=True)
-
-    # 4. Check & Install Custom Nodes (Runs even if ComfyUI exists)
-    if comfy_path.exists():
-        custom_nodes = comfy_path / "custom_nodes"
-        
-        # A. ComfyUI-Manager
-        manager_path = custom_nodes / "ComfyUI-Manager"
-        if not manager_path.exists():
-            print("Installing ComfyUI-Manager...")
-            subprocess.run(["git", "clone", "-q", "https://github.com/ltdrdata/ComfyUI-Manager", str(manager_path)], check=True)
-        # Always check Manager reqs
-        man_reqs = manager_path / "requirements.txt"
-        if man_reqs.exists():
-             subprocess.run([sys.executable, "-m", "pip", "install", "-q", "-r", str(man_reqs)], check=False)
-
-        # B. SeedVR2 Upscaler
-        seed_path = custom_nodes / "ComfyUI-SeedVR2_VideoUpscaler"
-        if not seed_path.exists():
-            print("Installing SeedVR2 Upscaler...")
-            subprocess.run(["git", "clone", "-q", "https://github.com/numz/ComfyUI-SeedVR2_VideoUpscaler", str(seed_path)], check=True)
-        # Always check SeedVR reqs
-        seed_reqs = seed_path / "requirements.txt"
-        if seed_reqs.exists():
-            subprocess.run([sys.executable, "-m", "pip", "install", "-q", "-r", str(seed_reqs)], check=False)
-
-    # 5. Helper Libraries (PyNgrok, Triton)
-    print("Checking Essential Libraries...")
-    
-    # Check Environment & Downgrade if needed
+def optional_python_requirements():
+    requirements = pipdeps.RequirementSet()
+    for line in OPTIONAL_REQUIREMENTS:
+        requirements.add(line)
+    return requirements
+
+def install_python_requirements(wheelhouse=None):
+    print("Checking Python dependencies...")
+    pipdeps.install(collect_python_requirements(), stamp_path=REQUIREMENTS_STAMP, wheelhouse=wheelhouse)
+
+def install_optional_requirements(wheelhouse=None):
+    # PyNgrok, Triton: ComfyUI runs without them, so a failed install is not fatal
     try:
-        import torch
-        print(f"Current Environment: Torch {torch.__version__} | CUDA {torch.version.cuda}")
-        
-        # Downgrade 2.8/2.9+ to 2.7.1 (Stable)
-        if "2.8" in torch.__version__ or "2.9" in torch.__version__:
-            print(f">> Detected unstable PyTorch {torch.__version__}. Downgrading to 2.7.1+cu126 for stability...")
-            # Uninstall current
-            subprocess.run([sys.executable, "-m", "pip", "uninstall", "-y", "torch", "torchvision", "torchaudio", "xformers"], check=False)
-            
-            # Install Stable 2.7.1 (CUDA 12.6)
-            install_cmd = [
-                sys.executable, "-m", "pip", "install", 
-                "torch==2.7.1", "torchvision==0.22.1", "torchaudio==2.7.1", 
-                "--index-url", "https://download.pytorch.org/whl/cu126"
-            ]
-            subprocess.run(install_cmd, check=True)
-            print(">> PyTorch downgraded to 2.7.1 successfully.")
-            print(">> IMPORTANT: You MUST restart the Jupyter Kernel after this setup.")
-            
-    except ImportError:
-        print("Environment: Torch not imported.")
+        pipdeps.install(optional_python_requirements(), stamp_path=OPTIONAL_STAMP, wheelhouse=wheelhouse)
+    except subprocess.CalledProcessError as e:
+        print(f">> Error installing {', '.join(OPTIONAL_REQUIREMENTS)}: {e}")
+
+def refresh_wheelhouse(wheelhouse):
+    for requirements in (collect_python_requirements(), optional_python_requirements()):
+        wheelhouse.refresh(requirements.lines, requirements.options)
+    wheelhouse.refresh(TORCH_STABLE, [TORCH_INDEX])
+
+def clone_comfyui():
+    print("Installing ComfyUI...")
+    subprocess.run(["git", "clone", "-q", "--depth", "1", "https://github.com/comfyanonymous/ComfyUI", str(COMFY_PATH)], check=True)
 
-    # PyNgrok
+def clone_custom_node(url, path):
+    # Shallow clone, or fast-forward an existing checkout
     try:
-        subprocess.run([sys.executable, "-m", "pip", "install", "-q", "pyngrok"], check=True)
-    except subprocess.CalledProcessError:
-        print(">> Error installing pyngrok.")
+        gitnodes.clone_or_update(url, path.parent, path.name)
+    except subprocess.CalledProcessError as e:
+        if not path.exists():
+            raise
+        print(f">> Could not update {path.name} ({e}). Keeping existing checkout.")
 
-    # Triton
+def torch_version():
+    """Installed torch version from package metadata; importing torch takes seconds."""
     try:
-        subprocess.run([sys.executable, "-m", "pip", "install", "-q", "triton>=3.0.0"], check=True)
-    except subprocess.CalledProcessError:
-        print(">> Error installing triton.")
-        
+        return importlib.metadata.version("torch")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+def check_torch(wheelhouse=None):
+    # Check Environment & Downgrade if needed
+    version = torch_version()
+    if version is None:
+        print("Environment: Torch not installed.")
+        return
+    print(f"Current Environment: Torch {version}")
+
+    # Downgrade 2.8/2.9 to 2.7.1 (Stable); only those releases are known to
+    # break here, newer ones are left alone as before
+    major, minor = (int(x) for x in re.match(r"(\d+)\.(\d+)", version).groups())
+    if (major, minor) in ((2, 8), (2, 9)):
+        print(f">> Detected unstable PyTorch {version}. Downgrading to 2.7.1+cu126 for stability...")
+        # Uninstall current
+        subprocess.run([sys.executable, "-m", "pip", "uninstall", "-y", "torch", "torchvision", "torchaudio", "xformers"], check=False)
+
+        # Install Stable 2.7.1 (CUDA 12.6), from local wheels when available
+        if wheelhouse is not None:
+            wheelhouse.install(TORCH_STABLE, [TORCH_INDEX])
+        else:
+            install_cmd = [sys.executable, "-m", "pip", "install", *TORCH_STABLE, *TORCH_INDEX.split()]
+            subprocess.run(install_cmd, check=True)
+        print(">> PyTorch downgraded to 2.7.1 successfully.")
+        print(">> IMPORTANT: You MUST restart the Jupyter Kernel after this setup.")
+
+def cleanup_attention_libraries():
     # Flash Attention / SageAttention / Xformers Strategy
     # User Request: Use ONLY native SDPA (Scaled Dot Product Attention).
     # We clean up any previous conflicting optimized attention libraries.
-    
+
     print("Optimization: Using Native SDPA (Best stability).")
     try:
         # Cleanup SageAttention if present (it was causing ABI crashes)
         if importlib.util.find_spec("sageattention") is not None:
              subprocess.run([sys.executable, "-m", "pip", "uninstall", "-y", "sageattention"], check=False)
-             
+
         # Cleanup Xformers if present (User requested only SDPA)
         if importlib.util.find_spec("xformers") is not None:
              subprocess.run([sys.executable, "-m", "pip", "uninstall", "-y", "xformers"], check=False)
-             
+
     except Exception:
         pass
 
-    print("Setup Complete. Using Native SDPA.")
-    
+def download_seedvr_model(filename, url):
     # 6. Pre-download SeedVR Models (Fixes Timeout Error)
-    print("Pre-downloading SeedVR Models (15GB+) to avoid runtime timeouts...")
-    seed_model_dir = comfy_path / "models" / "SEEDVR2"
+    seed_model_dir = COMFY_PATH / "models" / "SEEDVR2"
     seed_model_dir.mkdir(parents=True, exist_ok=True)
-    
-    models_to_download = [
-        ("seedvr2_ema_7b_fp16.safetensors", "https://huggingface.co/numz/SeedVR2_comfyUI/resolve/main/seedvr2_ema_7b_fp16.safetensors"),
-        ("ema_vae_fp16.safetensors", "https://huggingface.co/numz/SeedVR2_comfyUI/resolve/main/ema_vae_fp16.safetensors")
+
+    dest = seed_model_dir / filename
+    if not dest.exists():
+        print(f"Downloading {filename}...")
+        try:
+            subprocess.run(["aria2c", "-x", "8", "-s", "8", "-k", "1M", "-o", filename, "-d", str(seed_model_dir), url], check=True)
+            print(f">> {filename} downloaded successfully.")
+        except subprocess.CalledProcessError:
+            print(f">> Error downloading {filename}. You may need to manual download.")
+    else:
+        print(f">> {filename} already exists.")
+
+def build_tasks(wheelhouse=None, refresh=False, defer_models=False):
+    """
+    Declares setup as a dependency DAG.
+
+    apt and pip steps each share a lock (dpkg and site-packages cannot take
+    concurrent writers), but git clones and the SeedVR model downloads
+    overlap with them freely.
+
+    Args:
+        wheelhouse (Wheelhouse): Install pip packages from local wheels first.
+        refresh (bool): Also rebuild the wheelhouse for every requirement.
+        defer_models (bool): Leave the SeedVR models to launch.py --combined,
+                             which fetches them while ComfyUI is already up.
+    """
+    fresh_install = not COMFY_PATH.exists()
+    linux = sys.platform == "linux"
+    tasks = [
+        Task('torch', lambda: check_torch(wheelhouse), lock='pip'),
+        Task('attention_cleanup', cleanup_attention_libraries, deps=['torch'], lock='pip'),
     ]
-    
-    for filename, url in models_to_download:
-        dest = seed_model_dir / filename
-        if not dest.exists():
-            print(f"Downloading {filename}...")
-            try:
-                subprocess.run(["aria2c", "-x", "8", "-s", "8", "-k", "1M", "-o", filename, "-d", str(seed_model_dir), url], check=True)
-                print(f">> {filename} downloaded successfully.")
-            except subprocess.CalledProcessError:
-                print(f">> Error downloading {filename}. You may need to manual download.")
-        else:
-            print(f">> {filename} already exists.")
+
+    if linux:
+        tasks += [
+            Task('aria2', install_aria2, lock='apt'),
+            Task('libstdc++6', install_libstdcxx, deps=['aria2'], lock='apt'),
+        ]
+
+    comfy_deps = []
+    if fresh_install and linux:
+        tasks.append(Task('comfyui_clone', clone_comfyui))
+        comfy_deps = ['comfyui_clone']
+
+    requirement_deps = list(comfy_deps)
+    if COMFY_PATH.exists() or comfy_deps:
+        # 4. Check & Install Custom Nodes (Runs even if ComfyUI exists)
+        tasks += [
+            Task('manager_clone', lambda: clone_custom_node("https://github.com/ltdrdata/ComfyUI-Manager", MANAGER_PATH), deps=comfy_deps),
+            Task('seedvr2_clone', lambda: clone_custom_node("https://github.com/numz/ComfyUI-SeedVR2_VideoUpscaler", SEEDVR_PATH), deps=comfy_deps),
+        ]
+        requirement_deps += ['manager_clone', 'seedvr2_clone']
+
+    # One merged pip install once every requirements.txt is on disk
+    tasks.append(Task('python_requirements', lambda: install_python_requirements(wheelhouse), deps=requirement_deps, lock='pip'))
+    tasks.append(Task('optional_requirements', lambda: install_optional_requirements(wheelhouse), deps=['python_requirements'], lock='pip'))
+    if wheelhouse is not None and refresh:
+        # pip wheel only writes into the wheelhouse, so it needs no pip lock
+        tasks.append(Task('wheelhouse_refresh', lambda: refresh_wheelhouse(wheelhouse), deps=requirement_deps))
+    tasks.append(Task('widgets_extension', enable_widgets_extension, deps=['python_requirements']))
+
+    if defer_models:
+        return tasks
+    # The SeedVR models only need aria2c and the ComfyUI tree, so they download while pip works
+    model_deps = comfy_deps + (['aria2'] if linux else [])
+    for filename, url in SEEDVR_MODELS:
+        tasks.append(Task(f'seedvr_model:{filename}', lambda f=filename, u=url: download_seedvr_model(f, u), deps=model_deps))
+    return tasks
+
+def setup_environment(wheelhouse=None, refresh_wheelhouse=False, defer_models=False):
+    # 1. Detect Environment
+    if os.path.exists("/kaggle/working"):
+        print("Detected Kaggle environment.")
+    elif os.path.exists("/content"):
+        print("Detected Colab environment.")
+    else:
+        print("Detected Local/Other environment.")
+
+    if defer_models:
+        print("SeedVR models deferred; launch.py --combined downloads them in the background.")
+    else:
+        print("Pre-downloading SeedVR Models (15GB+) alongside setup to avoid runtime timeouts...")
+    wheelhouse = wheelhouse or os.environ.get(WHEELHOUSE_ENV)
+    if wheelhouse:
+        print(f"Using wheelhouse: {wheelhouse}")
+        wheelhouse = Wheelhouse(wheelhouse)
+    tasks = build_tasks(wheelhouse, refresh=refresh_wheelhouse, defer_models=defer_models)
+    events = EventLog(EVENTS_PATH)
+    try:
+        results = run_tasks(tasks, events=events)
+    finally:
+        events.close()
+    print_timing_report(tasks, results)
+
+    failed = [r.name for r in results.values() if r.status != OK]
+    if failed:
+        raise RuntimeError(f"Setup incomplete, failed or skipped: {', '.join(failed)}")
+    print("Setup Complete. Using Native SDPA.")
 
 if __name__ == "__main__":
-    setup_environment()
+    parser = argparse.ArgumentParser(description="Prepare ComfyUI and its dependencies.")
+    parser.add_argument("--wheelhouse", help=f"Persistent wheel directory (default: ${WHEELHOUSE_ENV})")
+    parser.add_argument("--refresh-wheelhouse", action="store_true",
+                        help="Build wheels for every requirement (incl. stable torch) into the wheelhouse")
+    parser.add_argument("--defer-models", action="store_true",
+                        help="Skip the SeedVR model downloads (launch.py --combined fetches them)")
+    args = parser.parse_args()
+    setup_environment(args.wheelhouse, args.refresh_wheelhouse, args.defer_models)
@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+import functools
+import hashlib
+import io
+import re
+import tarfile
+import tempfile
+import threading
+import zipfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.archive import archive_kind, extract_dir
+from core.downloader import Downloader
+from core.manifest import Manifest, COMPLETE, FAILED
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.served = self.root / 'served'
+        self.served.mkdir()
+        handler = functools.partial(QuietHandler, directory=str(self.served))
+        self.server = HTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_kind_and_folder(self):
+        self.assertEqual(archive_kind('https://x/pack.tar.gz?download=1'), 'tar.gz')
+        self.assertEqual(archive_kind('bundle.tar.zst'), 'tar.zst')
+        self.assertEqual(archive_kind('model.safetensors'), None)
+        item = {'url': 'https://x/embeddings.zip', 'destination': self.root, 'filename': None}
+        self.assertEqual(extract_dir(item), self.root / 'embeddings')
+
+    def test_tar_streams_into_folder_without_archive_on_disk(self):
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode='w:gz') as tar:
+            info = tarfile.TarInfo('emb/a.pt')
+            info.size = 3
+            tar.addfile(info, io.BytesIO(b'abc'))
+        (self.served / 'pack.tar.gz').write_bytes(buf.getvalue())
+        sha = hashlib.sha256(buf.getvalue()).hexdigest()
+
+        dest = self.root / 'embeddings'
+        item = {'url': f'{self.base}/pack.tar.gz', 'destination': dest, 'filename': None, 'sha256': sha}
+        Downloader().download_batch([item])
+
+        self.assertEqual((dest / 'pack' / 'emb' / 'a.pt').read_bytes(), b'abc')
+        self.assertFalse((dest / 'pack.tar.gz').exists())
+
+    @patch('subprocess.run')
+    def test_zip_extracted_after_download_and_removed(self, mock_run):
+        dest = self.root / 'upscale_models'
+
+        def fake_aria2(command, **kwargs):
+            with zipfile.ZipFile(dest / 'bundle.zip.part', 'w') as zf:
+                zf.writestr('4x.pth', b'weights')
+        mock_run.side_effect = fake_aria2
+
+        Downloader().download_batch([{'url': 'https://example.com/bundle.zip', 'destination': dest, 'filename': None}])
+        self.assertEqual((dest / 'bundle' / '4x.pth').read_bytes(), b'weights')
+        self.assertFalse((dest / 'bundle.zip').exists())
+
+    @patch('subprocess.run')
+    def test_corrupt_zip_fails_only_its_item(self, mock_run):
+        dest = self.root / 'upscale_models'
+
+        def fake_aria2(command, **kwargs):
+            out = re.search(r'-o "([^"]+)"', command).group(1)
+            data = b'PK\x03\x04 truncated' if out.startswith('broken') else b'weights'
+            (dest / out).write_bytes(data)
+        mock_run.side_effect = fake_aria2
+        manifest = Manifest(self.root / 'downloads.sqlite')
+        self.addCleanup(manifest.close)
+        items = [{'url': f'https://example.com/{name}', 'destination': dest, 'filename': None}
+                 for name in ('broken.zip', 'model.pth')]
+
+        Downloader(manifest=manifest).download_batch(items)
+
+        self.assertEqual(manifest.get(items[0]['url'], dest)['status'], FAILED)
+        self.assertEqual(manifest.get(items[1]['url'], dest)['status'], COMPLETE)
+        self.assertEqual((dest / 'model.pth').read_bytes(), b'weights')
+        self.assertEqual(sorted(p.name for p in dest.iterdir()), ['model.pth'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import threading
+import unittest
+from pathlib import Path
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import events as ev
+from core.background import BackgroundDownload
+from core.events import EventLog
+
+class TestBackgroundDownload(unittest.TestCase):
+    def test_status_while_running_and_after(self):
+        log = EventLog()
+        release = threading.Event()
+
+        def batch():
+            log.emit(ev.START, 'https://example.com/a.safetensors')
+            log.emit(ev.FINISH, 'https://example.com/a.safetensors', bytes=10)
+            log.emit(ev.START, 'https://example.com/b.safetensors')
+            release.wait(5)
+            log.emit(ev.ERROR, 'https://example.com/b.safetensors', error='HTTP 500')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'download_status.json'
+            worker = BackgroundDownload(batch, log, status_path=path, interval=0.01).start()
+            while log.items().get('https://example.com/b.safetensors') is None:
+                worker.wait(0.01)
+            status = worker.status()
+            self.assertEqual((status['state'], status['ok']), ('running', 1))
+            self.assertEqual(status['in_progress'], ['https://example.com/b.safetensors'])
+
+            release.set()
+            self.assertTrue(worker.wait(5))
+            written = json.loads(path.read_text())
+            self.assertFalse(path.with_name(path.name + '.tmp').exists())
+
+        self.assertEqual(written['state'], 'failed')
+        self.assertEqual((written['ok'], written['error'], written['bytes']), (1, 1, 10))
+        self.assertEqual(written['failed'], ['https://example.com/b.safetensors'])
+
+    def test_progress_rows_and_cancel(self):
+        log = EventLog()
+        stop = threading.Event()
+        url = 'https://example.com/a.safetensors'
+        worker = BackgroundDownload(lambda: stop.wait(5), log, cancel=stop.set).start()
+
+        log.emit(ev.START, url)
+        first = log.emit(ev.FIRST_BYTE, url, bytes=0, size=400)
+        # 100 bytes two seconds after the first one
+        log.emit(ev.BYTES, url, bytes=100, size=400)['ts'] = first['ts'] + 2
+        row = worker.status()['items'][0]
+        self.assertEqual((row['bytes'], row['size'], row['rate'], row['eta']), (100, 400, 50.0, 6.0))
+
+        worker.cancel()
+        self.assertTrue(worker.wait(5))
+        self.assertEqual(worker.status()['state'], 'cancelled')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import contextlib
+import io
+import socket
+import textwrap
+import unittest
+from pathlib import Path
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import comfy
+
+# Prints an import report like ComfyUI's, then serves /system_stats for a moment
+FAKE_COMFYUI = textwrap.dedent("""
+    import http.server, sys, threading, time
+    port = int(sys.argv[1])
+    print("Prestartup times for custom nodes:")
+    print("   0.1 seconds: /c/custom_nodes/ComfyUI-Manager")
+    print("")
+    print("Import times for custom nodes:")
+    print("   0.0 seconds: /c/custom_nodes/websocket_image_save.py")
+    print("   0.4 seconds (IMPORT FAILED): /c/custom_nodes/broken-node")
+    print("  12.5 seconds: /c/custom_nodes/ComfyUI-SeedVR2_VideoUpscaler")
+    print("")
+    print("Starting server", file=sys.stderr)
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200 if self.path == '/system_stats' else 404)
+            self.end_headers()
+        def log_message(self, *args):
+            pass
+    server = http.server.HTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print("To see the GUI go to: http://127.0.0.1:%d" % port, file=sys.stderr)
+    time.sleep(1.0)
+""")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class TestStartupProfile(unittest.TestCase):
+    def test_parses_import_report(self):
+        profile = comfy.StartupProfile()
+        for line in FAKE_COMFYUI.split('print("')[1:]:
+            profile.line(line.split('"')[0])
+        record = profile.record()
+
+        self.assertEqual([n['name'] for n in record['nodes']['prestartup']], ['ComfyUI-Manager'])
+        self.assertEqual([(n['name'], n['seconds'], n['failed']) for n in record['nodes']['import']], [
+            ('websocket_image_save.py', 0.0, False), ('broken-node', 0.4, True),
+            ('ComfyUI-SeedVR2_VideoUpscaler', 12.5, False)])
+        self.assertEqual(record['import_seconds'], 12.9)
+        self.assertEqual(record['failed_imports'], ['broken-node'])
+        for mark in ('first_output', 'prestartup_done', 'import_done', 'server_starting', 'gui_url'):
+            self.assertIn(mark, record)
+
+    def test_run_profiles_and_compares_sessions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            script = Path(tmp) / 'main.py'
+            script.write_text(FAKE_COMFYUI)
+            timeline = Path(tmp) / 'startup_timeline.jsonl'
+            comfy.append_timeline(timeline, {'ready': 1.0, 'nodes': {'import': [
+                {'name': 'ComfyUI-SeedVR2_VideoUpscaler', 'seconds': 3.0, 'failed': False}]}})
+            port = free_port()
+            echoed = []
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                code, profile = comfy.run([sys.executable, str(script), str(port)], port=port,
+                                          timeline=timeline, echo=echoed.append)
+            entries = comfy.load_timeline(timeline)
+
+        self.assertEqual(code, 0)
+        self.assertIn('Starting server\n', echoed)
+        self.assertEqual(len(entries), 2)
+        self.assertIsNotNone(entries[1]['ready'])
+        self.assertLessEqual(entries[1]['server_starting'], entries[1]['ready'])
+        self.assertIn('(last session 1.0s)', out.getvalue())
+        self.assertIn('12.5s ComfyUI-SeedVR2_VideoUpscaler (+9.5s)', out.getvalue())
+
+    def test_exit_before_ready_is_recorded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            timeline = Path(tmp) / 'startup_timeline.jsonl'
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                code, _ = comfy.run([sys.executable, '-c', 'import sys; print("boom"); sys.exit(3)'],
+                                    port=free_port(), timeline=timeline, echo=lambda text: None)
+            entry = comfy.load_timeline(timeline)[0]
+        self.assertEqual((code, entry['exit_code']), (3, 3))
+        self.assertNotIn('ready', entry)
+        self.assertIn('ComfyUI never became ready', out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
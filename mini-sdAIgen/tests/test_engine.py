@@ -0,0 +1,178 @@
+import contextlib
+import hashlib
+import io
+import json
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
+import threading
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer, StubFile, parse_size
+from core import engine
+from core.backends import Cancelled, Job, get_backend
+from core.downloader import Downloader
+from core.hosts import HostPolicy
+
+SEGMENT = 256 * 1024
+
+
+def expected(name, size):
+    size = parse_size(size)
+    return StubFile(name, size).read(0, size)
+
+
+@patch('core.engine.MIN_SEGMENT', SEGMENT)
+@patch('core.engine.CHUNK', SEGMENT // 4)
+class TestNativeEngine(unittest.TestCase):
+    def download(self, server, urls, tmp, **options):
+        done = {}
+        jobs = [Job(None, url, Path(tmp), url.rsplit('/', 1)[-1]) for url in urls]
+        native = engine.NativeEngine(**options)
+        native.download(jobs, on_done=lambda job, path, error, sha256: done.update({job.url: (path, error, sha256)}))
+        return done
+
+    def test_segmented_download_matches_and_hashes(self):
+        with StubServer(redirects=1) as server, tempfile.TemporaryDirectory() as tmp:
+            url = server.add_file('big.safetensors', '2M')
+            done = self.download(server, [url], tmp, max_concurrent=1, max_connections=4)
+            path, error, sha256 = done[url]
+            data = Path(path).read_bytes()
+            ranges = [r for method, p, r in server.requests if p.startswith('/files/') and r != 'bytes=0-0']
+
+        self.assertIsNone(error)
+        self.assertEqual(data, expected('big.safetensors', '2M'))
+        self.assertEqual(sha256, hashlib.sha256(data).hexdigest())
+        # Four connections, each on its own range, plus stolen halves
+        self.assertGreaterEqual(len(ranges), 4)
+        self.assertTrue(all(r and r.startswith('bytes=') for r in ranges))
+
+    def test_resumes_from_state_file(self):
+        with StubServer() as server, tempfile.TemporaryDirectory() as tmp:
+            url = server.add_file('model.safetensors', '1M')
+            size = parse_size('1M')
+            data = expected('model.safetensors', '1M')
+            path = Path(tmp) / 'model.safetensors'
+            # An interrupted run: first half on disk, second half zeroes
+            path.write_bytes(data[:size // 2] + bytes(size - size // 2))
+            state = path.with_name(path.name + engine.STATE_SUFFIX)
+            state.write_text(json.dumps({'url': url, 'size': size, 'etag': '"model.safetensors-1048576"',
+                                         'segments': [[0, size // 2, size // 2], [size // 2, size, size // 2]]}))
+            done = self.download(server, [url], tmp, max_concurrent=1, max_connections=1)
+            ranges = [r for _, _, r in server.requests]
+            result = path.read_bytes()
+            state_left = state.exists()
+
+        self.assertIsNone(done[url][1])
+        self.assertEqual(result, data)
+        self.assertEqual(ranges, ['bytes=0-0', f'bytes={size // 2}-{size - 1}'])
+        self.assertFalse(state_left)
+        self.assertEqual(done[url][2], hashlib.sha256(data).hexdigest())
+
+    def test_survives_connection_resets(self):
+        with StubServer(reset_rate=0.3, seed=3) as server, tempfile.TemporaryDirectory() as tmp:
+            urls = [server.add_file(f'{i}.bin', '1M') for i in range(3)]
+            with patch('core.engine.time.sleep'):
+                done = self.download(server, urls, tmp, max_concurrent=2, max_connections=8, retries=8)
+            results = {url: Path(done[url][0]).read_bytes() for url in urls}
+
+        for i, url in enumerate(urls):
+            self.assertIsNone(done[url][1])
+            self.assertEqual(results[url], expected(f'{i}.bin', '1M'))
+
+    def test_mirrors_share_the_file_by_speed(self):
+        policy = HostPolicy('stub', connections=2)
+        with StubServer() as fast, StubServer(bandwidth=1024 * 1024) as slow, \
+                StubServer() as gone, tempfile.TemporaryDirectory() as tmp:
+            url = fast.add_file('m.safetensors', '4M')
+            mirror = slow.add_file('m.safetensors', '4M')
+            job = Job(None, url, Path(tmp), 'm.safetensors', policy=policy,
+                      mirrors=[Job(None, mirror, Path(tmp), policy=policy),
+                               Job(None, gone.url('m.safetensors'), Path(tmp), policy=policy)])
+            done, mirrors = {}, []
+
+            class Recorded(engine.Mirror):
+                __slots__ = ()
+
+                def __init__(self, *args):
+                    super().__init__(*args)
+                    mirrors.append(self)
+
+            with contextlib.redirect_stdout(io.StringIO()) as out, patch('core.engine.Mirror', Recorded):
+                engine.NativeEngine().download([job], on_done=lambda j, path, error, sha256: done.update(
+                    path=path, error=error))
+            data = Path(done['path']).read_bytes()
+
+        self.assertIsNone(done['error'])
+        self.assertEqual(data, expected('m.safetensors', '4M'))
+        # Both mirrors delivered; the throttled one got the smaller share
+        delivered = [m.bytes for m in mirrors]
+        self.assertGreater(delivered[1], 0)
+        self.assertGreater(delivered[0], delivered[1])
+        # The mirror without the file was dropped instead of failing the item
+        self.assertIn('Mirror dropped for m.safetensors', out.getvalue())
+
+    def test_cancel_keeps_state_for_resume(self):
+        with StubServer(bandwidth=2 * 1024 * 1024) as server, tempfile.TemporaryDirectory() as tmp:
+            url = server.add_file('big.safetensors', '4M')
+            path = Path(tmp) / 'big.safetensors'
+            cancel = threading.Event()
+            done = {}
+
+            def on_progress(job, completed, total):
+                if completed:
+                    cancel.set()
+
+            native = engine.NativeEngine(max_concurrent=1, max_connections=2, progress_interval=0.05)
+            native.download([Job(None, url, Path(tmp), path.name)], on_progress=on_progress, cancel=cancel,
+                            on_done=lambda job, p, error, sha256: done.update(error=error))
+            state = path.with_name(path.name + engine.STATE_SUFFIX)
+            self.assertIsInstance(done['error'], Cancelled)
+            self.assertTrue(state.exists())
+
+            server.bandwidth = None
+            server.requests.clear()
+            resumed = self.download(server, [url], tmp, max_concurrent=1, max_connections=2)
+            data = path.read_bytes()
+            skipped = [r for _, _, r in server.requests if r and r.startswith('bytes=0-') and r != 'bytes=0-0']
+
+        self.assertIsNone(resumed[url][1])
+        self.assertEqual(data, expected('big.safetensors', '4M'))
+        # The first segment continued where it stopped instead of starting over
+        self.assertEqual(skipped, [])
+
+    def test_missing_file_reports_error(self):
+        with StubServer() as server, tempfile.TemporaryDirectory() as tmp:
+            done = self.download(server, [server.url('gone.bin')], tmp)
+        path, error, _ = done[server.url('gone.bin')]
+        self.assertIsNone(path)
+        self.assertEqual(error.status, 404)
+
+    def test_downloader_native_backend(self):
+        with StubServer() as server, tempfile.TemporaryDirectory() as tmp:
+            urls = [server.add_file(f'{i}.safetensors', '512K') for i in range(3)]
+            items = [{'url': url, 'destination': Path(tmp) / 'lora', 'filename': None} for url in urls]
+            downloader = Downloader(backend='native')
+            with patch('core.verify.sha256_file') as rehash:
+                downloader.download_batch(items)
+            names = sorted(p.name for p in (Path(tmp) / 'lora').iterdir())
+
+        self.assertEqual(names, ['0.safetensors', '1.safetensors', '2.safetensors'])
+        # The engine hashed while writing; verification did not read the files again
+        self.assertFalse(rehash.called)
+
+    def test_auto_backend_without_aria2c(self):
+        with patch('shutil.which', return_value=None):
+            self.assertEqual(get_backend('auto').name, 'native')
+        with patch('shutil.which', return_value='/usr/bin/aria2c'):
+            self.assertEqual(get_backend('auto').name, 'aria2')
+        with self.assertRaises(ValueError):
+            get_backend('curl')
+
+
+if __name__ == '__main__':
+    unittest.main()
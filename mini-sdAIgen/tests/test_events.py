@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import contextlib
+import io
+import json
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import events as ev
+from core.events import EventLog
+from core.downloader import Downloader
+from core.tasks import Task, run_tasks
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_events_written_as_jsonl(self):
+        log = EventLog(self.root / 'events.jsonl')
+        log.emit(ev.START, 'https://huggingface.co/a/b/resolve/main/x.safetensors')
+        log.emit(ev.FINISH, 'https://huggingface.co/a/b/resolve/main/x.safetensors', bytes=1024)
+        log.close()
+
+        lines = [json.loads(l) for l in (self.root / 'events.jsonl').read_text().splitlines()]
+        self.assertEqual([l['event'] for l in lines], ['start', 'finish'])
+        self.assertEqual(lines[0]['host'], 'huggingface.co')
+        self.assertEqual(lines[1]['bytes'], 1024)
+
+    def test_item_timings(self):
+        log = EventLog()
+        url = 'https://example.com/lora.safetensors'
+        with patch('time.time', side_effect=[10.0, 10.5, 11.0, 14.0]):
+            log.emit(ev.START, url)
+            log.emit(ev.FIRST_BYTE, url, bytes=1)
+            log.emit(ev.RETRY, url)
+            log.emit(ev.FINISH, url, bytes=3 * ev.MB)
+        item = log.items()[url]
+        self.assertEqual(item['end'] - item['start'], 4.0)
+        self.assertEqual(item['first_byte'] - item['start'], 0.5)
+        self.assertEqual(item['retries'], 1)
+        self.assertEqual(item['bytes'], 3 * ev.MB)
+
+    @patch('subprocess.run')
+    def test_batch_prints_summary(self, mock_run):
+        target = self.root / 'vae.pt.part'
+        mock_run.side_effect = lambda *a, **k: target.write_bytes(b'x' * 100)
+        log = EventLog()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            Downloader(events=log).download_batch(
+                [{'url': 'https://example.com/vae.pt', 'destination': self.root, 'filename': None}])
+
+        self.assertIn('Download Summary', out.getvalue())
+        self.assertIn('example.com', out.getvalue())
+        self.assertEqual(log.items()['https://example.com/vae.pt']['status'], 'ok')
+
+    def test_setup_tasks_report_into_stream(self):
+        log = EventLog()
+        run_tasks([Task('pip', lambda: None)], events=log)
+        self.assertEqual(log.items(kind='task')['pip']['status'], 'ok')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import contextlib
+import http.cookiejar
+import io
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer, StubFile, parse_size
+from core import gdrive
+from core.downloader import Downloader
+
+
+class TestDriveLinks(unittest.TestCase):
+    def test_file_id(self):
+        for url in ['https://drive.google.com/file/d/1AbC-_x/view?usp=sharing',
+                    'https://drive.google.com/open?id=1AbC-_x',
+                    'https://drive.google.com/uc?export=download&id=1AbC-_x',
+                    'https://drive.usercontent.google.com/download?id=1AbC-_x&export=download']:
+            self.assertEqual(gdrive.file_id(url), '1AbC-_x', url)
+        self.assertIsNone(gdrive.file_id('https://drive.google.com/drive/folders'))
+        self.assertTrue(gdrive.is_drive_url('https://drive.google.com/file/d/x/view'))
+        self.assertFalse(gdrive.is_drive_url('https://example.com/drive.google.com/x'))
+
+    def test_confirm_url_forms(self):
+        base = 'https://drive.usercontent.google.com/download?id=X&export=download'
+        form = ('<form id="download-form" action="https://drive.usercontent.google.com/download" method="get">'
+                '<input type="hidden" name="id" value="X"><input type="hidden" name="confirm" value="t">'
+                '<input type="hidden" name="uuid" value="u-1"></form>')
+        self.assertEqual(gdrive.confirm_url(form, base),
+                         'https://drive.usercontent.google.com/download?id=X&confirm=t&uuid=u-1')
+        legacy = '<a id="uc-download-link" href="/uc?export=download&amp;confirm=AbCd&amp;id=X">Download</a>'
+        self.assertEqual(gdrive.confirm_url(legacy, 'https://drive.google.com/uc?id=X'),
+                         'https://drive.google.com/uc?export=download&confirm=AbCd&id=X')
+
+        jar = http.cookiejar.CookieJar()
+        jar.set_cookie(http.cookiejar.Cookie(0, 'download_warning_1', 'tok', None, False, 'drive.google.com',
+                                             True, False, '/', True, False, None, False, None, None, {}))
+        self.assertEqual(gdrive.confirm_url('<html></html>', 'https://drive.google.com/uc?id=X', jar),
+                         'https://drive.google.com/uc?id=X&confirm=tok')
+        self.assertIsNone(gdrive.confirm_url('<html></html>', base))
+
+
+class TestDriveDownloads(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer().start()
+        self.addCleanup(self.server.stop)
+        patcher = patch('core.gdrive.DOWNLOAD_URL', self.server.drive_endpoint)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resolves_through_virus_scan_page(self):
+        url = self.server.add_drive_file('1big', 'big.safetensors', '3M')
+        drive = gdrive.resolve(url)
+
+        self.assertEqual((drive.filename, drive.size), ('big.safetensors', 3 * 1024 * 1024))
+        self.assertIn('confirm=t', drive.url)
+        self.assertTrue(drive.cookie.startswith('NID='))
+        self.assertEqual(drive.headers(), [f'Cookie: {drive.cookie}'])
+
+        small = gdrive.resolve(self.server.add_drive_file('1small', 'small.bin', '1K'))
+        self.assertEqual((small.filename, small.size, small.cookie), ('small.bin', 1024, None))
+
+    def test_quota_page_is_unreachable(self):
+        page = '<html><title>Google Drive - Quota exceeded</title>' + gdrive._QUOTA + '</html>'
+        self.assertEqual(gdrive._page_error(page, 'https://drive.google.com/uc?id=X').status, 403)
+        with self.assertRaises(gdrive.DriveError) as raised:
+            gdrive.resolve('https://drive.google.com/file/d/1gone/view')
+        self.assertEqual(raised.exception.status, 404)
+
+    @patch('core.engine.MIN_SEGMENT', 256 * 1024)
+    @patch('core.engine.CHUNK', 64 * 1024)
+    def test_downloader_segments_drive_files(self):
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            url = self.server.add_drive_file('1big', 'big.safetensors', '3M')
+            items = [{'url': url, 'destination': Path(tmp), 'filename': None},
+                     {'url': 'https://drive.google.com/file/d/1gone/view', 'destination': Path(tmp),
+                      'filename': None}]
+            downloader = Downloader(backend='native')
+            plan = downloader.plan(items)
+            downloader.download_batch(plan.items)
+            data = (Path(tmp) / 'big.safetensors').read_bytes()
+            ranges = [r for _, path, r in self.server.requests
+                      if path.startswith('/drive/') and 'uuid=' in path and r != 'bytes=0-0']
+            left = sorted(p.name for p in Path(tmp).iterdir())
+
+        self.assertEqual([r.size for r in plan.entries], [3 * 1024 * 1024])
+        self.assertEqual([r.status for r in plan.unreachable], [404])
+        self.assertEqual(data, StubFile('big.safetensors', parse_size('3M')).read(0, 3 * 1024 * 1024))
+        # Several ranged connections instead of gdown's single stream
+        self.assertGreater(len(ranges), 1)
+        self.assertTrue(all(r.startswith('bytes=') for r in ranges))
+        self.assertEqual(left, ['big.safetensors'])
+
+
+if __name__ == '__main__':
+    unittest.main()
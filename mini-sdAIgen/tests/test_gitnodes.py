@@ -0,0 +1,104 @@
+import contextlib
+import io
+import shutil
+import subprocess
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.gitnodes import is_git_repo_url, is_node_repo, clone_or_update, install_nodes
+from core.paths import PREFIX_MAP
+from core.downloader import Downloader
+
+class TestGitNodes(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_repo_url_detection(self):
+        self.assertTrue(is_git_repo_url('https://github.com/ltdrdata/ComfyUI-Manager'))
+        self.assertTrue(is_git_repo_url('https://github.com/numz/ComfyUI-SeedVR2_VideoUpscaler.git'))
+        self.assertFalse(is_git_repo_url('https://github.com/user/repo/releases/download/v1/model.pth'))
+        self.assertFalse(is_git_repo_url('https://huggingface.co/user/repo/resolve/main/model.safetensors'))
+
+    @patch('subprocess.run')
+    def test_shallow_clone_then_update(self, mock_run):
+        url = 'https://github.com/ltdrdata/ComfyUI-Manager'
+        clone_or_update(url, self.root, blob_filter=True)
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(cmd[:5], ['git', 'clone', '-q', '--depth', '1'])
+        self.assertIn('--filter=blob:none', cmd)
+        self.assertEqual(cmd[-1], str(self.root / 'ComfyUI-Manager'))
+
+        (self.root / 'ComfyUI-Manager' / '.git').mkdir(parents=True)
+        clone_or_update(url, self.root, blob_filter=True)
+        fetch, reset = [c[0][0] for c in mock_run.call_args_list[-2:]]
+        self.assertEqual(fetch[3:], ['fetch', '-q', '--depth', '1', '--filter=blob:none', 'origin', 'HEAD'])
+        self.assertEqual(reset[3:], ['reset', '-q', '--hard', 'FETCH_HEAD'])
+
+    @unittest.skipUnless(shutil.which('git'), 'needs git')
+    def test_update_after_upstream_moved_several_commits(self):
+        upstream = self.root / 'upstream'
+        env = dict(os.environ, GIT_AUTHOR_NAME='t', GIT_AUTHOR_EMAIL='t@t', GIT_COMMITTER_NAME='t',
+                   GIT_COMMITTER_EMAIL='t@t')
+
+        def commit(text):
+            (upstream / 'nodes.py').write_text(text)
+            subprocess.run(['git', '-C', str(upstream), 'add', '.'], check=True, env=env)
+            subprocess.run(['git', '-C', str(upstream), 'commit', '-q', '-m', text], check=True, env=env)
+
+        subprocess.run(['git', 'init', '-q', str(upstream)], check=True)
+        commit('v1')
+        url = upstream.resolve().as_uri()  # file:// so --depth applies
+        with contextlib.redirect_stdout(io.StringIO()):
+            path = clone_or_update(url, self.root / 'custom_nodes', 'node')
+            for text in ('v2', 'v3', 'v4'):
+                commit(text)
+            self.assertEqual(clone_or_update(url, self.root / 'custom_nodes', 'node'), path)
+        self.assertEqual((path / 'nodes.py').read_text(), 'v4')
+
+    @patch('core.gitnodes.pipdeps.install')
+    @patch('subprocess.run')
+    def test_requirements_merged_into_one_install(self, mock_run, mock_install):
+        for name in ('node-a', 'node-b'):
+            (self.root / name).mkdir()
+            (self.root / name / 'requirements.txt').write_text(f"{name}-dep\n")
+        items = [{'url': f'https://github.com/u/{name}', 'destination': self.root, 'filename': None}
+                 for name in ('node-a', 'node-b')]
+        checkouts, failures = install_nodes(items)
+
+        self.assertEqual(len(checkouts), 2)
+        self.assertEqual(failures, [])
+        mock_install.assert_called_once()
+        self.assertEqual(sorted(mock_install.call_args[0][0].lines), ['node-a-dep', 'node-b-dep'])
+
+    @patch('core.downloader.gitnodes.install_nodes', return_value=([], []))
+    @patch('subprocess.run')
+    def test_batch_routes_repos_to_git(self, mock_run, mock_nodes):
+        repo = {'url': 'https://github.com/u/node', 'destination': self.root, 'filename': None, 'tag': '$ext'}
+        model = {'url': 'https://example.com/model.safetensors', 'destination': self.root, 'filename': None}
+        # A repository URL under a model tag is fetched as a file, never cloned into models/
+        lora = {'url': 'https://github.com/u/lora.git', 'destination': self.root, 'filename': None, 'tag': '$lora'}
+        Downloader().download_batch([repo, model, lora])
+
+        self.assertEqual(mock_nodes.call_args[0][0], [repo])
+        self.assertEqual(mock_run.call_count, 2)
+        self.assertTrue(all('aria2c' in c[0][0] for c in mock_run.call_args_list))
+
+    def test_only_ext_items_are_node_repos(self):
+        url = 'https://github.com/u/node'
+        self.assertTrue(is_node_repo({'url': url, 'destination': self.root, 'tag': '$ext'}))
+        self.assertFalse(is_node_repo({'url': url, 'destination': self.root, 'tag': '$ckpt'}))
+        self.assertTrue(is_node_repo({'url': url, 'destination': PREFIX_MAP['$ext']}))
+        self.assertFalse(is_node_repo({'url': url, 'destination': PREFIX_MAP['$lora']}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import io
+import subprocess
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer
+from core import engine, hosts
+from core.backends import Aria2Backend, Job
+from core.downloader import Downloader
+from core.hosts import HostPolicies, HostPolicy
+
+
+class TestHostPolicies(unittest.TestCase):
+    def setUp(self):
+        self.policies = HostPolicies({'huggingface': 'hf_secret', 'civitai': 'cv_secret'})
+
+    def test_lookup_by_domain(self):
+        self.assertEqual(self.policies.for_url('https://civitai.com/api/download/models/1').name, 'civitai')
+        self.assertEqual(self.policies.for_url('https://cdn-lfs.hf.co/x').name, 'huggingface')
+        self.assertEqual(self.policies.for_url('https://a-b.someone.workers.dev/models/x').name, 'worker')
+        self.assertEqual(self.policies.for_url('https://notcivitai.com/x').name, 'default')
+
+    def test_tokens(self):
+        hf = 'https://huggingface.co/a/b/resolve/main/x.safetensors'
+        self.assertEqual(self.policies.headers(hf), ['Authorization: Bearer hf_secret'])
+        self.assertEqual(self.policies.authorize(hf), hf)
+
+        civitai = 'https://civitai.com/api/download/models/1?type=Model&token=old'
+        self.assertEqual(self.policies.headers(civitai), [])
+        self.assertEqual(self.policies.authorize(civitai),
+                         'https://civitai.com/api/download/models/1?type=Model&token=cv_secret')
+        self.assertEqual(self.policies.redact('GET ...?token=cv_secret'), 'GET ...?token=***')
+        # No token collected: URL untouched
+        self.assertEqual(HostPolicies({'civitai': ''}).authorize(civitai), civitai)
+
+    def test_backoff(self):
+        policy = HostPolicy('x', backoff=2.0, max_backoff=10.0)
+        for attempt, ceiling in [(0, 2.0), (1, 4.0), (5, 10.0)]:
+            delay = policy.delay(attempt)
+            self.assertTrue(ceiling / 2 <= delay <= ceiling, (attempt, delay))
+        self.assertEqual(policy.delay(0, retry_after=30), 30)
+        self.assertEqual(hosts.parse_retry_after('120'), 120)
+        self.assertEqual(hosts.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertIsNone(hosts.parse_retry_after('soon'))
+
+    def test_retryable(self):
+        self.assertTrue(hosts.retryable(engine.HTTPStatusError(429, 'Too Many Requests', 'u')))
+        self.assertFalse(hosts.retryable(engine.HTTPStatusError(404, 'Not Found', 'u')))
+        self.assertTrue(hosts.retryable('The response status is not successful. status=503'))
+        self.assertFalse(hosts.retryable('HTTP 401 Unauthorized'))
+        self.assertTrue(hosts.retryable(ConnectionResetError()))
+
+
+class TestPolicyEnforcement(unittest.TestCase):
+    def test_engine_honours_retry_after(self):
+        with StubServer(fail_rate=0.5, seed=1) as server, tempfile.TemporaryDirectory() as tmp:
+            url = server.add_file('a.bin', '512K')
+            done = {}
+            with patch('core.engine.time.sleep') as sleep:
+                engine.NativeEngine(retries=10).download(
+                    [Job(None, url, Path(tmp), 'a.bin')],
+                    on_done=lambda job, path, error, sha256: done.update(error=error))
+        self.assertIsNone(done['error'])
+        # Every 503 came with Retry-After: 1
+        self.assertTrue(sleep.called)
+        self.assertTrue(all(call.args[0] == 1 for call in sleep.call_args_list))
+
+    def test_engine_caps_files_per_host(self):
+        running, peak = [0], [0]
+        original = engine.SegmentedFile.run
+
+        async def counted(self):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.05)
+            try:
+                return await original(self)
+            finally:
+                running[0] -= 1
+
+        policy = HostPolicy('slow', concurrent=1)
+        with StubServer() as server, tempfile.TemporaryDirectory() as tmp, \
+                patch.object(engine.SegmentedFile, 'run', counted):
+            jobs = [Job(None, server.add_file(f'{i}.bin', '64K'), Path(tmp), f'{i}.bin', policy=policy)
+                    for i in range(3)]
+            engine.NativeEngine(max_concurrent=3).download(jobs)
+        self.assertEqual(peak[0], 1)
+
+    @patch('core.backends.Aria2Daemon')
+    def test_aria2_pauses_jobs_over_host_cap(self, mock_daemon):
+        daemon = mock_daemon.return_value
+        daemon.__enter__.return_value = daemon
+        daemon.add.side_effect = ['g1', 'g2', 'g3']
+        daemon.wait.side_effect = lambda gids, on_done, on_progress, cancel=None: [
+            on_done(gid, {'status': 'complete', 'files': [{'path': gid}]}) for gid in list(gids)]
+        civitai = HostPolicies().for_url('https://civitai.com/')
+        jobs = [Job(None, f'https://civitai.com/api/download/models/{i}', '/tmp', policy=civitai)
+                for i in range(3)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            Aria2Backend().download(jobs)
+
+        self.assertEqual([c.kwargs['paused'] for c in daemon.add.call_args_list], [False, False, True])
+        self.assertEqual(daemon.add.call_args_list[0].kwargs['connections'], 4)
+        daemon.unpause.assert_called_once_with('g3')
+
+    @patch('core.downloader.time.sleep')
+    @patch('subprocess.run')
+    def test_retry_queue_reports_only_still_failing(self, mock_run, _):
+        with tempfile.TemporaryDirectory() as tmp:
+            flaky = {'url': 'https://example.com/flaky.pt', 'destination': Path(tmp), 'filename': None}
+            broken = {'url': 'https://example.com/broken.pt', 'destination': Path(tmp), 'filename': None}
+            calls = []
+
+            def run(command, **kwargs):
+                calls.append(command)
+                if 'broken' in command or len([c for c in calls if 'flaky' in c]) == 1:
+                    raise subprocess.CalledProcessError(22, command)
+                (Path(tmp) / 'flaky.pt.part').write_bytes(b'x')
+
+            mock_run.side_effect = run
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                Downloader(max_attempts=3).download_batch([flaky, broken])
+
+        report = out.getvalue().split('=== Still failing (1) ===')[1]
+        self.assertIn('broken.pt', report)
+        self.assertNotIn('flaky.pt', report)
+        self.assertEqual(sum('broken' in c for c in calls), 3)
+
+    @patch('subprocess.run')
+    def test_civitai_token_and_connections(self, mock_run):
+        item = {'url': 'https://civitai.com/api/download/models/1', 'destination': Path('/tmp/lora'),
+                'filename': 'x.safetensors'}
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), patch('os.makedirs'), patch('core.downloader.time.sleep'):
+            Downloader(api_tokens={'civitai': 'cv_secret'}, verify=False).download_item(item)
+        command = mock_run.call_args[0][0]
+        self.assertIn('-x4', command)
+        self.assertIn('models/1?token=cv_secret', command)
+        self.assertNotIn('Authorization', command)
+        # The printed command does not leak the token
+        self.assertNotIn('cv_secret', out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
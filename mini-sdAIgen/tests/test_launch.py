@@ -0,0 +1,107 @@
+import contextlib
+import io
+import json
+import subprocess
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from core import paths
+from core.config import Config
+from core.manifest import Manifest, COMPLETE, FAILED
+
+class TestLaunch(unittest.TestCase):
+    def test_import_is_quiet_and_light(self):
+        code = ("import sys, launch; "
+                "print(sorted(m for m in ('ipywidgets', 'core.downloader', 'core.manifest', 'torch') if m in sys.modules))")
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        # Nothing printed on import, nothing heavy loaded
+        self.assertEqual(out.stdout.strip(), '[]')
+
+    def test_download_help(self):
+        out = subprocess.run([sys.executable, 'launch.py', 'download', '--help'], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        self.assertIn('usage: launch.py download', out.stdout)
+
+    def test_config_updates_prefix_map_in_place(self):
+        from core.parser import iter_empowerment
+        original = paths.DEFAULT_COMFY_ROOT
+        try:
+            Config('Kaggle', Path('/kaggle/working')).apply()
+            item = next(iter_empowerment("$lora\nhttps://site.com/a.safetensors"))
+            self.assertEqual(item.destination, Path('/kaggle/working/ComfyUI/models/loras'))
+            self.assertEqual(paths.DEFAULT_STORE_ROOT, Path('/kaggle/working/ComfyUI/.model-store'))
+        finally:
+            paths.set_comfy_root(original)
+
+    def test_status_command(self):
+        import launch
+        with tempfile.TemporaryDirectory() as tmp:
+            settings = Path(tmp) / 'settings.json'
+            config = Config(settings_path=settings)
+            manifest = Manifest(config.manifest_path)
+            manifest.update('https://example.com/a.safetensors', tmp, status=COMPLETE)
+            manifest.update('https://example.com/b.safetensors', tmp, status=FAILED)
+            manifest.close()
+            config.status_path.write_text(json.dumps({'state': 'running', 'ok': 1, 'error': 1, 'running': 0,
+                                                      'bytes': 0, 'in_progress': []}))
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                launch.main(['--settings', str(settings), 'status'])
+        self.assertIn('Background downloads: running', out.getvalue())
+        self.assertIn('1 complete, 1 failed', out.getvalue())
+        self.assertIn('failed      https://example.com/b.safetensors', out.getvalue())
+
+    def test_download_that_does_not_fit_stops_cleanly(self):
+        import launch
+        from collections import namedtuple
+        from benchmarks.stub_server import StubServer
+        usage = namedtuple('usage', 'total used free')
+        with StubServer() as server, tempfile.TemporaryDirectory() as tmp:
+            url = server.add_file('big.safetensors', '1M')
+            settings = Path(tmp) / 'settings.json'
+            settings.write_text(json.dumps({'empowerment_text': f"$lora\n{url}"}))
+            original = paths.DEFAULT_COMFY_ROOT
+            self.addCleanup(paths.set_comfy_root, original)
+            with patch('core.config.detect_environment', return_value=('Local', Path(tmp))), \
+                    patch('core.preflight.shutil.disk_usage', return_value=usage(0, 0, 0)), \
+                    contextlib.redirect_stdout(io.StringIO()) as out:
+                launch.main(['--settings', str(settings), '--backend', 'native', 'download'])
+            self.assertFalse((Path(tmp) / 'ComfyUI' / 'models' / 'loras' / 'big.safetensors').exists())
+        self.assertIn('Plan does not fit:', out.getvalue())
+        self.assertNotIn('Download process finished.', out.getvalue())
+
+    @patch('subprocess.run')
+    def test_torch_version_read_without_import(self, mock_run):
+        import setup
+        with patch('importlib.metadata.version', return_value='2.9.0+cu128'):
+            setup.check_torch()
+        self.assertIn('uninstall', mock_run.call_args_list[0][0][0])
+        self.assertNotIn('torch', sys.modules)
+        # Only 2.8/2.9 are downgraded; newer releases stay
+        mock_run.reset_mock()
+        with patch('importlib.metadata.version', return_value='2.10.0'):
+            setup.check_torch()
+        self.assertFalse(mock_run.called)
+
+    def test_optional_requirements_failure_is_not_fatal(self):
+        import setup
+        failure = subprocess.CalledProcessError(1, ['pip'])
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch('setup.OPTIONAL_STAMP', Path(tmp) / 'optional.sha256'), \
+                patch('core.pipdeps.is_satisfied', return_value=False), \
+                patch('core.pipdeps.subprocess.run', side_effect=failure) as pip, \
+                contextlib.redirect_stdout(io.StringIO()) as out:
+            setup.install_optional_requirements()
+        self.assertIn('pyngrok', pip.call_args[0][0])
+        self.assertIn('>> Error installing pyngrok', out.getvalue())
+        self.assertNotIn('pyngrok', setup.collect_python_requirements().lines)
+
+if __name__ == '__main__':
+    unittest.main()
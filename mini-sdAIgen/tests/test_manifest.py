@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.manifest import Manifest, COMPLETE, DOWNLOADING
+from core.downloader import Downloader
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.manifest = Manifest(self.root / 'downloads.sqlite')
+
+    def tearDown(self):
+        self.manifest.close()
+        self.tmp.cleanup()
+
+    def test_complete_requires_intact_file(self):
+        url = 'https://example.com/model.safetensors'
+        (self.root / 'model.safetensors').write_bytes(b'x' * 10)
+        self.manifest.update(url, self.root, status=COMPLETE, filename='model.safetensors', size=10)
+        self.assertTrue(self.manifest.is_complete(url, self.root))
+
+        # Truncated file is no longer trusted
+        (self.root / 'model.safetensors').write_bytes(b'x' * 5)
+        self.assertFalse(self.manifest.is_complete(url, self.root))
+
+    def test_state_survives_reopen(self):
+        url = 'https://example.com/lora.safetensors'
+        self.manifest.update(url, self.root, status=DOWNLOADING, filename='lora.safetensors')
+        self.manifest.close()
+
+        self.manifest = Manifest(self.root / 'downloads.sqlite')
+        self.assertEqual(self.manifest.known_filename(url, self.root), 'lora.safetensors')
+        self.assertEqual(self.manifest.rows(status=DOWNLOADING)[0]['url'], url)
+
+    @patch('subprocess.run')
+    def test_batch_skips_complete_and_resumes_in_progress(self, mock_run):
+        done = 'https://example.com/done.safetensors'
+        partial = 'https://example.com/partial?download=1'
+        (self.root / 'done.safetensors').write_bytes(b'ok')
+        self.manifest.update(done, self.root, status=COMPLETE, filename='done.safetensors', size=2)
+        self.manifest.update(partial, self.root, status=DOWNLOADING, filename='partial.safetensors')
+
+        downloader = Downloader(manifest=self.manifest)
+        downloader.download_batch([
+            {'url': done, 'destination': self.root, 'filename': None},
+            {'url': partial, 'destination': self.root, 'filename': None},
+        ])
+
+        # Only the interrupted item is fetched, under its earlier filename
+        self.assertEqual(mock_run.call_count, 1)
+        command = mock_run.call_args[0][0]
+        self.assertIn(partial, command)
+        self.assertIn('-o "partial.safetensors.part"', command)
+
+if __name__ == '__main__':
+    unittest.main()
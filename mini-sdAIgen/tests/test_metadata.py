@@ -0,0 +1,113 @@
+import contextlib
+import io
+import unittest
+from pathlib import Path
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer
+from core.downloader import Downloader
+from core.metadata import MetadataCache, MetadataResolver, civitai_version
+
+VERSION = {
+    'id': 123,
+    'files': [
+        {'name': 'model-pruned.safetensors', 'sizeKB': 2048.5, 'type': 'Model', 'primary': True,
+         'metadata': {'format': 'SafeTensor', 'size': 'pruned', 'fp': 'fp16'},
+         'hashes': {'SHA256': 'A' * 64}},
+        {'name': 'model-full.safetensors', 'sizeKB': 4096, 'type': 'Model',
+         'metadata': {'format': 'SafeTensor', 'size': 'full', 'fp': 'fp32'},
+         'hashes': {'SHA256': 'B' * 64}},
+    ],
+    'images': [{'url': 'https://image.civitai.com/v.mp4', 'type': 'video'},
+               {'url': 'https://image.civitai.com/1.jpeg', 'type': 'image'}],
+}
+TREE = [
+    {'type': 'file', 'path': 'unet/model.safetensors', 'size': 1000,
+     'oid': 'f' * 40, 'lfs': {'oid': 'c' * 64, 'size': 1000}},
+    {'type': 'file', 'path': 'unet/config.json', 'size': 12, 'oid': 'e' * 40},
+]
+CIVITAI = 'https://civitai.com/api/download/models/123'
+HF = 'https://huggingface.co/owner/repo/resolve/main/unet/'
+
+
+class TestMetadataResolver(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer().start()
+        self.addCleanup(self.server.stop)
+        self.server.add_json('/civitai/model-versions/123', VERSION)
+        self.server.add_json('/hf/api/models/owner/repo/tree/main/unet', TREE)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache_path = Path(self.tmp.name) / 'metadata.sqlite'
+
+    def resolver(self, ttl=3600):
+        cache = MetadataCache(self.cache_path, ttl=ttl)
+        self.addCleanup(cache.close)
+        return MetadataResolver(cache, civitai_api=self.server.base_url + '/civitai',
+                                hf_endpoint=self.server.base_url + '/hf')
+
+    def api_requests(self):
+        return [path for _, path, _ in self.server.requests]
+
+    def test_civitai_version(self):
+        info = self.resolver().lookup(CIVITAI)
+        self.assertEqual((info.filename, info.size), ('model-pruned.safetensors', 2048 * 1024 + 512))
+        self.assertEqual(info.sha256, 'a' * 64)
+        self.assertEqual(info.preview, 'https://image.civitai.com/1.jpeg')
+
+        full = self.resolver().lookup(CIVITAI + '?type=Model&format=SafeTensor&fp=fp32')
+        self.assertEqual(full.filename, 'model-full.safetensors')
+        self.assertEqual(civitai_version('https://civitai.com/models/9/name?modelVersionId=123'), '123')
+        self.assertEqual(civitai_version('123'), '123')
+        self.assertIsNone(civitai_version('https://civitai.com/models/9'))
+
+    def test_huggingface_folder_is_listed_once(self):
+        infos = self.resolver().resolve_many([HF + 'model.safetensors', HF + 'config.json',
+                                              'https://example.com/other.bin'])
+
+        model, config = infos[HF + 'model.safetensors'], infos[HF + 'config.json']
+        self.assertEqual((model.filename, model.size, model.sha256), ('model.safetensors', 1000, 'c' * 64))
+        # Not an LFS file: its oid is a git hash, not a SHA-256
+        self.assertEqual((config.size, config.sha256), (12, None))
+        self.assertIsNone(infos['https://example.com/other.bin'])
+        self.assertEqual(self.api_requests(), ['/hf/api/models/owner/repo/tree/main/unet'])
+
+    def test_cache_persists_and_revalidates(self):
+        self.resolver().resolve_many([CIVITAI, HF + 'model.safetensors'])
+        self.assertEqual(len(self.server.requests), 2)
+
+        # Within the TTL a new run asks nothing
+        self.assertEqual(self.resolver().lookup(CIVITAI).sha256, 'a' * 64)
+        self.assertEqual(len(self.server.requests), 2)
+
+        # Past it, an unchanged document costs a 304 without a body
+        self.server.requests.clear()
+        self.assertEqual(self.resolver(ttl=0).lookup(CIVITAI).filename, 'model-pruned.safetensors')
+        self.assertEqual(self.api_requests(), ['/civitai/model-versions/123'])
+
+    def test_failed_lookup_is_asked_once(self):
+        resolver = self.resolver()
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertIsNone(resolver.lookup('https://civitai.com/api/download/models/404'))
+            self.assertIsNone(resolver.lookup('https://civitai.com/api/download/models/404'))
+        self.assertIn('HTTP Error 404', out.getvalue())
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_downloader_names_and_verifies_from_metadata(self):
+        downloader = Downloader(metadata=self.resolver())
+        item = {'url': CIVITAI, 'destination': Path(self.tmp.name), 'filename': None}
+        self.assertEqual(downloader._named(item)['filename'], 'model-pruned.safetensors')
+
+        part = Path(self.tmp.name) / 'model.bin.part'
+        part.write_bytes(b'not the model')
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertFalse(downloader._finish(item, part))
+        self.assertIn('does not match expected ' + 'a' * 64, out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
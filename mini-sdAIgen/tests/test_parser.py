@@ -66,6 +66,19 @@ class TestTagParser(unittest.TestCase):
         self.assertEqual(result[0]['filename'], 'goodname.safetensors')
         self.assertEqual(result[0]['url'], 'https://site.com/badname')
 
+    def test_sha256_annotation(self):
+        text = """
+        $vae
+        https://site.com/vae[ae.safetensors][sha256:ABCDEF]
+        https://site.com/other.safetensors[sha256:123456]
+        """
+        result = self.parse(text)
+        self.assertEqual(result[0]['url'], 'https://site.com/vae')
+        self.assertEqual(result[0]['filename'], 'ae.safetensors')
+        self.assertEqual(result[0]['sha256'], 'abcdef')
+        self.assertIsNone(result[1]['filename'])
+        self.assertEqual(result[1]['sha256'], '123456')
+
     def test_comments_and_empty_lines(self):
         text = """
         # This is a comment
@@ -77,5 +90,86 @@ class TestTagParser(unittest.TestCase):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0]['url'], 'https://site.com/vae.pt')
 
+class TestStreamingParser(unittest.TestCase):
+    def test_items_carry_line_numbers_and_tag(self):
+        from core.parser import iter_empowerment
+        items = list(iter_empowerment("$lora\nhttps://site.com/a.safetensors\n\nhttps://site.com/b.safetensors\n"))
+        self.assertEqual([x.line for x in items], [2, 4])
+        self.assertEqual(items[0].tag, '$lora')
+        self.assertEqual(items[0]['destination'], PREFIX_MAP['$lora'])
+        self.assertEqual(dict(items[0])['url'], 'https://site.com/a.safetensors')
+
+    def test_reads_file_objects_lazily(self):
+        import io
+        from core.parser import iter_empowerment
+        source = io.StringIO("$vae\nhttps://site.com/vae.pt\n$lora\nhttps://site.com/l.safetensors\n")
+        items = iter_empowerment(source)
+        self.assertEqual(next(items).url, 'https://site.com/vae.pt')
+        # Only the lines up to the first item have been consumed
+        self.assertEqual(source.readline(), '$lora\n')
+
+    def test_priority_marker(self):
+        from core.parser import iter_empowerment
+        items = list(iter_empowerment("$lora\nhttps://site.com/a.safetensors\n! https://site.com/b.safetensors\n"))
+        self.assertEqual([(x.url, x.priority) for x in items],
+                         [('https://site.com/a.safetensors', False), ('https://site.com/b.safetensors', True)])
+
+    def test_mirrors_on_one_line(self):
+        from core.parser import iter_empowerment
+        text = ("$unet\n"
+                "https://hf.co/a/x.safetensors | https://w.workers.dev/models/a/x.safetensors [x.safetensors]\n"
+                "https://hf.co/b.safetensors https://mirror.org/b.safetensors https://hf.co/b.safetensors\n"
+                "https://hf.co/c.safetensors | c-mirror\n")
+        warnings = []
+        items = list(iter_empowerment(text, warnings))
+        self.assertEqual([(x.url, x.mirrors) for x in items], [
+            ('https://hf.co/a/x.safetensors', ('https://w.workers.dev/models/a/x.safetensors',)),
+            ('https://hf.co/b.safetensors', ('https://mirror.org/b.safetensors',)),
+        ])
+        self.assertEqual(items[0].filename, 'x.safetensors')
+        self.assertEqual([(w.line, w.reason) for w in warnings], [(4, 'not a URL')])
+
+    def test_duplicates_and_bad_lines_become_warnings(self):
+        from core.parser import iter_empowerment
+        text = """
+        https://site.com/orphan.pt
+        $lora
+        https://site.com/a.safetensors
+        https://site.com/a.safetensors
+        not-a-url
+        $nope
+        https://site.com/lost.safetensors
+        $vae
+        https://site.com/a.safetensors
+        """
+        warnings = []
+        items = list(iter_empowerment(text, warnings))
+        # Same URL under another tag is a separate item
+        self.assertEqual([(x.line, x.tag) for x in items], [(4, '$lora'), (10, '$vae')])
+        reasons = [(w.line, w.reason) for w in warnings]
+        self.assertEqual(reasons, [
+            (2, 'no valid tag before this line'),
+            (5, 'duplicate of line 4'),
+            (6, 'not a URL'),
+            (7, 'unknown tag $nope'),
+            (8, 'no valid tag before this line'),
+        ])
+
+    def test_preview_counts_per_tag(self):
+        from core.parser import preview_empowerment
+        preview = preview_empowerment("""
+        $lora
+        https://site.com/a.safetensors | https://mirror.org/a.safetensors
+        https://site.com/b.safetensors
+        https://site.com/a.safetensors
+        $vae
+        https://site.com/v.safetensors
+        oops
+        """)
+        self.assertEqual(preview.counts, {'$lora': 2, '$vae': 1})
+        self.assertEqual(preview.mirrors, 1)
+        self.assertEqual([w.line for w in preview.duplicates], [5])
+        self.assertEqual([(w.line, w.reason) for w in preview.invalid], [(8, 'not a URL')])
+
 if __name__ == '__main__':
     unittest.main()
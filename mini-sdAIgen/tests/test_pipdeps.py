@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.pipdeps import RequirementSet, install, is_satisfied
+from core.wheelhouse import Wheelhouse
+
+class TestRequirementSet(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_merges_files_and_filters_heavy_packages(self):
+        (self.root / 'extra.txt').write_text("einops\n")
+        (self.root / 'requirements.txt').write_text(
+            "torch\ntorchvision>=0.15\nnumpy>=1.25.0  # comment\n-r extra.txt\n--extra-index-url https://x\n")
+        reqs = RequirementSet()
+        reqs.add('numpy>=1.25.0')
+        reqs.add_file(self.root / 'requirements.txt')
+        reqs.add_file(self.root / 'missing.txt')
+
+        self.assertEqual(reqs.lines, ['numpy>=1.25.0', 'einops'])
+        self.assertEqual(reqs.options, ['--extra-index-url https://x'])
+
+    def test_satisfied_checked_in_process(self):
+        self.assertTrue(is_satisfied('packaging>=1.0'))
+        self.assertFalse(is_satisfied('packaging<1.0'))
+        self.assertFalse(is_satisfied('surely-not-an-installed-package-xyz'))
+        self.assertTrue(is_satisfied("surely-not-an-installed-package-xyz; sys_platform == 'nonexistent'"))
+
+    @patch('subprocess.run')
+    def test_single_pip_call_then_fingerprint_skip(self, mock_run):
+        stamp = self.root / 'requirements.sha256'
+        reqs = RequirementSet()
+        for line in ['packaging', 'missing-pkg-one', 'missing-pkg-two']:
+            reqs.add(line)
+
+        self.assertEqual(install(reqs, stamp_path=stamp), ['missing-pkg-one', 'missing-pkg-two'])
+        self.assertEqual(mock_run.call_count, 1)
+
+        # Unchanged requirement set: no metadata scan, no pip
+        with patch.object(RequirementSet, 'missing') as mock_missing:
+            self.assertEqual(install(reqs, stamp_path=stamp), [])
+            self.assertFalse(mock_missing.called)
+        self.assertEqual(mock_run.call_count, 1)
+
+class TestWheelhouse(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.wheelhouse = Wheelhouse(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch('subprocess.run')
+    def test_offline_install_when_wheels_present(self, mock_run):
+        mock_run.return_value.returncode = 0
+        self.assertTrue(self.wheelhouse.install(['torch==2.7.1'], ['--index-url https://download.pytorch.org/whl/cu126']))
+        self.assertEqual(mock_run.call_count, 1)
+        cmd = mock_run.call_args[0][0]
+        self.assertIn('--no-index', cmd)
+        self.assertNotIn('--index-url', cmd)
+
+    @patch('subprocess.run')
+    def test_missing_wheels_fetched_into_wheelhouse(self, mock_run):
+        # Offline attempt fails, then wheel build and offline install succeed
+        results = iter([1, 0, 0])
+        mock_run.side_effect = lambda cmd, check=False: type('R', (), {'returncode': next(results)})()
+        self.assertFalse(self.wheelhouse.install(['pyngrok'], ['--index-url https://pypi.org/simple']))
+
+        wheel_cmd = mock_run.call_args_list[1][0][0]
+        self.assertIn('wheel', wheel_cmd)
+        self.assertIn('--wheel-dir', wheel_cmd)
+        self.assertIn('https://pypi.org/simple', wheel_cmd)
+        self.assertIn('--no-index', mock_run.call_args_list[2][0][0])
+
+if __name__ == '__main__':
+    unittest.main()
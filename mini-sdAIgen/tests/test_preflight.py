@@ -0,0 +1,103 @@
+import unittest
+from collections import namedtuple
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer
+from core import preflight
+from core.downloader import Downloader
+from core.manifest import Manifest, COMPLETE
+
+class TestPreflight(unittest.TestCase):
+    def test_resolves_sizes_names_and_missing_files(self):
+        with StubServer(redirects=2) as server, tempfile.TemporaryDirectory() as tmp:
+            big = server.add_file('big.safetensors', '3M')
+            small = server.add_file('small.safetensors', '1K')
+            items = [
+                {'url': small, 'destination': Path(tmp) / 'lora', 'filename': None},
+                {'url': server.url('gone.safetensors'), 'destination': Path(tmp) / 'lora', 'filename': None},
+                {'url': big, 'destination': Path(tmp) / 'unet', 'filename': None},
+                {'url': 'https://github.com/owner/node', 'destination': Path(tmp) / 'nodes', 'filename': None},
+            ]
+            plan = preflight.build_plan(items)
+
+        # Largest first, unknown sizes (the repository) ahead of known ones
+        self.assertEqual([r.item['url'] for r in plan.entries],
+                         ['https://github.com/owner/node', big, small])
+        self.assertEqual([r.status for r in plan.unreachable], [404])
+        self.assertEqual(plan.bytes_by_destination()[Path(tmp) / 'unet'], 3 * 1024 * 1024)
+        self.assertEqual(plan.entries[1].filename, 'big.safetensors')
+        # Redirect hops were followed with HEAD, never a body
+        self.assertTrue(all(method == 'HEAD' for method, _, _ in server.requests))
+
+    def test_mirror_resolves_when_primary_is_gone(self):
+        with StubServer() as server, tempfile.TemporaryDirectory() as tmp:
+            mirror = server.add_file('m.safetensors', '1K')
+            items = [{'url': server.url('gone.safetensors'), 'mirrors': (mirror,),
+                      'destination': Path(tmp), 'filename': None}]
+            plan = preflight.build_plan(items)
+
+        self.assertEqual(plan.unreachable, [])
+        self.assertEqual(plan.entries[0].size, 1024)
+
+    def test_content_disposition_name_is_pinned(self):
+        self.assertEqual(preflight.disposition_filename('attachment; filename="a b.zip"'), 'a b.zip')
+        self.assertEqual(preflight.disposition_filename("attachment; filename*=UTF-8''l%C3%B6ra.zip"), 'löra.zip')
+        item = {'url': 'https://civitai.com/api/download/models/1', 'destination': Path('/tmp'), 'filename': None}
+        plan = preflight.Plan([preflight.Resolved(item, size=5, filename='model.zip')])
+        self.assertEqual(plan.items[0]['filename'], 'model.zip')
+
+    def test_priority_items_start_first(self):
+        small = {'url': 'https://example.com/s.safetensors', 'destination': Path('/tmp'), 'filename': None, 'priority': True}
+        big = {'url': 'https://example.com/b.safetensors', 'destination': Path('/tmp'), 'filename': None}
+        plan = preflight.Plan([preflight.Resolved(big, size=100), preflight.Resolved(small, size=1)])
+        self.assertEqual([x['url'] for x in plan.items], [small['url'], big['url']])
+
+    def test_quota_fails_before_download(self):
+        usage = namedtuple('usage', 'total used free')
+        item = {'url': 'https://example.com/a.safetensors', 'destination': Path('/tmp/x'), 'filename': None}
+        plan = preflight.Plan([preflight.Resolved(item, size=10 * preflight.GB)], reserve=preflight.GB)
+        with patch('core.preflight.shutil.disk_usage', return_value=usage(0, 0, 10 * preflight.GB)):
+            with self.assertRaises(preflight.InsufficientSpace):
+                plan.check_space()
+        with patch('core.preflight.shutil.disk_usage', return_value=usage(0, 0, 12 * preflight.GB)):
+            plan.check_space()
+
+    def test_downloader_skips_completed_items(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            dest = Path(tmp)
+            (dest / 'done.safetensors').write_bytes(b'x')
+            manifest = Manifest(dest / 'downloads.sqlite')
+            manifest.update('https://example.com/done.safetensors', dest,
+                            filename='done.safetensors', size=1, status=COMPLETE)
+            item = {'url': 'https://example.com/done.safetensors', 'destination': dest, 'filename': None}
+            with patch('core.preflight.resolve_one') as resolve_one:
+                plan = Downloader(manifest=manifest).plan([item])
+            manifest.close()
+        self.assertFalse(resolve_one.called)
+        self.assertEqual(plan.entries[0].size, 0)
+
+    def test_etags_recorded_in_manifest(self):
+        with StubServer() as server, tempfile.TemporaryDirectory() as tmp:
+            dest = Path(tmp) / 'lora'
+            url = server.add_file('style.safetensors', '256K')
+            manifest = Manifest(Path(tmp) / 'downloads.sqlite')
+            self.addCleanup(manifest.close)
+            downloader = Downloader(manifest=manifest, backend='native')
+            plan = downloader.plan([{'url': url, 'destination': dest, 'filename': None}])
+            self.assertEqual(plan.entries[0].etag, '"style.safetensors-262144"')
+            self.assertEqual(manifest.get(url, dest)['etag'], '"style.safetensors-262144"')
+
+            manifest.update(url, dest, etag='"stale"')
+            downloader.download_batch([{'url': url, 'destination': dest, 'filename': None}])
+            row = manifest.get(url, dest)
+        # The engine's own probe replaces the preflight one with the finished file
+        self.assertEqual((row['status'], row['etag']), (COMPLETE, '"style.safetensors-262144"'))
+
+if __name__ == '__main__':
+    unittest.main()
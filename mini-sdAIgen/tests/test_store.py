@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.store import BlobStore, sha256_file
+from core.downloader import Downloader
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.store = BlobStore(self.root / '.model-store')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ingest_links_file_back_in_place(self):
+        path = self.root / 'vae' / 'ae.safetensors'
+        path.parent.mkdir()
+        path.write_bytes(b'weights')
+        sha = self.store.ingest('https://example.com/ae.safetensors', path)
+
+        self.assertEqual(sha, sha256_file(self.store.blob_path(sha)))
+        self.assertTrue(path.samefile(self.store.blob_path(sha)))
+        self.assertEqual(self.store.lookup('https://example.com/ae.safetensors')['filename'], 'ae.safetensors')
+
+    @patch('subprocess.run')
+    def test_same_url_under_two_tags_is_fetched_once(self, mock_run):
+        url = 'https://example.com/clip_vision.safetensors'
+        vis, cnet = self.root / 'clip_vision', self.root / 'controlnet'
+
+        def fake_aria2(command, **kwargs):
+            # Simulate aria2c writing the file into the requested directory
+            header = b'{"w": {"dtype": "F16", "shape": [1], "data_offsets": [0, 2]}}'
+            (vis / 'clip_vision.safetensors.part').write_bytes(len(header).to_bytes(8, 'little') + header + b'\0\0')
+        mock_run.side_effect = fake_aria2
+
+        downloader = Downloader(store=self.store)
+        downloader.download_batch([
+            {'url': url, 'destination': vis, 'filename': None},
+            {'url': url, 'destination': cnet, 'filename': None},
+        ])
+
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertTrue((vis / 'clip_vision.safetensors').samefile(cnet / 'clip_vision.safetensors'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from pathlib import Path
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer, parse_size
+from core.verify import check_safetensors_header
+
+class TestStubServer(unittest.TestCase):
+    def test_range_and_redirect_chain(self):
+        with StubServer(redirects=2) as server:
+            url = server.add_file('lora.safetensors', '1M')
+            full = urllib.request.urlopen(url).read()
+            req = urllib.request.Request(url, headers={'Range': 'bytes=1000-1999'})
+            with urllib.request.urlopen(req) as resp:
+                self.assertEqual(resp.status, 206)
+                self.assertEqual(resp.read(), full[1000:2000])
+
+        self.assertEqual(len(full), parse_size('1M'))
+        # Two redirect hops in front of each request
+        self.assertEqual(len(server.requests), 6)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'lora.safetensors'
+            path.write_bytes(full)
+            check_safetensors_header(path)
+
+    def test_bandwidth_cap_and_failures(self):
+        with StubServer(bandwidth=parse_size('2M')) as server:
+            url = server.add_file('vae.pt', '512K')
+            start = time.monotonic()
+            urllib.request.urlopen(url).read()
+            self.assertGreater(time.monotonic() - start, 0.2)
+
+        with StubServer(fail_rate=1.0) as server:
+            url = server.add_file('vae.pt', '1K')
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                urllib.request.urlopen(url)
+            self.assertEqual(ctx.exception.code, 503)
+            self.assertEqual(ctx.exception.headers['Retry-After'], '1')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.tasks import Task, run_tasks, critical_path, OK, FAILED, SKIPPED
+
+class TestTaskRunner(unittest.TestCase):
+    def test_independent_tasks_overlap(self):
+        barrier = threading.Barrier(2, timeout=2)
+        tasks = [Task('a', barrier.wait), Task('b', barrier.wait)]
+        # Would time out (BrokenBarrierError) if a and b ran one after another
+        results = run_tasks(tasks)
+        self.assertEqual({r.status for r in results.values()}, {OK})
+
+    def test_dependencies_and_locks_are_respected(self):
+        order = []
+        active = []
+
+        def step(name):
+            def run():
+                active.append(name)
+                self.assertEqual(len(active), 1)  # 'pip' lock keeps them exclusive
+                time.sleep(0.01)
+                order.append(name)
+                active.remove(name)
+            return run
+
+        tasks = [
+            Task('base', step('base'), lock='pip'),
+            Task('reqs', step('reqs'), deps=['base'], lock='pip'),
+            Task('extra', step('extra'), lock='pip'),
+        ]
+        run_tasks(tasks)
+        self.assertLess(order.index('base'), order.index('reqs'))
+
+    def test_failure_skips_dependents_only(self):
+        def boom():
+            raise RuntimeError("apt locked")
+
+        tasks = [
+            Task('apt', boom),
+            Task('download', lambda: None, deps=['apt']),
+            Task('pip', lambda: None),
+        ]
+        results = run_tasks(tasks)
+        self.assertEqual(results['apt'].status, FAILED)
+        self.assertEqual(results['download'].status, SKIPPED)
+        self.assertEqual(results['pip'].status, OK)
+
+    def test_critical_path_follows_latest_dependency(self):
+        tasks = [
+            Task('fast', lambda: None),
+            Task('slow', lambda: time.sleep(0.05)),
+            Task('final', lambda: None, deps=['fast', 'slow']),
+        ]
+        results = run_tasks(tasks)
+        self.assertEqual(critical_path(tasks, results), ['slow', 'final'])
+
+    def test_unknown_dependency_rejected(self):
+        with self.assertRaises(ValueError):
+            run_tasks([Task('a', lambda: None, deps=['missing'])])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import contextlib
+import io
+import json
+import struct
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import transcode
+from core.downloader import Downloader
+from core.manifest import Manifest, COMPLETE
+from core.verify import check_safetensors_header
+
+
+def read_safetensors(path, torch):
+    header = check_safetensors_header(path)
+    with open(path, 'rb') as f:
+        f.seek(8 + struct.unpack('<Q', f.read(8))[0])
+        data = f.read()
+    dtypes = transcode._torch_dtypes(torch)
+    tensors = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        begin, end = info['data_offsets']
+        tensors[name] = torch.frombuffer(bytearray(data[begin:end]), dtype=dtypes[info['dtype']])
+        tensors[name] = tensors[name].reshape(info['shape'])
+    return header, tensors
+
+
+@unittest.skipUnless(transcode.available(), 'needs torch')
+class TestTranscodeFile(unittest.TestCase):
+    def setUp(self):
+        import torch
+        self.torch = torch
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        torch.manual_seed(0)
+        self.weights = {'unet.weight': torch.randn(16, 8), 'unet.bias': torch.randn(8, dtype=torch.float64),
+                        'ids': torch.arange(5), 'half': torch.randn(3, dtype=torch.float16),
+                        'scalar': torch.tensor(2.5)}
+
+    def test_pickle_checkpoint_to_fp16_safetensors(self):
+        source = self.root / 'model.ckpt'
+        self.torch.save({'state_dict': self.weights, 'global_step': 10}, source)
+
+        result = transcode.transcode_file(source, 'fp16')
+        header, tensors = read_safetensors(self.root / 'model.safetensors', self.torch)
+
+        self.assertFalse(source.exists())
+        self.assertEqual((result['filename'], result['downcast'], result['dropped']), ('model.safetensors', 3, 0))
+        self.assertEqual(header['__metadata__'], {'converted_from': 'model.ckpt', 'converted_dtype': 'fp16'})
+        self.assertEqual(header['unet.weight']['dtype'], 'F16')
+        self.assertEqual((header['ids']['dtype'], header['half']['dtype']), ('I64', 'F16'))
+        self.assertEqual(tensors['scalar'].shape, ())
+        for name, tensor in self.weights.items():
+            expected = tensor.half() if tensor.dtype in (self.torch.float32, self.torch.float64) else tensor
+            self.assertTrue(self.torch.equal(tensors[name], expected), name)
+
+    def test_fp32_safetensors_down_cast_in_place(self):
+        source = self.root / 'lora.safetensors'
+        self.torch.save(self.weights, self.root / 'lora.pt')
+        transcode.transcode_file(self.root / 'lora.pt')
+        self.assertEqual(read_safetensors(source, self.torch)[0]['unet.weight']['dtype'], 'F32')
+
+        result = transcode.transcode_file(source, 'bf16')
+        header, tensors = read_safetensors(source, self.torch)
+        self.assertEqual((result['source'], result['filename']), ('lora.safetensors', 'lora.safetensors'))
+        self.assertEqual(header['unet.bias']['dtype'], 'BF16')
+        self.assertTrue(self.torch.equal(tensors['unet.weight'], self.weights['unet.weight'].bfloat16()))
+        self.assertLess(result['size'], result['source_size'])
+        # Nothing left to down-cast: the file is not rewritten again
+        self.assertIsNone(transcode.transcode_file(source, 'bf16'))
+        self.assertEqual(sorted(p.name for p in self.root.iterdir()), ['lora.safetensors'])
+
+    def test_downloader_converts_after_finish(self):
+        source = self.root / 'style.pt'
+        self.torch.save(self.weights, source)
+        manifest = Manifest(self.root / 'downloads.sqlite')
+        self.addCleanup(manifest.close)
+        downloader = Downloader(manifest=manifest, verify=False,
+                                transcoder=transcode.Transcoder({'$lora': 'fp16'}, workers=1))
+        item = {'url': 'https://example.com/style.pt', 'destination': self.root, 'filename': None, 'tag': '$lora'}
+        other = {'url': 'https://example.com/vae.pt', 'destination': self.root, 'filename': None, 'tag': '$vae'}
+        (self.root / 'vae.pt').write_bytes(b'kept as is')
+
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertTrue(downloader._finish(item, source))
+            self.assertTrue(downloader._finish(other, self.root / 'vae.pt'))
+            downloader.download_batch([])
+
+        row = manifest.get(item['url'], self.root)
+        self.assertEqual((row['status'], row['filename']), (COMPLETE, 'style.safetensors'))
+        self.assertEqual(json.loads(row['transcode'])['dtype'], 'fp16')
+        self.assertTrue(manifest.is_complete(item['url'], self.root))
+        self.assertEqual(manifest.get(other['url'], self.root)['filename'], 'vae.pt')
+        self.assertIn('Converted style.pt -> style.safetensors (fp16)', out.getvalue())
+
+
+class TestTranscoder(unittest.TestCase):
+    def test_rules(self):
+        with self.assertRaises(ValueError):
+            transcode.Transcoder({'$lora': 'int4'})
+        transcoder = transcode.Transcoder({'$lora': 'fp16', '$ckpt': None})
+        with patch('core.transcode.available', return_value=True):
+            self.assertTrue(transcoder.wants({'tag': '$lora'}, 'a.safetensors'))
+            self.assertTrue(transcoder.wants({'tag': '$ckpt'}, 'a.ckpt'))
+            # Already safetensors and no down-cast asked for
+            self.assertFalse(transcoder.wants({'tag': '$ckpt'}, 'a.safetensors'))
+            self.assertFalse(transcoder.wants({'tag': '$vae'}, 'a.ckpt'))
+            self.assertFalse(transcoder.wants({}, 'a.ckpt'))
+        with patch('core.transcode.available', return_value=False), \
+                contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertFalse(transcoder.wants({'tag': '$ckpt'}, 'a.ckpt'))
+            self.assertFalse(transcoder.wants({'tag': '$ckpt'}, 'b.ckpt'))
+        self.assertEqual(out.getvalue().count('torch is not installed'), 1)
+
+    def test_manifest_gains_transcode_column(self):
+        import sqlite3
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'downloads.sqlite'
+            conn = sqlite3.connect(path)
+            conn.execute("CREATE TABLE items (url TEXT NOT NULL, destination TEXT NOT NULL, filename TEXT, "
+                         "size INTEGER, etag TEXT, sha256 TEXT, status TEXT NOT NULL DEFAULT 'pending', "
+                         "updated_at REAL, PRIMARY KEY (url, destination))")
+            conn.commit()
+            conn.close()
+            manifest = Manifest(path)
+            manifest.update('https://example.com/a.ckpt', tmp, status=COMPLETE, transcode='{}')
+            self.assertEqual(manifest.get('https://example.com/a.ckpt', tmp)['transcode'], '{}')
+            manifest.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+import hashlib
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.verify import IntegrityError, check_safetensors_header, verify_file, sha256_file
+from core.downloader import Downloader
+
+def safetensors_bytes(data_len=4, actual_len=None):
+    header = f'{{"w": {{"dtype": "F16", "shape": [2], "data_offsets": [0, {data_len}]}}}}'.encode()
+    body = b'\x01' * (data_len if actual_len is None else actual_len)
+    return len(header).to_bytes(8, 'little') + header + body
+
+class TestVerify(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_safetensors_header(self):
+        good = self.root / 'good.safetensors'
+        good.write_bytes(safetensors_bytes())
+        self.assertIn('w', check_safetensors_header(good))
+
+        truncated = self.root / 'truncated.safetensors'
+        truncated.write_bytes(safetensors_bytes(actual_len=2))
+        with self.assertRaises(IntegrityError):
+            check_safetensors_header(truncated)
+
+        html = self.root / 'error.safetensors'
+        html.write_bytes(b'<html>429 Too Many Requests</html>')
+        with self.assertRaises(IntegrityError):
+            check_safetensors_header(html)
+
+    def test_hash_mismatch(self):
+        path = self.root / 'model.bin'
+        path.write_bytes(b'payload')
+        expected = hashlib.sha256(b'payload').hexdigest()
+        self.assertEqual(sha256_file(path), expected)
+        self.assertEqual(verify_file(path, expected.upper()), expected)
+        with self.assertRaises(IntegrityError):
+            verify_file(path, '0' * 64)
+
+    @patch('subprocess.run')
+    def test_corrupt_download_is_fetched_again(self, mock_run):
+        target = self.root / 'model.safetensors'
+        payloads = iter([safetensors_bytes(actual_len=1), safetensors_bytes()])
+        # aria2c writes under the temporary name; only a verified file is renamed
+        mock_run.side_effect = lambda *a, **k: (self.root / 'model.safetensors.part').write_bytes(next(payloads))
+
+        item = {'url': 'https://example.com/model.safetensors', 'destination': self.root, 'filename': None}
+        Downloader().download_batch([item])
+
+        self.assertEqual(mock_run.call_count, 2)
+        check_safetensors_header(target)
+
+if __name__ == '__main__':
+    unittest.main()
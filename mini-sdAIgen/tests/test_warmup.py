@@ -0,0 +1,81 @@
+import contextlib
+import io
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import warmup
+from core.config import Config
+from core.manifest import Manifest, COMPLETE, FAILED
+
+MB = 1024 * 1024
+
+
+class TestWarmup(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+    def make(self, name, size):
+        path = self.root / name
+        path.write_bytes(os.urandom(size))
+        return path
+
+    @patch('core.warmup.SPAN', MB)
+    @patch('core.warmup.BLOCK', 256 * 1024)
+    def test_reads_in_order_within_budget(self):
+        a, b, c = self.make('a.safetensors', 2 * MB), self.make('b.safetensors', 3 * MB), self.make('c.bin', MB)
+        result = warmup.warm([a, self.root / 'missing.bin', b, a, c], budget=4 * MB)
+
+        # b is warmed only in part and c not at all
+        self.assertEqual(result.files, [a, b])
+        self.assertEqual(result.read, 4 * MB)
+        self.assertIn(result.resident, (None, 2 * MB + 3 * MB))
+        self.assertIn('Warmed 2 files', result.summary())
+
+    def test_budget_is_a_share_of_available_memory(self):
+        path = self.make('a.safetensors', 3 * MB)
+        with patch('core.warmup.available_memory', return_value=4 * MB):
+            result = warmup.warm([path], share=0.5)
+        self.assertEqual((result.budget, result.read), (2 * MB, 2 * MB))
+        with patch('core.warmup.available_memory', return_value=None):
+            self.assertEqual(warmup.warm([path]).files, [])
+
+    def test_resident_bytes(self):
+        path = self.make('a.safetensors', MB + 1)
+        path.read_bytes()
+        self.assertIn(warmup.resident_bytes(path), (None, MB + 1))
+        self.assertIn(warmup.resident_bytes(self.make('empty', 0)), (None, 0))
+
+    def test_launch_warms_newest_downloads_first(self):
+        import launch
+        old, new = self.make('old.safetensors', MB), self.make('new.safetensors', MB)
+        config = Config(settings_path=self.root / 'settings.json', warmup=0.25)
+        manifest = Manifest(config.manifest_path)
+        manifest.update('https://example.com/old', self.root, filename=old.name, status=COMPLETE)
+        time.sleep(0.01)
+        manifest.update('https://example.com/new', self.root, filename=new.name, status=COMPLETE)
+        manifest.update('https://example.com/gone', self.root, filename='gone.bin', status=COMPLETE)
+        manifest.update('https://example.com/bad', self.root, filename='c.bin', status=FAILED)
+        self.assertEqual(warmup.recent_models(manifest), [new, old])
+        manifest.close()
+
+        with patch('core.warmup.available_memory', return_value=4 * MB), \
+                patch('launch.get_config', side_effect=lambda c=None: c), \
+                contextlib.redirect_stdout(io.StringIO()) as out:
+            result = launch.run_warmup(config)
+            config.warmup = 0
+            self.assertIsNone(launch.run_warmup(config))
+        self.assertEqual(result.files, [new])
+        self.assertIn('Warmed 1 file:', out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import contextlib
+import io
+import json
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer
+from core import paths, workflow
+from core.config import Config
+from core.manifest import Manifest, COMPLETE
+from core.metadata import MetadataCache, MetadataResolver
+from core.parser import iter_empowerment
+
+UI_WORKFLOW = {
+    'nodes': [
+        {'id': 1, 'type': 'CheckpointLoaderSimple', 'widgets_values': ['sdxl/base.safetensors']},
+        {'id': 2, 'type': 'DualCLIPLoader', 'widgets_values': ['t5xxl.safetensors', 'clip_l.safetensors', 'flux']},
+        {'id': 3, 'type': 'LoraLoader', 'widgets_values': ['style.safetensors', 1.0, 0.8]},
+        {'id': 4, 'type': 'KSampler', 'widgets_values': [42, 'randomize', 20, 7.0, 'euler', 'normal', 1.0]},
+        {'id': 5, 'type': 'UpscaleModelLoader', 'widgets_values': ['4x-UltraSharp.pth']},
+        {'id': 6, 'type': 'SomeCustomNode', 'widgets_values': {'model': 'mystery.gguf', 'steps': 4}},
+    ],
+    'definitions': {'subgraphs': [
+        {'nodes': [{'id': 7, 'type': 'VAELoader', 'widgets_values': ['ae.safetensors']}]},
+    ]},
+}
+API_WORKFLOW = {
+    '1': {'class_type': 'UnetLoaderGGUF', 'inputs': {'unet_name': 'flux1-dev-Q8_0.gguf'}},
+    '2': {'class_type': 'CLIPVisionLoader', 'inputs': {'clip_name': 'sigclip.safetensors'}},
+    '3': {'class_type': 'LoraLoaderModelOnly',
+          'inputs': {'lora_name': 'style.safetensors', 'strength_model': 1.0, 'model': ['1', 0]}},
+    '4': {'class_type': 'SaveImage', 'inputs': {'filename_prefix': 'ComfyUI', 'images': ['3', 0]}},
+}
+
+
+class TestWorkflowRefs(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        original = paths.DEFAULT_COMFY_ROOT
+        paths.set_comfy_root(self.root / 'ComfyUI')
+        self.addCleanup(paths.set_comfy_root, original)
+
+    def write(self, name, data):
+        path = self.root / name
+        path.write_text(json.dumps(data))
+        return path
+
+    def test_ui_and_api_formats(self):
+        refs = workflow.load_workflows([self.write('ui.json', UI_WORKFLOW), self.write('api.json', API_WORKFLOW)])
+        self.assertEqual([(r.tag, r.filename) for r in refs], [
+            ('$ckpt', 'sdxl/base.safetensors'), ('$clip', 't5xxl.safetensors'), ('$clip', 'clip_l.safetensors'),
+            ('$lora', 'style.safetensors'), ('$ups', '4x-UltraSharp.pth'), (None, 'mystery.gguf'),
+            ('$vae', 'ae.safetensors'), ('$unet', 'flux1-dev-Q8_0.gguf'), ('$vis', 'sigclip.safetensors'),
+        ])
+        self.assertEqual(refs[0].path, paths.PREFIX_MAP['$ckpt'] / 'sdxl' / 'base.safetensors')
+
+    def test_diff_checks_every_folder_comfyui_searches(self):
+        models = self.root / 'ComfyUI' / 'models'
+        for name in ['text_encoders/t5xxl.safetensors', 'loras/style.safetensors']:
+            (models / name).parent.mkdir(parents=True, exist_ok=True)
+            (models / name).write_bytes(b'x')
+        present, missing = workflow.diff(workflow.workflow_refs(UI_WORKFLOW))
+        self.assertEqual([r.name for r in present], ['t5xxl.safetensors', 'style.safetensors'])
+        self.assertEqual(len(missing), 5)
+
+    def test_resolve_from_local_sources_only(self):
+        refs = workflow.workflow_refs(UI_WORKFLOW)
+        cache = MetadataCache()
+        self.addCleanup(cache.close)
+        cache.put('https://huggingface.co/api/models/org/flux/tree/main/vae',
+                  json.dumps([{'type': 'file', 'path': 'vae/ae.safetensors', 'size': 1}]))
+        cache.put('https://civitai.com/api/v1/model-versions/55',
+                  json.dumps({'id': 55, 'files': [{'name': 'style.safetensors'}]}))
+        manifest = Manifest(self.root / 'downloads.sqlite')
+        self.addCleanup(manifest.close)
+        manifest.update('https://example.com/old-upscaler', self.root, filename='4x-UltraSharp.pth', status=COMPLETE)
+        known = iter_empowerment("$clip\nhttps://hf.co/a/b/resolve/main/t5xxl.safetensors | https://m.org/t5.bin")
+
+        items, unresolved = workflow.resolve(
+            refs, table={'sdxl/base.safetensors': 'https://example.com/base'}, known=known,
+            manifest=manifest, metadata=MetadataResolver(cache))
+
+        by_name = {item.filename: item for item in items}
+        self.assertEqual(by_name['base.safetensors'].destination, paths.PREFIX_MAP['$ckpt'] / 'sdxl')
+        self.assertEqual(by_name['t5xxl.safetensors'].mirrors, ('https://m.org/t5.bin',))
+        self.assertEqual(by_name['4x-UltraSharp.pth'].url, 'https://example.com/old-upscaler')
+        self.assertEqual(by_name['ae.safetensors'].url,
+                         'https://huggingface.co/org/flux/resolve/main/vae/ae.safetensors')
+        self.assertEqual(by_name['style.safetensors'].url, 'https://civitai.com/api/download/models/55')
+        self.assertEqual(sorted(r.name for r in unresolved), ['clip_l.safetensors', 'mystery.gguf'])
+
+    def test_launch_downloads_only_the_difference(self):
+        import launch
+        server = StubServer().start()
+        self.addCleanup(server.stop)
+        server.add_file('ae.safetensors', '64K')
+        lora = self.root / 'ComfyUI' / 'models' / 'loras' / 'style.safetensors'
+        lora.parent.mkdir(parents=True)
+        lora.write_bytes(b'x')
+        config = Config(settings_path=self.root / 'settings.json')
+        config.model_urls_path.write_text(json.dumps({'ae.safetensors': server.url('ae.safetensors')}))
+        api = {'1': {'class_type': 'VAELoader', 'inputs': {'vae_name': 'ae.safetensors'}},
+               '2': {'class_type': 'LoraLoader', 'inputs': {'lora_name': 'style.safetensors'}},
+               '3': {'class_type': 'VAELoader', 'inputs': {'vae_name': 'unknown.safetensors'}}}
+
+        with patch('core.config.detect_environment', return_value=('Local', self.root)), \
+                contextlib.redirect_stdout(io.StringIO()) as out:
+            launch.main(['--settings', str(config.settings_path), '--backend', 'native',
+                         'workflow', str(self.write('api.json', api))])
+        self.assertTrue((self.root / 'ComfyUI' / 'models' / 'vae' / 'ae.safetensors').is_file())
+        self.assertIn('3 models in 1 workflow: 1 on disk, 2 missing', out.getvalue())
+        self.assertIn('UNRESOLVED - unknown.safetensors', out.getvalue())
+        self.assertEqual([p for _, p, _ in server.requests if 'style' in p], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
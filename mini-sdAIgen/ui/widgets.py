@@ -1,26 +1,71 @@
 import ipywidgets as widgets
 from IPython.display import display, clear_output
+import html
 import json
+import threading
 from pathlib import Path
 
 SETTINGS_PATH = Path('settings.json')
+# Seconds without typing before the Empowerment text is parsed again
+PREVIEW_DELAY = 0.5
+# Progress is redrawn at most this often, however many files are running
+REFRESH_INTERVAL = 0.5
+# Progress bars shown at once; running files first, then the latest finished
+MAX_ROWS = 15
+# Warnings listed under the preview; the rest are counted
+MAX_WARNINGS = 8
+
+
+def _size(nbytes):
+    if nbytes is None:
+        return '?'
+    return f"{nbytes / 2**30:.2f} GB" if nbytes >= 2**30 else f"{nbytes / 2**20:.1f} MB"
+
+
+def _duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}" if seconds >= 3600 \
+        else f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def preview_html(preview):
+    """core.parser.ParsePreview as a few lines of HTML for the widget."""
+    total = sum(preview.counts.values())
+    tags = ', '.join(f"{html.escape(tag)} {count}" for tag, count in sorted(preview.counts.items()))
+    lines = [f"<b>{total} item{'s' if total != 1 else ''}</b>" + (f": {tags}" if tags else '')
+             + (f" ({preview.mirrors} mirrors)" if preview.mirrors else '')]
+    for warnings, color in ((preview.duplicates, 'darkorange'), (preview.invalid, 'crimson')):
+        for w in warnings[:MAX_WARNINGS]:
+            lines.append(f"<span style='color:{color}'>Line {w.line}: {html.escape(w.reason)}"
+                         f" &mdash; <code>{html.escape(w.text[:80])}</code></span>")
+        if len(warnings) > MAX_WARNINGS:
+            lines.append(f"<span style='color:{color}'>... and {len(warnings) - MAX_WARNINGS} more</span>")
+    return '<br>'.join(lines)
+
 
 class MiniWidgets:
     def __init__(self):
         self.header = widgets.HTML("<h2>Mini-sdAIgen Configuration</h2>")
-        
+
         # API Tokens
         self.hf_token = widgets.Text(description="HF Token:", placeholder="HuggingFace Token")
         self.civitai_token = widgets.Text(description="CivitAI Token:", placeholder="CivitAI Token")
         self.ngrok_token = widgets.Text(description="Ngrok Token:", placeholder="Ngrok Authtoken")
-        
+
         # Empowerment Mode
         self.empowerment_label = widgets.HTML("<h3>Empowerment Mode (Custom URLs)</h3>")
         self.empowerment_text = widgets.Textarea(
             placeholder="Enter tags and URLs here...\n$unet\nhttps://...\n$lora\nhttps://...",
             layout=widgets.Layout(width='100%', height='300px')
         )
-        
+        # Parsed off the UI thread once typing pauses, so mistakes show up
+        # before anything is downloaded
+        self.preview = widgets.HTML()
+        self.empowerment_text.observe(self._on_text, names='value')
+        self._preview_timer = None
+        self._preview_generation = 0
+        self._preview_lock = threading.Lock()
+
         # Actions
         self.save_btn = widgets.Button(
             description="Save Settings",
@@ -28,7 +73,17 @@ class MiniWidgets:
             icon='save'
         )
         self.save_btn.on_click(self.save_settings)
-        
+        self.download_btn = widgets.Button(description="Download", button_style='primary', icon='download')
+        self.download_btn.on_click(self.start_download)
+        self.cancel_btn = widgets.Button(description="Cancel", button_style='danger', icon='stop', disabled=True)
+        self.cancel_btn.on_click(self.cancel_download)
+
+        # Download progress, filled in by a background thread
+        self.summary = widgets.HTML()
+        self.progress = widgets.VBox()
+        self._rows = {}
+        self._worker = None
+
         self.output = widgets.Output()
 
     def display(self):
@@ -39,22 +94,33 @@ class MiniWidgets:
             self.ngrok_token,
             self.empowerment_label,
             self.empowerment_text,
-            self.save_btn,
+            self.preview,
+            widgets.HBox([self.save_btn, self.download_btn, self.cancel_btn]),
+            self.summary,
+            self.progress,
             self.output
         ])
         display(container)
         self.load_settings()
 
     def save_settings(self, b):
-        data = {
+        # Keys without a widget (e.g. 'transcode') are kept as they are
+        data = {}
+        if SETTINGS_PATH.exists():
+            try:
+                with open(SETTINGS_PATH, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+        data.update({
             'huggingface_token': self.hf_token.value,
             'civitai_token': self.civitai_token.value,
             'ngrok_token': self.ngrok_token.value,
             'empowerment_text': self.empowerment_text.value
-        }
+        })
         with open(SETTINGS_PATH, 'w') as f:
             json.dump(data, f, indent=4)
-            
+
         with self.output:
             clear_output()
             print("Settings saved to settings.json!")
@@ -72,6 +138,111 @@ class MiniWidgets:
                 with self.output:
                     print(f"Error loading settings: {e}")
 
+    # Parse preview
+
+    def _on_text(self, change):
+        # Every keystroke restarts the timer; only the last text gets parsed
+        with self._preview_lock:
+            self._preview_generation += 1
+            if self._preview_timer is not None:
+                self._preview_timer.cancel()
+            self._preview_timer = threading.Timer(PREVIEW_DELAY, self._update_preview,
+                                                  args=(change['new'], self._preview_generation))
+            self._preview_timer.daemon = True
+            self._preview_timer.start()
+
+    def _update_preview(self, text, generation):
+        from core.parser import preview_empowerment
+        try:
+            value = preview_html(preview_empowerment(text))
+        except Exception as e:
+            value = f"<span style='color:crimson'>Could not parse: {html.escape(str(e))}</span>"
+        with self._preview_lock:
+            # A newer text is already waiting; this result is stale
+            if generation == self._preview_generation:
+                self.preview.value = value
+
+    # Downloads
+
+    def start_download(self, b):
+        """Saves the settings and downloads them on a background thread; the notebook stays usable."""
+        if self._worker is not None and not self._worker.done:
+            return
+        import launch
+        from core.background import BackgroundDownload
+        from core.events import EventLog
+
+        self.save_settings(b)
+        config = launch.get_config()
+        events = EventLog(config.events_path)
+        cancel = threading.Event()
+        self._worker = BackgroundDownload(
+            lambda: launch.run_download(config, events, cancel=cancel, progress_interval=REFRESH_INTERVAL),
+            events, status_path=config.status_path, cancel=cancel.set).start()
+        self._rows = {}
+        self.progress.children = ()
+        self.download_btn.disabled = True
+        self.cancel_btn.disabled = False
+        self.cancel_btn.description = "Cancel"
+        threading.Thread(target=self._follow, args=(self._worker, events), name='download-progress',
+                         daemon=True).start()
+
+    def cancel_download(self, b):
+        if self._worker is None or self._worker.done:
+            return
+        self._worker.cancel()
+        self.cancel_btn.disabled = True
+        self.cancel_btn.description = "Cancelling..."
+
+    def _follow(self, worker, events):
+        while not worker.wait(REFRESH_INTERVAL):
+            self._render(worker.status())
+        self._render(worker.status())
+        events.close()
+        self.download_btn.disabled = False
+        self.cancel_btn.disabled = True
+        self.cancel_btn.description = "Cancel"
+
+    def _row(self, name):
+        row = self._rows.get(name)
+        if row is None:
+            label = name.rstrip('/').rsplit('/', 1)[-1].split('?', 1)[0] or name
+            bar = widgets.FloatProgress(min=0.0, max=1.0, description=label[:24],
+                                        layout=widgets.Layout(width='50%'))
+            text = widgets.Label()
+            row = self._rows[name] = (widgets.HBox([bar, text]), bar, text)
+        return row
+
+    def _render(self, status):
+        rate = f" at {_size(status['rate'])}/s" if status['state'] == 'running' and status['rate'] else ''
+        self.summary.value = (f"<b>Downloads {status['state']}</b>: {status['ok']} done, "
+                              f"{status['running']} running, {status['error']} failed, "
+                              f"{_size(status['bytes'])}{rate} ({_duration(status['elapsed'])})")
+
+        running = [r for r in status['items'] if r['status'] == 'running']
+        finished = [r for r in reversed(status['items']) if r['status'] != 'running']
+        shown = (running + finished)[:MAX_ROWS]
+        for item in shown:
+            box, bar, text = self._row(item['name'])
+            if item['status'] == 'ok':
+                bar.value, bar.bar_style = 1.0, 'success'
+                details = f"{_size(item['bytes'])} done"
+            elif item['status'] == 'error':
+                bar.bar_style = 'danger'
+                details = item['error'] or 'failed'
+            else:
+                if item['size']:
+                    bar.value = min(item['bytes'] / item['size'], 1.0)
+                details = f"{_size(item['bytes'])} / {_size(item['size'])}"
+                if item['rate']:
+                    details += f", {_size(item['rate'])}/s"
+                if item['eta'] is not None:
+                    details += f", ETA {_duration(item['eta'])}"
+            text.value = details
+        boxes = tuple(self._row(item['name'])[0] for item in shown)
+        if boxes != self.progress.children:
+            self.progress.children = boxes
+
 def show_widgets():
     ui = MiniWidgets()
     ui.display()